@@ -2,7 +2,6 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 from io import StringIO
-import base64
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder, StandardScaler
@@ -13,6 +12,21 @@ from tensorflow.keras.preprocessing.sequence import pad_sequences
 from PIL import Image
 import io
 import json
+import fcntl
+import ast
+import hashlib
+import os
+import shutil
+import sys
+import argparse
+import threading
+import time
+import gzip
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from contextlib import contextmanager
 from urllib.request import urlopen
 # Add this import
 from tensorflow.keras.preprocessing.text import Tokenizer
@@ -21,6 +35,14 @@ from collections import Counter
 from sklearn.neighbors import KNeighborsClassifier
 from sklearn.cluster import KMeans
 from sklearn.metrics import silhouette_score
+import openpyxl
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pyarrow.feather as feather
+from scipy import sparse
+from pandas.api.types import union_categoricals
+from lectura_snapshots import (COLUMNAS_RENOMBRADAS, COLUMNAS_FECHA, FORMATOS_SNAPSHOT, normalizar_columnas,
+                               formato_archivo, leer_snapshot, leer_hoja, parsear_hoja)
 
 # Configuración de la página
 st.set_page_config(page_title='ANALIZADOR DE MERCADO PARA MERCADO LIBRE', layout='wide')
@@ -43,6 +65,1619 @@ def display_image_with_title(image_url, title):
     if image:
         st.image(image, caption=title, use_column_width=True)
 
+# Descargas: formato -> (extensión, tipo MIME). Se escriben comprimidas, de a bloques de filas
+FORMATOS_EXPORTACION = {'CSV (gzip)': ('csv.gz', 'application/gzip'), 'Parquet': ('parquet', 'application/octet-stream')}
+FILAS_POR_BLOQUE_EXPORTACION = 100000
+
+# Lectura por bloques: a partir de este tamaño se lee el Excel fila a fila para acotar la memoria
+UMBRAL_LECTURA_POR_BLOQUES = 50 * 1024 * 1024  # 50MB
+FILAS_POR_BLOQUE = 50000
+
+# Columnas de baja cardinalidad que se guardan como categóricas (o strings de Arrow si no conviene)
+COLUMNAS_CATEGORICAS = ['Vendedores', 'Categoría', 'OEM', 'warranty', 'Título']
+# Proporción máxima de valores distintos sobre filas para convertir a categórica
+MAX_PROPORCION_CATEGORIAS = 0.5
+# Columnas numéricas que se reducen al tipo más chico que las representa
+COLUMNAS_ENTERAS = ['Visitas', 'Cantidad Disponible']
+COLUMNAS_DECIMALES = ['Estado de Salud']
+
+# Carpeta donde se guarda la base histórica armada con los snapshots diarios
+DIRECTORIO_DATOS = os.environ.get('ML_DIRECTORIO_DATOS', 'datos_mercado')
+# Única carpeta del servidor (y sus subcarpetas) de la que se pueden incorporar snapshots; sin ella solo se aceptan cargas
+DIRECTORIO_ENTRADA = os.environ.get('ML_DIRECTORIO_ENTRADA')
+# Carpeta y tamaño máximo del caché en disco de tablas derivadas (sobrevive a reinicios del servidor)
+DIRECTORIO_CACHE = os.environ.get('ML_DIRECTORIO_CACHE', os.path.join(DIRECTORIO_DATOS, 'cache'))
+MAX_BYTES_CACHE_DISCO = int(os.environ.get('ML_MAX_BYTES_CACHE_DISCO', 2 * 1024 * 1024 * 1024))
+# Versión de cada cálculo guardado en disco: se incrementa al cambiar el cálculo para no leer resultados viejos
+VERSIONES_DERIVADOS = {'datos': 1, 'parte': 1, 'agregados_oem': 1, 'combinado': 1, 'kmeans_codo': 1, 'kmeans_clusters': 1}
+# Columnas que identifican una publicación en un día
+COLUMNAS_CLAVE = ['ID', 'Fecha']
+
+# Procesos para leer varios archivos/hojas en paralelo
+PROCESOS_LECTURA = min(4, os.cpu_count() or 1)
+
+# Tags que indican que la publicación está (o puede estar) en catálogo
+PATRONES_CATALOGO = ['catalog_listing_eligible', 'catalog_forewarning', 'catalog_boost']
+# Tipos de cuota simple, en el orden en que se buscan dentro de cada tag
+TIPOS_CUOTA_SIMPLE = ['cuota-simple-paid-by-buyer', 'cuota-simple-3', 'cuota-simple-6', 'cuota-simple-9',
+                      'cuota-simple-12', 'cuota-simple-18']
+
+# Cantidad máxima de archivos procesados que se mantienen en memoria
+MAX_ENTRADAS_CACHE_CARGAS = 4
+
+# Combinaciones (archivo, rango de fechas) cuyos índices y agregados se mantienen en memoria
+MAX_ENTRADAS_CACHE_RANGOS = 8
+
+# Tamaño máximo (en bytes, estimado por tamano_figura) de los gráficos que se mantienen en memoria
+MAX_BYTES_CACHE_FIGURAS = 64 * 1024 * 1024
+# Bytes que se cuentan por cada valor que no está en un arreglo numérico (textos, listas)
+BYTES_POR_VALOR = 32
+
+# Tamaño máximo de los DataFrames derivados (rangos, filas por OEM o vendedor, tablas combinadas) de cada sesión
+MAX_BYTES_CACHE_SESION = int(os.environ.get('ML_MAX_BYTES_SESION', 256 * 1024 * 1024))
+
+# Secciones de las páginas de Mercado y Competencia; solo se calculan las elegidas
+SECCIONES_MERCADO = ['Visitas por Vendedor', 'Visitas por Categoría', 'Salud por Categoría',
+                     'Disponibilidad por Categoría', 'Eficiencia por OEM', 'Eficiencia por Categoría',
+                     'DataFrame de Resultados', 'DataFrame Combinado']
+SECCIONES_COMPETENCIA = ['Precio', 'Cantidad Disponible', 'Health', 'Visitas', 'DataFrame de Competencia',
+                         'Fecha de Última Actualización', 'Garantía', 'Catálogo', 'Cuota Simple', 'Free Shipping',
+                         'Participación de Tags']
+
+# Dispersión por cluster: WebGL desde UMBRAL_WEBGL puntos, como máximo MAX_PUNTOS_DISPERSION puntos
+# dibujados y BINS_DENSIDAD x BINS_DENSIDAD celdas por cluster en el modo de densidad
+UMBRAL_WEBGL = 1000
+MAX_PUNTOS_DISPERSION = 20000
+BINS_DENSIDAD = 40
+
+# Filas por página del visor de tablas grandes
+FILAS_POR_PAGINA = 50
+
+# Dimensiones y medidas del cubo diario usado en el análisis de mercado
+DIMENSIONES_CUBO = ['Vendedores', 'Categoría', 'OEM']
+MEDIDAS_CUBO = ['Visitas', 'Estado de Salud', 'Cantidad Disponible']
+
+
+# --- Caché LRU genérico ---
+def crear_cache_lru(max_entradas=None, max_bytes=None):
+    """Crea un caché LRU acotado por cantidad de entradas y/o por tamaño en bytes."""
+    return {'entradas': OrderedDict(), 'max_entradas': max_entradas, 'max_bytes': max_bytes,
+            'bytes': 0, 'aciertos': 0, 'fallos': 0, 'lock': threading.Lock()}
+
+def _recortar_cache_lru(cache):
+    # Descarta las entradas menos usadas hasta respetar los límites (siempre conserva la última)
+    entradas = cache['entradas']
+    while len(entradas) > 1 and (
+            (cache['max_entradas'] is not None and len(entradas) > cache['max_entradas']) or
+            (cache['max_bytes'] is not None and cache['bytes'] > cache['max_bytes'])):
+        _, (_, tamano) = entradas.popitem(last=False)
+        cache['bytes'] -= tamano
+
+def cache_lru_obtener(cache, clave):
+    """Devuelve el valor guardado para la clave (o None) y actualiza los contadores."""
+    with cache['lock']:
+        if clave in cache['entradas']:
+            cache['entradas'].move_to_end(clave)
+            cache['aciertos'] += 1
+            return cache['entradas'][clave][0]
+        cache['fallos'] += 1
+        return None
+
+def cache_lru_guardar(cache, clave, valor, tamano=0):
+    """Guarda un valor en el caché y descarta las entradas más antiguas si se superan los límites."""
+    with cache['lock']:
+        if clave in cache['entradas']:
+            cache['bytes'] -= cache['entradas'].pop(clave)[1]
+        cache['entradas'][clave] = (valor, tamano)
+        cache['bytes'] += tamano
+        _recortar_cache_lru(cache)
+
+def cache_lru_eliminar(cache, clave=None):
+    """Elimina una entrada (o todas si no se indica clave). Devuelve cuántas se eliminaron."""
+    with cache['lock']:
+        if clave is None:
+            eliminadas = len(cache['entradas'])
+            cache['entradas'].clear()
+            cache['bytes'] = 0
+            return eliminadas
+        if clave in cache['entradas']:
+            cache['bytes'] -= cache['entradas'].pop(clave)[1]
+            return 1
+        return 0
+
+def cache_lru_estadisticas(cache):
+    """Resumen del estado del caché: entradas, bytes ocupados, aciertos y fallos."""
+    with cache['lock']:
+        return {'entradas': len(cache['entradas']), 'bytes': cache['bytes'],
+                'aciertos': cache['aciertos'], 'fallos': cache['fallos']}
+
+
+# --- Carga de datos con caché ---
+@st.cache_resource
+def _cache_cargas():
+    """Caché de archivos ya procesados, compartido entre reruns y sesiones."""
+    return crear_cache_lru(max_entradas=MAX_ENTRADAS_CACHE_CARGAS)
+
+def hash_contenido(datos):
+    """Hash SHA-256 del contenido de un archivo (bytes o memoryview)."""
+    return hashlib.sha256(datos).hexdigest()
+
+# --- Lectura de Excel por bloques ---
+def _nombres_columnas(encabezado):
+    # Mismos nombres que pd.read_excel: 'Unnamed: i' para celdas vacías y sufijo '.n' para repetidos
+    nombres = []
+    vistos = {}
+    for i, valor in enumerate(encabezado):
+        nombre = f'Unnamed: {i}' if valor is None else valor
+        if nombre in vistos:
+            vistos[nombre] += 1
+            nombre = f'{nombre}.{vistos[nombre]}'
+        else:
+            vistos[nombre] = 0
+        nombres.append(COLUMNAS_RENOMBRADAS.get(nombre, nombre))
+    return nombres
+
+def _bloque_a_columnas(filas, columnas, buffers):
+    # Transpone el bloque de filas y guarda una Serie tipada por columna
+    for columna, valores in zip(columnas, zip(*filas)):
+        serie = pd.Series(valores)
+        if columna in COLUMNAS_FECHA:
+            serie = pd.to_datetime(serie, errors='coerce')
+        elif serie.dtype == object:
+            # Como pd.read_excel: las celdas vacías quedan como NaN
+            serie = serie.infer_objects()
+            if serie.dtype == object:
+                serie = serie.where(serie.notna(), np.nan)
+        buffers[columna].append(serie)
+
+def leer_excel_por_bloques(fuente, filas_por_bloque=FILAS_POR_BLOQUE, al_avanzar=None):
+    """Lee la primera hoja con openpyxl en modo read_only, aplicando el renombrado y las fechas por bloque.
+
+    Cada bloque se convierte en columnas tipadas y las filas crudas se descartan, así el pico de
+    memoria queda cerca del tamaño del DataFrame final. al_avanzar(filas_leidas, filas_totales)
+    se llama después de cada bloque (filas_totales es 0 si el archivo no declara sus dimensiones).
+    """
+    libro = openpyxl.load_workbook(fuente, read_only=True, data_only=True)
+    try:
+        hoja = libro.active
+        filas = hoja.iter_rows(values_only=True)
+        encabezado = next(filas, None)
+        if encabezado is None:
+            return pd.DataFrame()
+        columnas = _nombres_columnas(encabezado)
+        n_columnas = len(columnas)
+        total = max((hoja.max_row or 1) - 1, 0)
+
+        buffers = {columna: [] for columna in columnas}
+        bloque = []
+        leidas = 0
+        for fila in filas:
+            # Completa o recorta la fila para que coincida con el encabezado
+            if len(fila) != n_columnas:
+                fila = (tuple(fila) + (None,) * n_columnas)[:n_columnas]
+            bloque.append(fila)
+            if len(bloque) >= filas_por_bloque:
+                _bloque_a_columnas(bloque, columnas, buffers)
+                leidas += len(bloque)
+                bloque = []
+                if al_avanzar is not None:
+                    al_avanzar(leidas, total)
+        if bloque:
+            _bloque_a_columnas(bloque, columnas, buffers)
+            leidas += len(bloque)
+        if al_avanzar is not None:
+            al_avanzar(leidas, leidas)
+    finally:
+        libro.close()
+
+    if leidas == 0:
+        return pd.DataFrame(columns=columnas)
+
+    # Une los bloques columna por columna, liberando cada buffer apenas se concatena
+    datos = {}
+    for columna in columnas:
+        serie = pd.concat(buffers.pop(columna), ignore_index=True)
+        if serie.dtype == object:
+            # Un bloque sin valores queda como object y arrastra a toda la columna: se infiere sobre la unión
+            serie = serie.infer_objects()
+        datos[columna] = serie
+    return pd.DataFrame(datos, copy=False)
+
+# --- Compactación de tipos ---
+def _tiempo_groupby(df):
+    # Tiempo de un groupby de referencia, para comparar antes y después de compactar
+    if 'Vendedores' not in df.columns or 'Visitas' not in df.columns:
+        return None
+    inicio = time.perf_counter()
+    df.groupby('Vendedores', observed=True)['Visitas'].sum()
+    return time.perf_counter() - inicio
+
+def compactar_tipos(df):
+    """Convierte a categóricas las columnas de baja cardinalidad y reduce los tipos numéricos.
+
+    Guarda en df.attrs['reporte_memoria'] la memoria y el tiempo de un groupby de referencia
+    antes y después de la conversión.
+    """
+    reporte = {'memoria_antes': int(df.memory_usage(index=True, deep=True).sum()),
+               'groupby_antes': _tiempo_groupby(df)}
+
+    df = _compactar_categoricas(df)
+    for columna in COLUMNAS_ENTERAS:
+        if columna in df.columns and pd.api.types.is_numeric_dtype(df[columna]) and not df[columna].isna().any():
+            df[columna] = pd.to_numeric(df[columna], downcast='integer')
+    for columna in COLUMNAS_DECIMALES:
+        if columna in df.columns and pd.api.types.is_float_dtype(df[columna]):
+            df[columna] = pd.to_numeric(df[columna], downcast='float')
+
+    reporte['memoria_despues'] = int(df.memory_usage(index=True, deep=True).sum())
+    reporte['groupby_despues'] = _tiempo_groupby(df)
+    df.attrs['reporte_memoria'] = reporte
+    return df
+
+def _compactar_categoricas(df):
+    # Columnas de texto: categóricas si tienen baja cardinalidad, strings de Arrow si no
+    for columna in COLUMNAS_CATEGORICAS:
+        if columna not in df.columns or df[columna].dtype != object:
+            continue
+        if df[columna].nunique() <= MAX_PROPORCION_CATEGORIAS * len(df):
+            df[columna] = df[columna].astype('category')
+        elif pd.api.types.infer_dtype(df[columna], skipna=True) == 'string':
+            # Alta cardinalidad: strings de Arrow, más compactos que objetos de Python
+            df[columna] = df[columna].astype('string[pyarrow]')
+    return df
+
+def resumen_memoria(reporte):
+    """Texto con la memoria (y el tiempo de groupby) antes y después de compactar los tipos."""
+    texto = (f"Memoria: {reporte['memoria_antes'] / (1024 * 1024):.1f} MB → "
+             f"{reporte['memoria_despues'] / (1024 * 1024):.1f} MB")
+    if reporte['groupby_antes'] is not None and reporte['groupby_despues'] is not None:
+        texto += (f" | groupby por vendedor: {reporte['groupby_antes'] * 1000:.1f} ms → "
+                  f"{reporte['groupby_despues'] * 1000:.1f} ms")
+    return texto
+
+# --- Decodificación de tags y shipping ---
+def _literal_seguro(valor):
+    # Convierte la representación en texto de una lista o diccionario sin ejecutar código
+    if isinstance(valor, str):
+        try:
+            return ast.literal_eval(valor)
+        except (ValueError, SyntaxError, MemoryError, RecursionError):
+            return None
+    return valor
+
+def _lista_tags(valor):
+    valor = _literal_seguro(valor)
+    if isinstance(valor, (list, tuple, set, np.ndarray)):
+        return [str(tag) for tag in valor]
+    return []
+
+def _tipo_cuota(tag):
+    for tipo in TIPOS_CUOTA_SIMPLE:
+        if tipo in tag:
+            return tipo
+    return None
+
+def _categorica_por_codigos(valores_unicos, codigos):
+    # Arma una categórica de largo len(codigos) a partir de un valor por cada código (el último es el de NaN)
+    categorias, inversa = np.unique(np.asarray(valores_unicos, dtype=object).astype(str), return_inverse=True)
+    return pd.Categorical.from_codes(inversa[codigos], categories=categorias)
+
+# --- Índice de tags en bits ---
+def columnas_bits_tags(df):
+    """Columnas con la máscara de bits de tags (una palabra de 64 bits cada 64 tags del diccionario)."""
+    return [columna for columna in df.columns if str(columna).startswith('tags_bits_')]
+
+def mascara_de_tags(diccionario, patrones, exacto=False):
+    """Máscara (una palabra uint64 por columna de bits) de los tags del diccionario que contienen
+    alguno de los patrones, o que son exactamente alguno de ellos si exacto=True."""
+    mascara = np.zeros(max(1, -(-len(diccionario) // 64)), dtype=np.uint64)
+    for posicion, tag in enumerate(diccionario):
+        if (tag in patrones) if exacto else any(patron in tag for patron in patrones):
+            mascara[posicion // 64] |= np.uint64(1) << np.uint64(posicion % 64)
+    return mascara
+
+def filas_con_tags(df, mascara):
+    """Arreglo booleano: True en las filas que tienen al menos uno de los tags de la máscara."""
+    resultado = np.zeros(len(df), dtype=bool)
+    for palabra, columna in zip(mascara, columnas_bits_tags(df)):
+        if palabra:
+            resultado |= (df[columna].to_numpy() & palabra) != 0
+    return resultado
+
+def participacion_tags(df, patrones, por, exacto=False):
+    """Publicaciones totales, publicaciones con alguno de los tags y participación, por cada valor de 'por'."""
+    mascara = mascara_de_tags(df.attrs.get('diccionario_tags', []), patrones, exacto)
+    con_tags = filas_con_tags(df, mascara)
+    codigos, grupos = pd.factorize(df[por])
+    validos = codigos >= 0
+    publicaciones = np.bincount(codigos[validos], minlength=len(grupos))
+    con_tags_por_grupo = np.bincount(codigos[validos], weights=con_tags[validos], minlength=len(grupos))
+    return pd.DataFrame({'Publicaciones': publicaciones,
+                         'Con Tags': con_tags_por_grupo.astype(np.int64),
+                         'Participación': con_tags_por_grupo / np.maximum(publicaciones, 1)},
+                        index=pd.Index(grupos, name=por))
+
+def agregar_columnas_tags(df):
+    """Decodifica 'tags' y 'shipping' una sola vez y agrega columnas tipadas:
+    en_catalogo (bool), tipo_cuota_simple (primer tipo encontrado), tipos_cuota_simple (todos los
+    tipos, separados por coma), free_shipping (bool) y las columnas tags_bits_* con la máscara de
+    bits de los tags de cada publicación (el diccionario queda en df.attrs['diccionario_tags']).
+
+    Cada texto distinto se decodifica una única vez (con ast.literal_eval, sin eval) y el
+    resultado se reparte a las filas por código, así el costo depende de los valores distintos.
+    """
+    if 'tags' in df.columns:
+        codigos, unicos = pd.factorize(df['tags'])
+        listas = [_lista_tags(valor) for valor in unicos]
+
+        # Diccionario de tags y máscara de bits de cada valor distinto (la última fila es la de los NaN)
+        diccionario = sorted({tag for tags in listas for tag in tags})
+        posicion_tag = {tag: posicion for posicion, tag in enumerate(diccionario)}
+        bits = np.zeros((len(listas) + 1, max(1, -(-len(diccionario) // 64))), dtype=np.uint64)
+        for fila, tags in enumerate(listas):
+            for tag in tags:
+                posicion = posicion_tag[tag]
+                bits[fila, posicion // 64] |= np.uint64(1) << np.uint64(posicion % 64)
+        df = df.drop(columns=columnas_bits_tags(df))
+        for palabra in range(bits.shape[1]):
+            df[f'tags_bits_{palabra}'] = bits[codigos, palabra]
+        df.attrs['diccionario_tags'] = diccionario
+
+        tipos = [[tipo for tipo in map(_tipo_cuota, tags) if tipo is not None] for tags in listas] + [[]]
+        primero = [encontrados[0] if encontrados else 'Ninguna' for encontrados in tipos]
+        todos = [', '.join(encontrados) if encontrados else 'Ninguna' for encontrados in tipos]
+
+        df['en_catalogo'] = filas_con_tags(df, mascara_de_tags(diccionario, PATRONES_CATALOGO))
+        df['tipo_cuota_simple'] = _categorica_por_codigos(primero, codigos)
+        df['tipos_cuota_simple'] = _categorica_por_codigos(todos, codigos)
+
+    if 'shipping' in df.columns:
+        codigos, unicos = pd.factorize(df['shipping'])
+        envios = [_literal_seguro(valor) for valor in unicos]
+        gratis = [bool(envio.get('free_shipping', False)) if isinstance(envio, dict) else False for envio in envios]
+        df['free_shipping'] = np.array(gratis + [False], dtype=bool)[codigos]
+    return df
+
+# --- Índice por fecha ---
+def ordenar_por_fecha(df):
+    """Ordena las filas por 'Fecha' (orden estable, NaT al final) y marca el DataFrame como ordenado."""
+    if 'Fecha' not in df.columns:
+        return df
+    df = df.sort_values('Fecha', kind='stable', na_position='last', ignore_index=True)
+    df.attrs['ordenado_por_fecha'] = True
+    return df
+
+def filtrar_por_fechas(df, fecha_inicio, fecha_fin):
+    """Filas con fecha_inicio <= Fecha <= fecha_fin.
+
+    Si el DataFrame está ordenado por fecha (ver ordenar_por_fecha) los extremos se buscan con
+    búsqueda binaria y se devuelve un slice de posiciones, sin copiar datos ni recorrer la tabla.
+    """
+    if not df.attrs.get('ordenado_por_fecha'):
+        return df[(df['Fecha'] >= fecha_inicio) & (df['Fecha'] <= fecha_fin)]
+    inicio, fin = rango_de_fechas(df, fecha_inicio, fecha_fin)
+    return df.iloc[inicio:fin]
+
+def rango_de_fechas(df, fecha_inicio, fecha_fin):
+    """Posiciones [inicio, fin) de las filas entre las dos fechas de un DataFrame ordenado por fecha."""
+    # numpy también ubica los NaT al final, así que el arreglo queda ordenado para searchsorted
+    fechas = df['Fecha'].to_numpy()
+    inicio = np.searchsorted(fechas, pd.Timestamp(fecha_inicio).to_datetime64(), side='left')
+    fin = np.searchsorted(fechas, pd.Timestamp(fecha_fin).to_datetime64(), side='right')
+    return inicio, max(inicio, fin)
+
+# --- Selección parcial del top ---
+def seleccionar_top(datos, n, columna=None):
+    """Las n filas de mayor valor (de la Serie, o de 'columna' en un DataFrame), de mayor a menor.
+
+    Equivale a sort_values(ascending=False).head(n) pero con selección parcial (np.partition): solo se
+    ordenan los candidatos al top. Los empates conservan el orden original y los NaN van al final.
+    """
+    serie = datos if columna is None else datos[columna]
+    if not pd.api.types.is_numeric_dtype(serie):
+        # Valores no numéricos: orden completo (estable)
+        if columna is None:
+            return datos.sort_values(ascending=False, kind='stable').head(n)
+        return datos.sort_values(by=columna, ascending=False, kind='stable').head(n)
+    valores = serie.to_numpy(dtype=np.float64, na_value=np.nan)
+    total = len(valores)
+    n = max(0, min(int(n), total))
+    faltantes = np.isnan(valores)
+    # Clave ascendente: el mayor valor primero, los NaN al final
+    claves = np.where(faltantes, np.inf, -valores)
+    if n < total:
+        umbral = np.partition(claves, n - 1)[n - 1] if n > 0 else -np.inf
+        candidatos = np.flatnonzero(claves <= umbral)
+    else:
+        candidatos = np.arange(total)
+    orden = np.lexsort((candidatos, claves[candidatos], faltantes[candidatos]))
+    return datos.iloc[candidatos[orden][:n]]
+
+def seleccionar_top_por_grupo(tabla, grupo, columna, n):
+    """Las n filas de mayor 'columna' dentro de cada valor de 'grupo', con su 'Puesto' (1 = mayor).
+
+    Un solo orden de toda la tabla por (grupo, valor descendente); empates por orden original y NaN al final.
+    """
+    codigos = pd.factorize(tabla[grupo], sort=True)[0]
+    valores = tabla[columna].to_numpy(dtype=np.float64, na_value=np.nan)
+    faltantes = np.isnan(valores)
+    orden = np.lexsort((np.arange(len(tabla)), np.where(faltantes, np.inf, -valores), faltantes, codigos))
+    codigos_ordenados = codigos[orden]
+    # Puesto dentro del grupo: posición menos el inicio del tramo del grupo
+    inicio_grupo = np.flatnonzero(np.r_[True, codigos_ordenados[1:] != codigos_ordenados[:-1]])
+    puesto = np.arange(len(orden)) - np.repeat(inicio_grupo, np.diff(np.r_[inicio_grupo, len(orden)]))
+    seleccion = (puesto < n) & (codigos_ordenados >= 0)
+    return tabla.iloc[orden[seleccion]].assign(Puesto=puesto[seleccion] + 1)
+
+# --- Cubo diario con sumas acumuladas ---
+@st.cache_resource
+def _cache_cubos():
+    return crear_cache_lru(max_entradas=MAX_ENTRADAS_CACHE_CARGAS)
+
+def _acumular(valores):
+    """Suma acumulada con un cero inicial: la suma del tramo [i, j) es acumulado[j] - acumulado[i]."""
+    return np.concatenate(([0], np.cumsum(valores)))
+
+def _eje_fechas(df):
+    """Fechas distintas ordenadas (eje temporal del cubo) y la posición de cada fila en ese eje (-1 si es NaT)."""
+    fechas = df['Fecha'].to_numpy()
+    validas = ~np.isnat(fechas)
+    eje = np.unique(fechas[validas])
+    posiciones = np.full(len(fechas), -1, dtype=np.int64)
+    posiciones[validas] = np.searchsorted(eje, fechas[validas])
+    return eje, posiciones
+
+def _valores_medidas(df, medidas):
+    """Medidas presentes en df como arreglos float64 (NaN para faltantes) y cuáles son enteras."""
+    medidas = [medida for medida in medidas if medida in df.columns]
+    valores = {medida: pd.to_numeric(df[medida], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+               for medida in medidas}
+    enteras = [medida for medida in medidas if pd.api.types.is_integer_dtype(df[medida])]
+    return valores, enteras
+
+def _tabla_agregados(grupos, totales, medidas, enteras):
+    """Arma la tabla por grupo (Filas, suma, '(n)' y '(media)' de cada medida) con los grupos que tienen filas."""
+    resultado = pd.DataFrame(totales, index=grupos)
+    resultado = resultado[resultado['Filas'] > 0]
+    for medida in medidas:
+        if medida in enteras:
+            resultado[medida] = np.rint(resultado[medida]).astype(np.int64)
+        cantidad = resultado[medida + ' (n)']
+        resultado[medida + ' (media)'] = (resultado[medida] / cantidad).where(cantidad > 0)
+    return resultado
+
+def agregar_por_dimensiones(df, dimensiones=DIMENSIONES_CUBO, medidas=MEDIDAS_CUBO):
+    """Filas, sumas, conteos y promedios de las medidas por cada dimensión, en una pasada por dimensión.
+
+    Cada dimensión se factoriza una sola vez y todas las medidas se acumulan con np.bincount sobre
+    esos códigos. Devuelve un diccionario {dimensión: DataFrame} con las columnas de agregar_rango.
+    """
+    valores, enteras = _valores_medidas(df, medidas)
+    presentes = {medida: ~np.isnan(columna) for medida, columna in valores.items()}
+    agregados = {}
+    for dimension in [d for d in dimensiones if d in df.columns]:
+        codigos, grupos = pd.factorize(df[dimension], sort=True)
+        validas = codigos >= 0
+        codigos = codigos[validas]
+        cantidad_grupos = len(grupos)
+        totales = {'Filas': np.bincount(codigos, minlength=cantidad_grupos)}
+        for medida, columna in valores.items():
+            hay_valor = presentes[medida][validas]
+            totales[medida] = np.bincount(codigos, weights=np.where(hay_valor, columna[validas], 0.0),
+                                          minlength=cantidad_grupos)
+            totales[medida + ' (n)'] = np.bincount(codigos, weights=hay_valor, minlength=cantidad_grupos).astype(np.int64)
+        agregados[dimension] = _tabla_agregados(pd.Index(grupos, name=dimension), totales, list(valores), enteras)
+    return agregados
+
+def construir_cubo(df, dimensiones=DIMENSIONES_CUBO, medidas=MEDIDAS_CUBO):
+    """Materializa el cubo diario: para cada dimensión, filas, sumas y conteos por (grupo, fecha).
+
+    Los registros de cada dimensión quedan ordenados por grupo y fecha y se guardan como sumas
+    acumuladas, así el total de un grupo entre dos fechas es la resta de dos posiciones.
+    """
+    eje, posicion_fecha = _eje_fechas(df)
+    dias = len(eje)
+    valores, enteras = _valores_medidas(df, medidas)
+    medidas = list(valores)
+    cubo = {'fechas': eje, 'medidas': medidas, 'dimensiones': {}, 'enteras': enteras}
+    for dimension in [d for d in dimensiones if d in df.columns]:
+        codigos, grupos = pd.factorize(df[dimension], sort=True)
+        validas = (codigos >= 0) & (posicion_fecha >= 0)
+        claves = codigos[validas].astype(np.int64) * dias + posicion_fecha[validas]
+        orden = np.argsort(claves, kind='stable')
+        claves = claves[orden]
+        # Un registro por (grupo, fecha): cada tramo de claves iguales se resume en su primera posición
+        claves, inicios = np.unique(claves, return_index=True)
+        acumulados = {'Filas': _acumular(np.diff(np.append(inicios, validas.sum())))}
+        for medida in medidas:
+            columna = valores[medida][validas][orden]
+            presentes = ~np.isnan(columna)
+            acumulados[medida] = _acumular(np.add.reduceat(np.where(presentes, columna, 0.0), inicios))
+            acumulados[medida + ' (n)'] = _acumular(np.add.reduceat(presentes.astype(np.int64), inicios))
+        cubo['dimensiones'][dimension] = {'grupos': pd.Index(grupos, name=dimension), 'claves': claves,
+                                          'acumulados': acumulados}
+    return cubo
+
+def cubo_diario(df):
+    """Cubo del DataFrame completo cargado; se construye una vez por archivo (clave_datos) y queda en caché."""
+    clave = df.attrs.get('clave_datos')
+    if clave is None:
+        return construir_cubo(df)
+    cache = _cache_cubos()
+    cubo = cache_lru_obtener(cache, clave)
+    if cubo is None:
+        cubo = construir_cubo(df)
+        cache_lru_guardar(cache, clave, cubo)
+    return cubo
+
+def agregar_rango(cubo, dimension, fecha_inicio, fecha_fin):
+    """Totales por grupo de la dimensión entre fecha_inicio y fecha_fin (inclusive), leídos del cubo.
+
+    Devuelve 'Filas' y, por cada medida, su suma, la cantidad de valores presentes ('<medida> (n)')
+    y el promedio ('<medida> (media)'). Solo incluye los grupos con filas en el rango.
+    """
+    eje = cubo['fechas']
+    datos = cubo['dimensiones'][dimension]
+    desde = np.searchsorted(eje, pd.Timestamp(fecha_inicio).to_datetime64(), side='left')
+    hasta = max(desde, np.searchsorted(eje, pd.Timestamp(fecha_fin).to_datetime64(), side='right'))
+    base = np.arange(len(datos['grupos']), dtype=np.int64) * len(eje)
+    inicio = np.searchsorted(datos['claves'], base + desde, side='left')
+    fin = np.searchsorted(datos['claves'], base + hasta, side='left')
+    totales = {nombre: acumulado[fin] - acumulado[inicio] for nombre, acumulado in datos['acumulados'].items()}
+    return _tabla_agregados(datos['grupos'], totales, cubo['medidas'], cubo['enteras'])
+
+def agregados_mercado(df, df_filtrado, fecha_inicio, fecha_fin):
+    """Resultados compartidos por los gráficos de Mercado: {dimensión: tabla por grupo} del rango de fechas.
+
+    Si df es un archivo cargado (tiene clave_datos) se leen del cubo en caché; si no, se calculan
+    en una sola pasada sobre df_filtrado.
+    """
+    if df.attrs.get('clave_datos') is not None and 'Fecha' in df.columns:
+        cubo = cubo_diario(df)
+        return {dimension: agregar_rango(cubo, dimension, fecha_inicio, fecha_fin) for dimension in cubo['dimensiones']}
+    return agregar_por_dimensiones(df_filtrado)
+
+# --- Índice por vendedor ---
+def indice_invertido(columna):
+    """Índice valor -> posiciones de fila (en orden ascendente) de una columna."""
+    codigos, valores = pd.factorize(columna)
+    orden = np.argsort(codigos, kind='stable')
+    # Los faltantes (código -1) quedan al principio del orden y no pertenecen a ningún valor
+    orden = orden[(codigos < 0).sum():]
+    limites = _acumular(np.bincount(codigos[codigos >= 0], minlength=len(valores)))
+    return {'valores': pd.Index(valores), 'orden': orden, 'limites': limites}
+
+def posiciones_de(indice, valor):
+    """Posiciones de las filas con ese valor (vacío si no aparece)."""
+    try:
+        codigo = indice['valores'].get_loc(valor)
+    except KeyError:
+        return np.empty(0, dtype=np.intp)
+    return indice['orden'][indice['limites'][codigo]:indice['limites'][codigo + 1]]
+
+def estadisticas_vendedores(df):
+    """Agregados de todos los vendedores a la vez (un groupby por desglose), para consultarlos por vendedor."""
+    estadisticas = {}
+    por_vendedor = df.groupby('Vendedores', observed=True)
+    resumen = por_vendedor.size().to_frame('Filas')
+    if 'Visitas' in df.columns:
+        resumen['Visitas'] = por_vendedor['Visitas'].sum()
+    if 'Título' in df.columns:
+        resumen['Títulos'] = por_vendedor['Título'].nunique()
+    estadisticas['Vendedores'] = resumen
+    for desglose, medidas in [('Título', {'Visitas': 'sum', 'Cantidad Disponible': 'sum'}),
+                              ('OEM', {'Visitas': 'sum'}),
+                              ('Categoría', {'Estado de Salud': 'mean'})]:
+        if desglose not in df.columns:
+            continue
+        agrupado = df.groupby(['Vendedores', desglose], observed=True)
+        tabla = agrupado.size().to_frame('Cantidad')
+        for medida, funcion in medidas.items():
+            if medida in df.columns:
+                tabla[medida] = agrupado[medida].agg(funcion)
+        estadisticas[desglose] = tabla
+    if 'OEM' in df.columns and 'Visitas' in df.columns:
+        # Visitas de cada OEM sumando todos los vendedores
+        estadisticas['Visitas OEM Mercado'] = df.groupby('OEM', observed=True)['Visitas'].sum()
+    return estadisticas
+
+def de_vendedor(tabla, vendedor):
+    """Filas de una tabla de estadisticas_vendedores que corresponden al vendedor (índice ordenado: búsqueda binaria)."""
+    try:
+        return tabla.xs(vendedor, level='Vendedores')
+    except KeyError:
+        return tabla.iloc[:0].droplevel('Vendedores')
+
+def huella_datos(df, fecha_inicio=None, fecha_fin=None):
+    """Identifica un archivo cargado y un rango de fechas; None si el DataFrame no viene de un archivo en caché."""
+    clave = df.attrs.get('clave_datos')
+    if clave is None:
+        return None
+    return f"{clave}|{fecha_inicio}|{fecha_fin}"
+
+@st.cache_resource
+def _cache_vendedores():
+    return crear_cache_lru(max_entradas=MAX_ENTRADAS_CACHE_RANGOS)
+
+def datos_vendedores(df_filtrado, fecha_inicio, fecha_fin):
+    """Índice vendedor -> filas y estadísticas de todos los vendedores; se calculan una vez por archivo y rango."""
+    clave = huella_datos(df_filtrado, fecha_inicio, fecha_fin)
+    if clave is not None:
+        cache = _cache_vendedores()
+        datos = cache_lru_obtener(cache, clave)
+        if datos is not None:
+            return datos
+    datos = {'indice': indice_invertido(df_filtrado['Vendedores']), 'estadisticas': estadisticas_vendedores(df_filtrado)}
+    if 'OEM' in df_filtrado.columns and 'Visitas' in df_filtrado.columns:
+        datos['cuotas'] = cuotas_de_mercado(df_filtrado)
+    if clave is not None:
+        cache_lru_guardar(cache, clave, datos)
+    return datos
+
+# --- Índice por OEM ---
+@st.cache_resource
+def _cache_indices_oem():
+    return crear_cache_lru(max_entradas=MAX_ENTRADAS_CACHE_CARGAS)
+
+@st.cache_resource
+def _cache_agregados_oem():
+    return crear_cache_lru(max_entradas=MAX_ENTRADAS_CACHE_RANGOS)
+
+def indice_oem(df):
+    """Índice OEM -> posiciones del DataFrame cargado; se arma una vez por archivo, al cargarlo."""
+    clave = df.attrs.get('clave_datos')
+    if clave is None:
+        return indice_invertido(df['OEM'])
+    cache = _cache_indices_oem()
+    indice = cache_lru_obtener(cache, clave)
+    if indice is None:
+        indice = indice_invertido(df['OEM'])
+        cache_lru_guardar(cache, clave, indice)
+    return indice
+
+def agregados_oem_vendedor(df):
+    """Precio, stock y health promedio y visitas totales por (OEM, vendedor), en un solo groupby.
+
+    También guarda el primer título, ID, permalink y fecha de actualización de cada vendedor.
+    """
+    funciones = {'Precio': 'mean', 'Cantidad Disponible': 'mean', 'Estado de Salud': 'mean', 'Visitas': 'sum',
+                 'Título': 'first', 'ID': 'first', 'permalink': 'first', 'Fecha de Última Actualización': 'first'}
+    agrupado = df.groupby(['OEM', 'Vendedores'], observed=True)
+    tabla = agrupado.size().to_frame('Filas')
+    funciones = {columna: funcion for columna, funcion in funciones.items() if columna in df.columns}
+    if funciones:
+        tabla = tabla.join(agrupado.agg(funciones))
+    return tabla
+
+def datos_oem(df, fecha_inicio, fecha_fin):
+    """Índice OEM -> filas y agregados por (OEM, vendedor) del rango, para mostrar cualquier OEM sin recorrer la tabla.
+
+    Con un archivo cargado (ordenado por fecha) se usa el índice armado al cargar y el rango se
+    recorta por posiciones; si no, el índice se arma sobre las filas del rango.
+    """
+    clave = df.attrs.get('clave_datos')
+    if clave is not None and df.attrs.get('ordenado_por_fecha'):
+        desde, hasta = rango_de_fechas(df, fecha_inicio, fecha_fin)
+        datos = {'base': df, 'indice': indice_oem(df), 'desde': desde, 'hasta': hasta}
+        clave_rango = huella_datos(df, fecha_inicio, fecha_fin)
+        cache = _cache_agregados_oem()
+        agregados = cache_lru_obtener(cache, clave_rango)
+        if agregados is None:
+            agregados = derivado_en_disco(clave_rango, 'agregados_oem', (),
+                                          lambda: agregados_oem_vendedor(df.iloc[desde:hasta]))
+            cache_lru_guardar(cache, clave_rango, agregados)
+    else:
+        base = filtrar_por_fechas(df, fecha_inicio, fecha_fin)
+        datos = {'base': base, 'indice': indice_invertido(base['OEM']), 'desde': 0, 'hasta': len(base)}
+        agregados = agregados_oem_vendedor(base)
+    datos['agregados'] = agregados
+    return datos
+
+def filas_de_oem(datos, oem):
+    """Filas del OEM dentro del rango: las posiciones del índice están ordenadas y se recortan por búsqueda binaria."""
+    posiciones = posiciones_de(datos['indice'], oem)
+    inicio, fin = np.searchsorted(posiciones, [datos['desde'], datos['hasta']])
+    return datos['base'].iloc[posiciones[inicio:fin]]
+
+def agregados_de_oem(datos, oem):
+    """Agregados por vendedor del OEM (una fila por vendedor, con la columna 'Vendedores')."""
+    tabla = datos['agregados']
+    try:
+        return tabla.xs(oem, level='OEM').reset_index()
+    except KeyError:
+        return tabla.iloc[:0].droplevel('OEM').reset_index()
+
+# --- Caché de gráficos ---
+@st.cache_resource
+def _cache_figuras():
+    return crear_cache_lru(max_bytes=MAX_BYTES_CACHE_FIGURAS)
+
+def _tamano_valores(valores):
+    if isinstance(valores, np.ndarray):
+        return valores.nbytes if valores.dtype != object else valores.size * BYTES_POR_VALOR
+    if isinstance(valores, (list, tuple)):
+        return len(valores) * BYTES_POR_VALOR
+    return 0
+
+def tamano_figura(figura):
+    """Estimación en bytes de los datos de un gráfico a partir de los arreglos de sus trazas, sin serializarlo."""
+    total = 0
+    for traza in figura.data:
+        for propiedad in ('x', 'y', 'z', 'text', 'hovertext', 'customdata', 'ids', 'labels', 'values', 'parents'):
+            total += _tamano_valores(getattr(traza, propiedad, None))
+        marcador = getattr(traza, 'marker', None)
+        total += _tamano_valores(getattr(marcador, 'color', None)) + _tamano_valores(getattr(marcador, 'size', None))
+    return total
+
+def figura_en_cache(huella, id_grafico, parametros, construir):
+    """Devuelve el gráfico guardado para (huella, id_grafico, parametros) o lo construye y lo guarda.
+
+    Sin huella (datos que no vienen de un archivo en caché) el gráfico se construye siempre.
+    """
+    if huella is None:
+        return construir()
+    clave = (huella, id_grafico) + tuple(parametros)
+    cache = _cache_figuras()
+    figura = cache_lru_obtener(cache, clave)
+    if figura is None:
+        figura = construir()
+        cache_lru_guardar(cache, clave, figura, tamano_figura(figura))
+    return figura
+
+# --- Secciones a demanda ---
+def elegir_secciones(secciones, clave):
+    """Secciones de la página elegidas por el usuario (por defecto la primera); la elección se recuerda en la sesión."""
+    return st.pills('Secciones', secciones, selection_mode='multi', default=secciones[:1], key=clave) or []
+
+# --- Dispersión por cluster ---
+def muestra_por_grupo(df, grupo, max_filas, semilla=0):
+    """Muestra aleatoria de a lo sumo max_filas filas con la misma proporción de cada grupo que df.
+
+    Dentro de cada grupo las filas se eligen al azar, así se conserva la densidad de los puntos; cada
+    grupo conserva al menos una fila para que los clusters chicos sigan apareciendo.
+    """
+    if len(df) <= max_filas:
+        return df
+    codigos = pd.factorize(df[grupo])[0]
+    tamanos = np.bincount(codigos)
+    cuotas = np.maximum(1, tamanos * max_filas // len(df))
+    # Orden por grupo y, dentro del grupo, al azar: se toman las primeras 'cuota' filas de cada tramo
+    orden = np.lexsort((np.random.default_rng(semilla).random(len(df)), codigos))
+    puesto = np.arange(len(df)) - np.repeat(np.cumsum(tamanos) - tamanos, tamanos)
+    elegidas = orden[puesto < cuotas[codigos[orden]]]
+    return df.iloc[np.sort(elegidas)]
+
+def densidad_por_grupo(df, x, y, grupo, bins=BINS_DENSIDAD):
+    """Conteos 2D por grupo sobre una grilla común: (grupos, centros_x, centros_y, conteos[grupo, y, x])."""
+    valores_x = df[x].to_numpy(dtype=np.float64, na_value=np.nan)
+    valores_y = df[y].to_numpy(dtype=np.float64, na_value=np.nan)
+    validas = np.isfinite(valores_x) & np.isfinite(valores_y)
+    bordes_x = np.histogram_bin_edges(valores_x[validas], bins)
+    bordes_y = np.histogram_bin_edges(valores_y[validas], bins)
+    etiquetas = df[grupo].to_numpy()
+    grupos = np.sort(pd.unique(etiquetas[validas]))
+    conteos = np.stack([np.histogram2d(valores_y[validas & (etiquetas == g)], valores_x[validas & (etiquetas == g)],
+                                       bins=[bordes_y, bordes_x])[0] for g in grupos])
+    return grupos, (bordes_x[:-1] + bordes_x[1:]) / 2, (bordes_y[:-1] + bordes_y[1:]) / 2, conteos
+
+def dispersion_por_cluster(df, x, y, titulo, modo='Puntos'):
+    """Dispersión de x contra y por 'Cluster' con tamaño acotado, sea cual sea la cantidad de filas.
+
+    'Puntos' dibuja una muestra proporcional por cluster (WebGL con muchos puntos); 'Densidad' dibuja
+    los conteos 2D de cada cluster calculados en el servidor, uno por panel.
+    """
+    if modo == 'Densidad':
+        grupos, centros_x, centros_y, conteos = densidad_por_grupo(df, x, y, 'Cluster')
+        fig = px.imshow(conteos, x=centros_x, y=centros_y, facet_col=0, facet_col_wrap=min(len(grupos), 5),
+                        origin='lower', aspect='auto', title=titulo, color_continuous_scale=px.colors.sequential.Plasma,
+                        labels={'x': x, 'y': y, 'color': 'Publicaciones'})
+        fig.for_each_annotation(lambda anotacion: anotacion.update(
+            text=f"Cluster {grupos[int(anotacion.text.split('=')[-1])]}"))
+        return fig
+    muestra = muestra_por_grupo(df[[x, y, 'Cluster']], 'Cluster', MAX_PUNTOS_DISPERSION)
+    if len(muestra) < len(df):
+        titulo = f'{titulo} (muestra de {len(muestra)} de {len(df)} publicaciones)'
+    return px.scatter(muestra, x=x, y=y, color='Cluster', title=titulo,
+                      labels={x: x, y: y, 'Cluster': 'Cluster'},
+                      render_mode='webgl' if len(muestra) >= UMBRAL_WEBGL else 'svg')
+
+# --- Visor de tablas paginado ---
+def _filas_que_contienen(serie, texto):
+    # Las categóricas se comparan sobre sus categorías y se expanden por código, sin convertir cada fila a texto
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        codigos = serie.cat.codes.to_numpy()
+        coinciden = np.asarray(serie.cat.categories.astype(str).str.contains(texto, case=False, regex=False))
+        return (codigos >= 0) & coinciden[codigos]
+    return serie.astype(str).str.contains(texto, case=False, regex=False, na=False).to_numpy()
+
+def orden_de_tabla(df, columna=None, ascendente=True, columna_filtro=None, texto_filtro=''):
+    """Posiciones de las filas de df que pasan el filtro ('texto_filtro' contenido en 'columna_filtro'),
+    ordenadas por 'columna' (orden estable, NaN al final)."""
+    posiciones = np.arange(len(df))
+    if columna_filtro and texto_filtro:
+        posiciones = posiciones[_filas_que_contienen(df[columna_filtro], texto_filtro)]
+    if columna:
+        valores = df[columna].iloc[posiciones].reset_index(drop=True)
+        orden = valores.sort_values(ascending=ascendente, kind='stable', na_position='last').index.to_numpy()
+        posiciones = posiciones[orden]
+    return posiciones
+
+@st.fragment
+def tabla_paginada(df, clave, huella=None, filas_por_pagina=FILAS_POR_PAGINA):
+    """Muestra df de a una página. El filtro y el orden se aplican en el servidor y solo se envía la página visible.
+
+    Con huella (los mismos datos entre reruns) el orden calculado se recuerda en la sesión.
+    """
+    columnas = list(df.columns)
+    orden, sentido, filtro, texto = st.columns(4)
+    columna = orden.selectbox('Ordenar por', [None] + columnas, format_func=lambda c: '(sin orden)' if c is None else c,
+                              key=f'{clave}_orden')
+    ascendente = sentido.selectbox('Sentido', ['Descendente', 'Ascendente'], key=f'{clave}_sentido') == 'Ascendente'
+    columna_filtro = filtro.selectbox('Filtrar columna', columnas, key=f'{clave}_filtro')
+    texto_filtro = texto.text_input('Contiene', key=f'{clave}_texto').strip()
+
+    firma = (huella, columna, ascendente, columna_filtro, texto_filtro)
+    guardado = st.session_state.get(f'_{clave}_posiciones')
+    if huella is not None and guardado is not None and guardado[0] == firma:
+        posiciones = guardado[1]
+    else:
+        posiciones = orden_de_tabla(df, columna, ascendente, columna_filtro, texto_filtro)
+        st.session_state[f'_{clave}_posiciones'] = (firma, posiciones)
+
+    total = len(posiciones)
+    paginas = max(1, -(-total // filas_por_pagina))
+    # Si el filtro achica la tabla, la página elegida se ajusta antes de crear el widget
+    if st.session_state.get(f'{clave}_pagina', 1) > paginas:
+        st.session_state[f'{clave}_pagina'] = paginas
+    pagina = st.number_input('Página', min_value=1, max_value=paginas, value=1, key=f'{clave}_pagina')
+    inicio = (pagina - 1) * filas_por_pagina
+    fin = min(inicio + filas_por_pagina, total)
+    st.dataframe(df.iloc[posiciones[inicio:fin]])
+    st.caption(f"Página {pagina} de {paginas}: filas {inicio + 1 if total else 0}-{fin} de {total}" +
+               (f" (filtradas de {len(df)})" if total != len(df) else ""))
+
+# --- Caché de DataFrames derivados por sesión ---
+def _cache_sesion():
+    """Caché LRU de la sesión actual para DataFrames derivados del archivo cargado."""
+    cache = st.session_state.get('_cache_derivados')
+    if cache is None:
+        cache = st.session_state['_cache_derivados'] = crear_cache_lru(max_bytes=MAX_BYTES_CACHE_SESION)
+    return cache
+
+def _buffers_columna(serie):
+    # (dirección, bytes) de los buffers con los valores de una columna, sin copiarlos
+    valores = serie.array
+    if isinstance(valores, pd.Categorical):
+        valores = valores.codes
+    elif hasattr(valores, '__arrow_array__'):
+        return [(buffer.address, buffer.size) for trozo in valores.__arrow_array__().chunks
+                for buffer in trozo.buffers() if buffer is not None]
+    else:
+        valores = serie.to_numpy(copy=False)
+    return [(valores.__array_interface__['data'][0], valores.nbytes)]
+
+def bytes_propios(frame, origen=None):
+    """Bytes de los valores de frame que no comparte con origen: un slice de origen casi no ocupa memoria propia."""
+    compartidos = [] if origen is None else [buffer for _, serie in origen.items() for buffer in _buffers_columna(serie)]
+    total = int(frame.index.memory_usage())
+    for _, serie in frame.items():
+        propios = [tamano for direccion, tamano in _buffers_columna(serie)
+                   if not any(inicio <= direccion < inicio + largo for inicio, largo in compartidos)]
+        if propios and serie.dtype == object:
+            # El arreglo solo guarda punteros: se cuentan también los textos a los que apunta
+            total += int(serie.memory_usage(index=False, deep=True))
+        else:
+            total += sum(propios)
+    return total
+
+def derivado_en_sesion(huella, nombre, parametros, construir, origen=None):
+    """DataFrame guardado en la sesión para (huella, nombre, parametros), o construido y guardado.
+
+    Se devuelve una copia superficial: con copy-on-write comparte la memoria con la entrada guardada
+    y solo se copian las columnas que se modifiquen después. Si el resultado puede compartir memoria
+    con origen, al presupuesto solo se le cobra la que es propia (ver bytes_propios).
+    """
+    if huella is None:
+        return construir()
+    clave = (huella, nombre) + tuple(parametros)
+    cache = _cache_sesion()
+    frame = cache_lru_obtener(cache, clave)
+    if frame is None:
+        frame = construir()
+        if frame is None:
+            return None
+        cache_lru_guardar(cache, clave, frame, bytes_propios(frame, origen))
+    return frame.copy(deep=False)
+
+def rango_en_sesion(df, fecha_inicio, fecha_fin):
+    """Filas del rango de fechas (ver filtrar_por_fechas), guardadas en la sesión."""
+    return derivado_en_sesion(huella_datos(df, fecha_inicio, fecha_fin), 'rango', (),
+                              lambda: filtrar_por_fechas(df, fecha_inicio, fecha_fin), origen=df)
+
+# --- Cuotas de mercado vendedor × OEM ---
+def _inversa(valores):
+    """1 / valores, con 0 donde el valor es 0 (grupos sin visitas)."""
+    inversa = np.zeros(len(valores), dtype=np.float64)
+    np.divide(1.0, valores, out=inversa, where=valores != 0)
+    return inversa
+
+def matriz_vendedor_oem(df):
+    """Matriz dispersa (CSR) vendedores × OEM con las visitas sumadas de cada par presente en df.
+
+    Los pares con filas pero sin visitas quedan como ceros explícitos, para que la fila de un vendedor
+    liste todos sus OEM.
+    """
+    codigos_vendedor, vendedores = pd.factorize(df['Vendedores'], sort=True)
+    codigos_oem, oems = pd.factorize(df['OEM'], sort=True)
+    validas = (codigos_vendedor >= 0) & (codigos_oem >= 0)
+    visitas = pd.to_numeric(df['Visitas'], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)[validas]
+    matriz = sparse.csr_matrix((np.nan_to_num(visitas), (codigos_vendedor[validas], codigos_oem[validas])),
+                               shape=(len(vendedores), len(oems)))
+    return matriz, pd.Index(vendedores, name='Vendedores'), pd.Index(oems, name='OEM')
+
+def cuotas_de_mercado(df, top=5):
+    """Cuotas de visitas de todos los vendedores en todos los OEM, a partir de la matriz vendedor × OEM.
+
+    Devuelve la matriz de cuotas (cada OEM suma 1), la de pesos (cada vendedor suma 1), el top de
+    OEMs por cuota de cada vendedor y la concentración de cada OEM (HHI, de 0 a 10.000).
+    """
+    matriz, vendedores, oems = matriz_vendedor_oem(df)
+    total_oem = np.asarray(matriz.sum(axis=0)).ravel()
+    total_vendedor = np.asarray(matriz.sum(axis=1)).ravel()
+    filas = np.repeat(np.arange(matriz.shape[0]), np.diff(matriz.indptr))
+    # Normalización por columnas y por filas escalando directamente los valores guardados
+    cuotas = matriz.copy()
+    cuotas.data = matriz.data * _inversa(total_oem)[matriz.indices]
+    pesos = matriz.copy()
+    pesos.data = matriz.data * _inversa(total_vendedor)[filas]
+
+    # Top por vendedor: dentro de cada fila, de mayor a menor cuota (empates por orden de OEM)
+    orden = np.lexsort((matriz.indices, -cuotas.data, filas))
+    puesto = np.arange(len(orden)) - matriz.indptr[filas[orden]]
+    orden = orden[puesto < top]
+    top_vendedores = pd.DataFrame({'Vendedores': vendedores[filas[orden]], 'Puesto': puesto[puesto < top] + 1,
+                                   'OEM': oems[matriz.indices[orden]], 'Visitas': matriz.data[orden],
+                                   'Cuota': cuotas.data[orden], 'Peso en el Vendedor': pesos.data[orden]})
+
+    concentracion = pd.DataFrame({'Visitas': total_oem,
+                                  'Vendedores': np.bincount(matriz.indices[matriz.data > 0], minlength=len(oems)),
+                                  'HHI': 10000 * np.bincount(matriz.indices, weights=cuotas.data ** 2, minlength=len(oems))},
+                                 index=oems)
+    if matriz.nnz:
+        concentracion['Líder'] = vendedores[np.asarray(cuotas.argmax(axis=0)).ravel()]
+        concentracion['Cuota del Líder'] = cuotas.max(axis=0).toarray().ravel()
+    return {'matriz': matriz, 'cuotas': cuotas, 'pesos': pesos, 'vendedores': vendedores, 'oems': oems,
+            'top': top_vendedores, 'concentracion': concentracion}
+
+def reporte_todos_vendedores(datos, top=20):
+    """Todas las métricas de Estrategia Actual para todos los vendedores, en formato largo.
+
+    Parte de los agregados ya calculados para el rango (datos_vendedores): cada métrica es un top por
+    vendedor sobre una tabla agrupada, sin recorrer las filas por vendedor. Columnas: Vendedores,
+    Métrica, Puesto, Clave (título, OEM o categoría) y Valor.
+    """
+    estadisticas = datos['estadisticas']
+    metricas = [('Visitas por Título', 'Título', 'Visitas'),
+                ('Visitas por OEM', 'OEM', 'Visitas'),
+                ('Publicaciones por Categoría', 'Categoría', 'Cantidad'),
+                ('Cantidad Disponible por Título', 'Título', 'Cantidad Disponible'),
+                ('Health Medio por Categoría', 'Categoría', 'Estado de Salud')]
+    tablas = []
+    for metrica, desglose, columna in metricas:
+        if desglose not in estadisticas or columna not in estadisticas[desglose].columns:
+            continue
+        tabla = estadisticas[desglose][columna].rename('Valor').reset_index().rename(columns={desglose: 'Clave'})
+        tablas.append(seleccionar_top_por_grupo(tabla, 'Vendedores', 'Valor', top).assign(Métrica=metrica))
+    if 'cuotas' in datos:
+        # Eficiencia en el mercado (OEM): cuota del vendedor en cada OEM que vende, desde la matriz dispersa
+        analisis = datos['cuotas']
+        cuotas = analisis['cuotas']
+        filas = np.repeat(np.arange(cuotas.shape[0]), np.diff(cuotas.indptr))
+        tabla = pd.DataFrame({'Vendedores': analisis['vendedores'][filas], 'Clave': analisis['oems'][cuotas.indices],
+                              'Valor': cuotas.data})
+        tablas.append(seleccionar_top_por_grupo(tabla, 'Vendedores', 'Valor', top).assign(Métrica='Eficiencia OEM'))
+    resumen = estadisticas['Vendedores']
+    if 'Visitas' in resumen.columns and 'Títulos' in resumen.columns:
+        eficiencia = (resumen['Visitas'] / resumen['Títulos'].where(resumen['Títulos'] > 0)).rename('Valor').reset_index()
+        tablas.append(eficiencia.assign(Clave=None, Puesto=1, Métrica='Eficiencia del Vendedor'))
+    if not tablas:
+        return pd.DataFrame(columns=['Vendedores', 'Métrica', 'Puesto', 'Clave', 'Valor'])
+    for tabla in tablas:
+        # Títulos, OEM y categorías van juntos en 'Clave': se guardan como texto
+        tabla['Clave'] = tabla['Clave'].astype('string')
+        tabla['Vendedores'] = tabla['Vendedores'].astype('string')
+    reporte = pd.concat(tablas, ignore_index=True)[['Vendedores', 'Métrica', 'Puesto', 'Clave', 'Valor']]
+    reporte['Vendedores'] = reporte['Vendedores'].astype('category')
+    reporte['Métrica'] = reporte['Métrica'].astype('category')
+    reporte['Puesto'] = reporte['Puesto'].astype(np.int16)
+    reporte['Valor'] = reporte['Valor'].astype(np.float64)
+    return reporte.sort_values(['Vendedores', 'Métrica', 'Puesto'], kind='stable', ignore_index=True)
+
+def cuotas_de_vendedor(analisis, vendedor):
+    """Cuota del vendedor en cada OEM del mercado (0 donde no tiene visitas), como Serie indexada por OEM."""
+    cuotas = np.zeros(len(analisis['oems']))
+    try:
+        fila = analisis['vendedores'].get_loc(vendedor)
+    except KeyError:
+        return pd.Series(cuotas, index=analisis['oems'])
+    matriz = analisis['cuotas']
+    inicio, fin = matriz.indptr[fila], matriz.indptr[fila + 1]
+    cuotas[matriz.indices[inicio:fin]] = matriz.data[inicio:fin]
+    return pd.Series(cuotas, index=analisis['oems'])
+
+# --- Tabla combinada por publicación ---
+COLUMNAS_PUBLICACION = ['Categoría', 'Título', 'OEM', 'Visitas', 'Cantidad Disponible', 'Estado de Salud', 'permalink', 'ID']
+
+def _alinear(agregado, claves):
+    """Valor del agregado (indexado por grupo) para cada clave; NaN si la clave no tiene grupo."""
+    codigos = agregado.index.get_indexer(claves)
+    if (codigos >= 0).all():
+        return agregado.to_numpy()[codigos]
+    valores = agregado.to_numpy(dtype=np.float64)[codigos]
+    valores[codigos < 0] = np.nan
+    return valores
+
+def construir_dataframe_combinado(df, visitas_totales_oem=None):
+    """Una fila por publicación distinta con Cantidad Publicaciones, Visitas por OEM, Eficiencia Vendedor,
+    Eficiencia OEM y Health Medio Categoria.
+
+    Los agregados salen de un groupby por columna y se alinean por posición sobre las filas sin
+    duplicados, así la única tabla que se arma es el resultado. visitas_totales_oem son las visitas
+    de todo el mercado por OEM (por defecto las de df).
+    """
+    posiciones = np.flatnonzero(~df.duplicated(subset=COLUMNAS_PUBLICACION).to_numpy())
+    filas = {columna: df[columna].take(posiciones).reset_index(drop=True) for columna in COLUMNAS_PUBLICACION}
+
+    publicaciones = df.groupby('Categoría', observed=True).size()
+    visitas_oem = df.groupby('OEM', observed=True)['Visitas'].sum()
+    health_medio = df.groupby('Categoría', observed=True)['Estado de Salud'].mean()
+    if visitas_totales_oem is None:
+        visitas_totales_oem = visitas_oem
+    total_titulos = df['Título'].nunique()
+    eficiencia_vendedor = df['Visitas'].sum() / total_titulos if total_titulos > 0 else 0
+
+    visitas_por_oem = _alinear(visitas_oem, filas['OEM'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        eficiencia_oem = visitas_por_oem / _alinear(visitas_totales_oem, filas['OEM'])
+    columnas = {
+        'Categoría': filas['Categoría'], 'Título': filas['Título'], 'OEM': filas['OEM'], 'Visitas': filas['Visitas'],
+        'Cantidad Disponible': filas['Cantidad Disponible'], 'Estado de Salud': filas['Estado de Salud'],
+        'Cantidad Publicaciones': _alinear(publicaciones, filas['Categoría']),
+        'Visitas por OEM': visitas_por_oem,
+        'Eficiencia Vendedor': np.full(len(posiciones), eficiencia_vendedor),
+        'permalink': filas['permalink'], 'ID': filas['ID'],
+        'Eficiencia OEM': eficiencia_oem,
+        'Health Medio Categoria': _alinear(health_medio, filas['Categoría']),
+    }
+    # Las columnas numéricas sin dato quedan en 0 (las categóricas no aceptan el 0 como valor)
+    for nombre, valores in columnas.items():
+        valores = pd.Series(valores, copy=False)
+        if pd.api.types.is_numeric_dtype(valores) and valores.hasnans:
+            valores = valores.fillna(0)
+        columnas[nombre] = valores
+    return pd.DataFrame(columnas)
+
+def preparar_datos(df):
+    """Etapas que se aplican una sola vez al cargar, antes de guardar los datos en caché."""
+    df = compactar_tipos(df)
+    df = agregar_columnas_tags(df)
+    df = ordenar_por_fecha(df)
+    return df
+
+# --- Snapshots columnares (Parquet / Feather) ---
+def guardar_snapshot(df, destino, formato='parquet'):
+    """Guarda el DataFrame normalizado como snapshot columnar (ruta o buffer)."""
+    if formato == 'feather':
+        # Sin compresión para que la lectura con memory map no tenga que descomprimir
+        feather.write_feather(df.reset_index(drop=True), destino, compression='uncompressed')
+    else:
+        df.to_parquet(destino, index=False)
+
+def convertir_excel_a_snapshot(ruta_excel, destino, formato='parquet'):
+    """Conversión única de un export de Excel a snapshot con el esquema ya renombrado."""
+    df = normalizar_columnas(pd.read_excel(ruta_excel))
+    guardar_snapshot(df, destino, formato)
+    return df
+
+def snapshot_en_bytes(df, formato='parquet'):
+    """Snapshot del DataFrame en memoria, para ofrecerlo como descarga."""
+    buffer = io.BytesIO()
+    guardar_snapshot(df, buffer, formato)
+    return buffer.getvalue()
+
+# --- Exportación a demanda ---
+def exportar_tabla(df, extension, destino, filas_por_bloque=FILAS_POR_BLOQUE_EXPORTACION):
+    """Escribe df en destino (archivo binario) de a bloques de filas: CSV comprimido con gzip o Parquet con zstd.
+
+    Nunca se arma el archivo completo como texto en memoria.
+    """
+    if extension == 'parquet':
+        esquema = pa.Schema.from_pandas(df, preserve_index=False)
+        with pq.ParquetWriter(destino, esquema, compression='zstd') as escritor:
+            for inicio in range(0, len(df), filas_por_bloque):
+                bloque = df.iloc[inicio:inicio + filas_por_bloque]
+                escritor.write_table(pa.Table.from_pandas(bloque, schema=esquema, preserve_index=False))
+        return
+    with gzip.GzipFile(fileobj=destino, mode='wb') as comprimido:
+        texto = io.TextIOWrapper(comprimido, encoding='utf-8', newline='')
+        for inicio in range(0, max(len(df), 1), filas_por_bloque):
+            df.iloc[inicio:inicio + filas_por_bloque].to_csv(texto, index=False, header=inicio == 0)
+        texto.flush()
+        texto.detach()
+
+@st.fragment
+def boton_exportar(df, nombre, clave):
+    """Ofrece df para descargar. El archivo solo se genera al pedirlo, así los reruns no serializan la tabla.
+    df puede ser una función que arma la tabla, para exportar su contenido al momento de pedirla.
+
+    st.download_button necesita el contenido completo, así que el archivo comprimido queda en memoria
+    (el CSV sin comprimir nunca se arma entero): el pico es del orden del tamaño comprimido.
+    """
+    formato = st.radio(f"Formato de descarga ({nombre})", list(FORMATOS_EXPORTACION), horizontal=True,
+                       key=f'{clave}_formato')
+    if not st.button("Preparar descarga", key=f'{clave}_preparar'):
+        return
+    if callable(df):
+        df = df()
+    extension, mime = FORMATOS_EXPORTACION[formato]
+    datos = io.BytesIO()
+    exportar_tabla(df, extension, datos)
+    st.download_button(f"Descargar {nombre}.{extension}", data=datos, file_name=f'{nombre}.{extension}',
+                       mime=mime, key=f'{clave}_descargar')
+
+def clave_archivo(carga_archivo):
+    """Hash del archivo cargado. Se recuerda por sesión para no recalcularlo en cada rerun."""
+    hashes = st.session_state.setdefault('_hashes_archivos', {})
+    file_id = getattr(carga_archivo, 'file_id', None)
+    if file_id is None or file_id not in hashes:
+        clave = hash_contenido(carga_archivo.getbuffer())
+        if file_id is None:
+            return clave
+        hashes[file_id] = clave
+    return hashes[file_id]
+
+def _leer_excel_con_progreso(carga_archivo):
+    # Lectura por bloques mostrando una barra de progreso
+    barra = st.progress(0.0, text="Leyendo el archivo por bloques...")
+
+    def al_avanzar(leidas, total):
+        fraccion = min(leidas / total, 1.0) if total else 0.0
+        barra.progress(fraccion, text=f"Leyendo el archivo por bloques... {leidas:,} filas")
+
+    try:
+        return leer_excel_por_bloques(carga_archivo, al_avanzar=al_avanzar)
+    finally:
+        barra.empty()
+
+def leer_archivo(fuente, nombre, por_bloques=False, hoja=0):
+    """Lee un Excel (la hoja indicada) o un snapshot, desde un archivo cargado o una ruta,
+    y devuelve el DataFrame normalizado."""
+    if por_bloques and formato_archivo(nombre) not in FORMATOS_SNAPSHOT:
+        if hasattr(fuente, 'seek'):
+            fuente.seek(0)
+        return _leer_excel_con_progreso(fuente)
+    return leer_hoja(fuente, nombre, hoja)
+
+# --- Lectura en paralelo de varios archivos y hojas ---
+def _hojas_archivo(nombre, ruta):
+    # Hojas a leer de cada archivo (los snapshots tienen una sola tabla)
+    if formato_archivo(nombre) in FORMATOS_SNAPSHOT:
+        return [0]
+    libro = openpyxl.load_workbook(ruta, read_only=True)
+    try:
+        return libro.sheetnames
+    finally:
+        libro.close()
+
+def _a_temporal(fuente, nombre):
+    # Escribe un archivo cargado en un temporal del disco, por bloques, y devuelve su ruta
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(nombre)[1], delete=False) as temporal:
+        fuente.seek(0)
+        shutil.copyfileobj(fuente, temporal, 8 * 1024 * 1024)
+    return temporal.name
+
+def parsear_en_paralelo(fuentes, procesos=PROCESOS_LECTURA):
+    """Lee todas las hojas de varios archivos en un pool de procesos.
+
+    fuentes es una lista de (nombre, archivo cargado o ruta). Devuelve la lista de (nombre, DataFrame)
+    con las hojas de cada archivo ya unidas en el esquema normalizado, en el mismo orden de fuentes,
+    y un DataFrame con el tiempo de lectura de cada hoja.
+    """
+    # Cada archivo cargado se escribe una sola vez a un temporal: a los procesos solo viaja la ruta
+    tareas = []
+    archivo_de_tarea = []
+    temporales = []
+    try:
+        for i, (nombre, fuente) in enumerate(fuentes):
+            if isinstance(fuente, (str, os.PathLike)):
+                ruta = fuente
+            else:
+                ruta = _a_temporal(fuente, nombre)
+                temporales.append(ruta)
+            for hoja in _hojas_archivo(nombre, ruta):
+                tareas.append((nombre, ruta, hoja))
+                archivo_de_tarea.append(i)
+
+        if procesos <= 1 or len(tareas) <= 1:
+            resultados = [parsear_hoja(*tarea) for tarea in tareas]
+        else:
+            # Los procesos nacen de un servidor (forkserver) y no de este proceso con hilos de Streamlit y
+            # TensorFlow: un fork con hilos puede dejar al hijo bloqueado. Solo se precarga el lector
+            contexto = multiprocessing.get_context('forkserver')
+            contexto.set_forkserver_preload(['lectura_snapshots'])
+            with ProcessPoolExecutor(max_workers=min(procesos, len(tareas)), mp_context=contexto) as pool:
+                futuros = [pool.submit(parsear_hoja, *tarea) for tarea in tareas]
+                resultados = [futuro.result() for futuro in futuros]
+    finally:
+        for ruta in temporales:
+            os.remove(ruta)
+
+    hojas_por_archivo = [[] for _ in fuentes]
+    tiempos = []
+    for i, (nombre, _, hoja), (df, segundos) in zip(archivo_de_tarea, tareas, resultados):
+        hojas_por_archivo[i].append(df)
+        tiempos.append({'Archivo': nombre, 'Hoja': hoja, 'Filas': len(df), 'Segundos': round(segundos, 3)})
+
+    leidos = [(nombre, pd.concat(hojas, ignore_index=True)) for (nombre, _), hojas in zip(fuentes, hojas_por_archivo)]
+    return leidos, pd.DataFrame(tiempos)
+
+def cargar_datos(carga_archivo, por_bloques=False):
+    """Devuelve el DataFrame normalizado del archivo; solo lo lee la primera vez que se ve su contenido.
+
+    Con por_bloques=True los Excel se leen fila a fila (menor pico de memoria, con barra de progreso).
+    """
+    clave = clave_archivo(carga_archivo)
+    cache = _cache_cargas()
+    df = cache_lru_obtener(cache, clave)
+    if df is None:
+        # Tras un reinicio del servidor el archivo ya procesado se lee del caché en disco
+        df = derivado_en_disco(clave, 'datos', (),
+                               lambda: preparar_datos(leer_archivo(carga_archivo, carga_archivo.name, por_bloques)))
+        df.attrs['clave_datos'] = clave
+        cache_lru_guardar(cache, clave, df, df.attrs['reporte_memoria']['memoria_despues'])
+        if 'OEM' in df.columns:
+            indice_oem(df)
+    # Copia superficial: las columnas que agreguen las páginas no alteran la versión en caché
+    return df.copy(deep=False)
+
+# --- Base histórica incremental (snapshots diarios) ---
+def _rutas_base(directorio=None):
+    directorio = directorio or DIRECTORIO_DATOS
+    return {'partes': os.path.join(directorio, 'partes'),
+            'claves': os.path.join(directorio, 'claves'),
+            'registro': os.path.join(directorio, 'archivos_incorporados.json')}
+
+def _escribir_atomico(ruta, escribir):
+    # Escribe en un temporal y lo renombra, para no dejar archivos a medio escribir
+    temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+    try:
+        escribir(temporal)
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+
+def _guardar_npy(ruta, arreglo):
+    with open(ruta, 'wb') as archivo:
+        np.save(archivo, arreglo)
+
+def _guardar_json(ruta, datos):
+    with open(ruta, 'w', encoding='utf-8') as archivo:
+        json.dump(datos, archivo, ensure_ascii=False)
+
+def hash_claves(df):
+    """Hash de 64 bits de la clave (ID, Fecha) de cada fila."""
+    claves = pd.DataFrame({'ID': df['ID'].astype(str), 'Fecha': df['Fecha']})
+    return pd.util.hash_pandas_object(claves, index=False).to_numpy()
+
+def carpeta_de_entrada(subcarpeta=''):
+    """Ruta real de una subcarpeta de DIRECTORIO_ENTRADA, o None si no hay carpeta de entrada o la ruta sale de ella."""
+    if not DIRECTORIO_ENTRADA:
+        return None
+    raiz = os.path.realpath(DIRECTORIO_ENTRADA)
+    ruta = os.path.realpath(os.path.join(raiz, subcarpeta))
+    return ruta if os.path.commonpath([raiz, ruta]) == raiz else None
+
+def snapshots_de_carpeta(carpeta):
+    """(nombre, ruta) de los snapshots de una carpeta ya validada, sin seguir enlaces que salgan de la carpeta de entrada."""
+    fuentes = []
+    for nombre in sorted(os.listdir(carpeta)):
+        ruta = os.path.join(carpeta, nombre)
+        if formato_archivo(nombre) in ['xlsx'] + FORMATOS_SNAPSHOT and os.path.isfile(ruta) and carpeta_de_entrada(ruta):
+            fuentes.append((nombre, ruta))
+    return fuentes
+
+def partes_base(directorio=None):
+    """Archivos Parquet que forman la base histórica, en orden de incorporación."""
+    carpeta = _rutas_base(directorio)['partes']
+    if not os.path.isdir(carpeta):
+        return []
+    return sorted(os.path.join(carpeta, nombre) for nombre in os.listdir(carpeta) if nombre.endswith('.parquet'))
+
+@contextmanager
+def bloqueo_base(directorio=None):
+    """Bloqueo exclusivo (flock) de la base histórica, compartido entre sesiones y procesos del servidor."""
+    directorio = directorio or DIRECTORIO_DATOS
+    os.makedirs(directorio, exist_ok=True)
+    with open(os.path.join(directorio, '.bloqueo'), 'w') as archivo:
+        fcntl.flock(archivo, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+def incorporar_snapshots(fuentes, directorio=None, procesos=PROCESOS_LECTURA):
+    """Agrega a la base solo las filas con (ID, Fecha) nuevas.
+
+    fuentes es una lista de (nombre, archivo cargado o ruta). Los archivos ya incorporados se
+    reconocen por su hash y no se vuelven a leer; las rutas del servidor ya vistas se reconocen antes
+    por (ruta, tamaño, fecha de modificación), sin abrirlas. Los nuevos se leen en paralelo (todas sus hojas)
+    con parsear_en_paralelo. El índice de claves está particionado por día, así cada carga solo
+    consulta los días que trae: el costo depende del snapshot nuevo y no del tamaño de la historia.
+
+    Toda la incorporación se hace con el bloqueo exclusivo de la base (bloqueo_base): si dos sesiones
+    incorporan a la vez, la segunda espera y ve las claves que agregó la primera.
+    """
+    with bloqueo_base(directorio):
+        return _incorporar_snapshots(fuentes, directorio, procesos)
+
+def _incorporar_snapshots(fuentes, directorio, procesos):
+    # Cuerpo de incorporar_snapshots: el registro y las claves por día se leen y escriben con el bloqueo tomado
+    rutas = _rutas_base(directorio)
+    os.makedirs(rutas['partes'], exist_ok=True)
+    os.makedirs(rutas['claves'], exist_ok=True)
+    registro = {}
+    if os.path.exists(rutas['registro']):
+        with open(rutas['registro'], encoding='utf-8') as archivo:
+            registro = json.load(archivo)
+
+    resumen = {'archivos': 0, 'omitidos': 0, 'filas_nuevas': 0, 'filas_duplicadas': 0}
+    huellas_conocidas = {tuple(huella) for datos in registro.values() for huella in datos.get('huellas', [])}
+    registro_modificado = False
+    pendientes = []
+    claves = []
+    huellas = []
+    for nombre, fuente in fuentes:
+        huella = None
+        if isinstance(fuente, (str, os.PathLike)):
+            informacion = os.stat(fuente)
+            huella = [os.path.realpath(fuente), informacion.st_size, informacion.st_mtime_ns]
+            if tuple(huella) in huellas_conocidas:
+                resumen['omitidos'] += 1
+                continue
+            with open(fuente, 'rb') as archivo:
+                clave = hash_contenido(archivo.read())
+        else:
+            clave = clave_archivo(fuente)
+        if clave in registro or clave in claves:
+            if huella is not None and clave in registro:
+                # Mismo contenido ya incorporado: se recuerda la ruta para no volver a leerla
+                registro[clave].setdefault('huellas', []).append(huella)
+                registro_modificado = True
+            resumen['omitidos'] += 1
+            continue
+        pendientes.append((nombre, fuente))
+        claves.append(clave)
+        huellas.append(huella)
+    if registro_modificado:
+        _escribir_atomico(rutas['registro'], lambda ruta: _guardar_json(ruta, registro))
+
+    leidos, resumen['tiempos'] = parsear_en_paralelo(pendientes, procesos)
+
+    for (nombre, nuevos), clave, huella in zip(leidos, claves, huellas):
+        faltantes = [columna for columna in COLUMNAS_CLAVE if columna not in nuevos.columns]
+        if faltantes:
+            raise ValueError(f"El archivo '{nombre}' no tiene las columnas {faltantes}")
+
+        # Duplicados dentro del mismo archivo
+        hashes = hash_claves(nuevos)
+        conservar = ~pd.Index(hashes).duplicated()
+
+        # Duplicados contra la base, consultando solo los días presentes en el archivo
+        dias = nuevos['Fecha'].dt.strftime('%Y-%m-%d').fillna('sin-fecha').to_numpy()
+        claves_por_dia = {}
+        for dia, posiciones in pd.Series(dias).groupby(dias).indices.items():
+            ruta_dia = os.path.join(rutas['claves'], f'{dia}.npy')
+            existentes = np.load(ruta_dia) if os.path.exists(ruta_dia) else np.empty(0, dtype=np.uint64)
+            if len(existentes):
+                repetidas = pd.Series(hashes[posiciones]).isin(existentes).to_numpy()
+                conservar[posiciones] &= ~repetidas
+            claves_por_dia[dia] = (ruta_dia, existentes, posiciones)
+
+        filas_nuevas = int(conservar.sum())
+        resumen['filas_duplicadas'] += len(nuevos) - filas_nuevas
+        if filas_nuevas:
+            parte = os.path.join(rutas['partes'], f'parte-{time.strftime("%Y%m%d%H%M%S")}-{clave[:12]}.parquet')
+            _escribir_atomico(parte, lambda ruta: nuevos[conservar].to_parquet(ruta, index=False))
+            for dia, (ruta_dia, existentes, posiciones) in claves_por_dia.items():
+                agregadas = hashes[posiciones][conservar[posiciones]]
+                if len(agregadas):
+                    _escribir_atomico(ruta_dia, lambda ruta: _guardar_npy(ruta, np.concatenate([existentes, agregadas])))
+        registro[clave] = {'nombre': nombre, 'filas_nuevas': filas_nuevas, 'huellas': [huella] if huella else []}
+        _escribir_atomico(rutas['registro'], lambda ruta: _guardar_json(ruta, registro))
+        resumen['archivos'] += 1
+        resumen['filas_nuevas'] += filas_nuevas
+    return resumen
+
+def parte_preparada(ruta):
+    """Parte de la base con preparar_datos ya aplicado, guardada en el caché en disco.
+
+    Las partes no cambian una vez escritas y su nombre lleva el hash del archivo de origen, así que
+    nombre y tamaño bastan como huella: cada parte se prepara una sola vez.
+    """
+    huella = hash_contenido(f'{os.path.basename(ruta)}|{os.path.getsize(ruta)}'.encode('utf-8'))
+    return derivado_en_disco(huella, 'parte', (), lambda: preparar_datos(pd.read_parquet(ruta)))
+
+def _bits_en_diccionario(df, posicion_global, palabras):
+    # Traduce la máscara de bits de una parte (según su propio diccionario) a las posiciones del diccionario común
+    columnas = columnas_bits_tags(df)
+    if not columnas:
+        return np.zeros((len(df), palabras), dtype=np.uint64)
+    # Se traducen las combinaciones distintas y se reparten a las filas
+    unicas, inversa = np.unique(df[columnas].to_numpy(dtype=np.uint64), axis=0, return_inverse=True)
+    nuevas = np.zeros((len(unicas), palabras), dtype=np.uint64)
+    for posicion, tag in enumerate(df.attrs.get('diccionario_tags', [])):
+        destino = posicion_global[tag]
+        presente = (unicas[:, posicion // 64] >> np.uint64(posicion % 64)) & np.uint64(1)
+        nuevas[:, destino // 64] |= presente << np.uint64(destino % 64)
+    return nuevas[inversa.ravel()]
+
+def unir_partes(partes):
+    """Une partes ya preparadas sin volver a decodificar los tags ni compactar desde cero.
+
+    Las categóricas se unen con union_categoricals y la máscara de tags de cada parte se traduce
+    al diccionario común. Si las partes quedan en orden de fecha no se vuelve a ordenar.
+    """
+    if len(partes) == 1:
+        return partes[0]
+    con_tags = any(columnas_bits_tags(parte) for parte in partes)
+    diccionario = sorted({tag for parte in partes for tag in parte.attrs.get('diccionario_tags', [])})
+    columnas_comunes = [columna for columna in partes[0].columns if all(columna in parte.columns for parte in partes)]
+    categoricas = [columna for columna in columnas_comunes
+                   if all(isinstance(parte[columna].dtype, pd.CategoricalDtype) for parte in partes)]
+    df = pd.concat([parte.drop(columns=categoricas + columnas_bits_tags(parte)) for parte in partes],
+                   ignore_index=True)
+    for columna in categoricas:
+        df[columna] = union_categoricals([parte[columna] for parte in partes])
+    if con_tags:
+        posicion_global = {tag: posicion for posicion, tag in enumerate(diccionario)}
+        palabras = max(1, -(-len(diccionario) // 64))
+        bits = np.concatenate([_bits_en_diccionario(parte, posicion_global, palabras) for parte in partes])
+        for palabra in range(palabras):
+            df[f'tags_bits_{palabra}'] = bits[:, palabra]
+        df.attrs['diccionario_tags'] = diccionario
+    # Columnas que quedaron como categóricas en unas partes y texto en otras
+    df = _compactar_categoricas(df)
+
+    reportes = [parte.attrs.get('reporte_memoria', {}) for parte in partes]
+    df.attrs['reporte_memoria'] = {'memoria_antes': sum(reporte.get('memoria_antes', 0) for reporte in reportes),
+                                   'memoria_despues': int(df.memory_usage(index=True, deep=True).sum()),
+                                   'groupby_antes': None, 'groupby_despues': None}
+    if 'Fecha' in df.columns:
+        if df['Fecha'].is_monotonic_increasing:
+            df.attrs['ordenado_por_fecha'] = True
+        else:
+            df = ordenar_por_fecha(df)
+    return df
+
+def cargar_base(directorio=None):
+    """Carga la base histórica completa; se vuelve a armar solo cuando se incorporan partes nuevas.
+
+    Cada parte se prepara una vez (parte_preparada) y al incorporar un snapshot solo se prepara la
+    parte nueva; las anteriores se leen ya preparadas y se unen con unir_partes.
+    """
+    partes = partes_base(directorio)
+    if not partes:
+        return None
+    clave = 'base:' + hash_contenido('|'.join(partes).encode('utf-8'))
+    cache = _cache_cargas()
+    df = cache_lru_obtener(cache, clave)
+    if df is None:
+        df = unir_partes([parte_preparada(parte) for parte in partes])
+        df.attrs['clave_datos'] = clave
+        cache_lru_guardar(cache, clave, df, df.attrs['reporte_memoria']['memoria_despues'])
+        if 'OEM' in df.columns:
+            indice_oem(df)
+    return df.copy(deep=False)
+
+# --- Caché en disco de tablas derivadas ---
+def _ruta_en_disco(huella, nombre, parametros, directorio=None):
+    clave = repr((huella, nombre, VERSIONES_DERIVADOS[nombre]) + tuple(parametros))
+    return os.path.join(directorio or DIRECTORIO_CACHE, f'{nombre}-{hash_contenido(clave.encode("utf-8"))[:32]}.parquet')
+
+def derivado_en_disco(huella, nombre, parametros, construir):
+    """Tabla guardada en Parquet en DIRECTORIO_CACHE para (huella, nombre, parametros), o construida y guardada.
+
+    La clave incluye la versión del cálculo (VERSIONES_DERIVADOS). La escritura es atómica y cada
+    lectura actualiza la fecha del archivo, que es la que usa recortar_cache_disco para descartar.
+    """
+    if huella is None:
+        return construir()
+    ruta = _ruta_en_disco(huella, nombre, parametros)
+    if os.path.exists(ruta):
+        try:
+            tabla = pd.read_parquet(ruta)
+            os.utime(ruta)
+            return tabla
+        except (OSError, pa.ArrowException):
+            pass  # Archivo borrado por el descarte o ilegible: se vuelve a calcular
+    tabla = construir()
+    if tabla is None:
+        return None
+    try:
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        _escribir_atomico(ruta, lambda temporal: tabla.to_parquet(temporal))
+        recortar_cache_disco()
+    except (OSError, ValueError, TypeError, pa.ArrowException):
+        pass  # Tipos que Parquet no admite o disco lleno: la tabla se usa igual, sin guardarla
+    return tabla
+
+def _archivos_cache_disco(directorio=None):
+    # (última lectura, tamaño, ruta) de cada tabla guardada
+    directorio = directorio or DIRECTORIO_CACHE
+    if not os.path.isdir(directorio):
+        return []
+    archivos = []
+    for entrada in os.scandir(directorio):
+        if entrada.name.endswith('.parquet'):
+            try:
+                informacion = entrada.stat()
+            except FileNotFoundError:
+                continue
+            archivos.append((informacion.st_mtime, informacion.st_size, entrada.path))
+    return archivos
+
+def recortar_cache_disco(directorio=None, max_bytes=MAX_BYTES_CACHE_DISCO):
+    """Borra las tablas leídas hace más tiempo hasta que el caché ocupe como máximo max_bytes. Devuelve los bytes ocupados."""
+    archivos = sorted(_archivos_cache_disco(directorio))
+    total = sum(tamano for _, tamano, _ in archivos)
+    # Siempre conserva la más reciente
+    for _, tamano, ruta in archivos[:-1]:
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+        total -= tamano
+    return total
+
+def vaciar_cache_disco(directorio=None):
+    """Borra todas las tablas del caché en disco. Devuelve cuántas se borraron."""
+    archivos = _archivos_cache_disco(directorio)
+    for _, _, ruta in archivos:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+    return len(archivos)
+
+def panel_cache_cargas():
+    """Muestra en la barra lateral los contadores del caché de archivos y permite vaciarlo."""
+    cache = _cache_cargas()
+    estadisticas = cache_lru_estadisticas(cache)
+    with st.sidebar.expander("Caché de archivos"):
+        st.write(f"Archivos en caché: {estadisticas['entradas']} ({estadisticas['bytes'] / (1024 * 1024):.1f} MB)")
+        st.write(f"Aciertos: {estadisticas['aciertos']} - Fallos: {estadisticas['fallos']}")
+        figuras = cache_lru_estadisticas(_cache_figuras())
+        st.write(f"Gráficos en caché: {figuras['entradas']} ({figuras['bytes'] / (1024 * 1024):.1f} MB) - "
+                 f"Aciertos: {figuras['aciertos']}")
+        sesion = cache_lru_estadisticas(_cache_sesion())
+        st.write(f"Tablas derivadas de esta sesión: {sesion['entradas']} ({sesion['bytes'] / (1024 * 1024):.1f} MB)")
+        en_disco = _archivos_cache_disco()
+        st.write(f"Tablas en disco: {len(en_disco)} ({sum(tamano for _, tamano, _ in en_disco) / (1024 * 1024):.1f} MB)")
+        if st.button("Vaciar caché de archivos"):
+            eliminadas = cache_lru_eliminar(cache)
+            cache_lru_eliminar(_cache_cubos())
+            cache_lru_eliminar(_cache_indices_oem())
+            cache_lru_eliminar(_cache_vendedores())
+            cache_lru_eliminar(_cache_agregados_oem())
+            cache_lru_eliminar(_cache_figuras())
+            cache_lru_eliminar(_cache_sesion())
+            vaciar_cache_disco()
+            st.session_state.pop('_hashes_archivos', None)
+            st.write(f"Se eliminaron {eliminadas} archivos del caché.")
+
 def main():
     # Titulo
     st.title('ANALIZADOR DE MERCADO PARA MERCADO LIBRE')
@@ -50,8 +1685,60 @@ def main():
     menu = ['Página Principal', 'Mercado', 'Estrategia Actual', 'Competencia', 'Estrategia Futura', 'Redes Neuronales']
     seleccion = st.sidebar.selectbox('Menu de Navegación', menu)
 
+    def carga_incremental():
+        # Snapshots diarios: se agregan a la base histórica solo las filas (ID, Fecha) nuevas
+        cargas = st.file_uploader("Cargue uno o más snapshots diarios (Excel o Parquet/Feather)",
+                                  type=['xlsx'] + FORMATOS_SNAPSHOT, accept_multiple_files=True)
+        # Solo se aceptan carpetas dentro de la carpeta de entrada configurada en el servidor
+        carpeta = st.text_input("...o indique una subcarpeta de la carpeta de entrada del servidor") if DIRECTORIO_ENTRADA else ''
+        procesos = st.number_input("Procesos de lectura en paralelo", min_value=1, max_value=os.cpu_count() or 1,
+                                   value=PROCESOS_LECTURA)
+
+        if st.button("Incorporar a la base"):
+            fuentes = [(carga.name, carga) for carga in cargas or []]
+            if carpeta:
+                ruta_carpeta = carpeta_de_entrada(carpeta)
+                if ruta_carpeta is None:
+                    st.error(f"La carpeta '{carpeta}' no está dentro de la carpeta de entrada.")
+                elif os.path.isdir(ruta_carpeta):
+                    fuentes.extend(snapshots_de_carpeta(ruta_carpeta))
+                else:
+                    st.error(f"La carpeta '{carpeta}' no existe.")
+            if fuentes:
+                try:
+                    resumen = incorporar_snapshots(fuentes, procesos=int(procesos))
+                    st.success(f"Archivos incorporados: {resumen['archivos']} (ya incorporados antes: {resumen['omitidos']}). "
+                               f"Filas nuevas: {resumen['filas_nuevas']}, duplicadas descartadas: {resumen['filas_duplicadas']}.")
+                    if not resumen['tiempos'].empty:
+                        st.write("Tiempo de lectura por archivo y hoja (segundos)")
+                        st.dataframe(resumen['tiempos'])
+                except Exception as e:
+                    st.error(f"Error al incorporar los snapshots: {e}")
+            else:
+                st.warning("No se seleccionaron archivos para incorporar.")
+
+        try:
+            df = cargar_base()
+        except Exception as e:
+            st.error(f"Error al cargar la base histórica: {e}")
+            return None
+        if df is None:
+            st.info("La base histórica está vacía. Cargue snapshots para comenzar.")
+            return None
+
+        st.write(f'Base histórica: {len(df)} filas en {len(partes_base())} partes')
+        st.dataframe(df.head())
+        if 'reporte_memoria' in df.attrs:
+            st.caption(resumen_memoria(df.attrs['reporte_memoria']))
+        return df
+
     def pagina_principal():
-        carga_archivo = st.file_uploader("Cargue el archivo por favor", type=['xlsx'])
+        origen = st.radio("Origen de los datos", ['Archivo único', 'Snapshots diarios (incremental)'], horizontal=True)
+        if origen == 'Snapshots diarios (incremental)':
+            return carga_incremental()
+
+        carga_archivo = st.file_uploader("Cargue el archivo por favor (Excel o snapshot Parquet/Feather)",
+                                         type=['xlsx'] + FORMATOS_SNAPSHOT)
 
         if carga_archivo is not None:
             try:
@@ -60,38 +1747,36 @@ def main():
                     st.error(f"El archivo es demasiado grande. El tamaño máximo permitido es {MAX_FILE_SIZE / (1024 * 1024)} MB")
                     return None  # Or raise an exception, depending on your error handling
 
-                df = pd.read_excel(carga_archivo)
-
-                df = df.rename(columns={'Available Quantity': 'Cantidad Disponible',
-                                         'health': 'Estado de Salud',
-                                         'Seller2': 'Vendedores',
-                                         'Price': 'Precio',
-                                         'date_created': 'Fecha de Inicio',
-                                         'last_updated': 'Fecha de Última Actualización',
-                                         'visits': 'Visitas',
-                                         'description': 'Categoría',
-                                         'Title': 'Título',
-                                         'Fecha': 'Fecha' # Renombrar la columna 'Fecha'
-                                         })
-                # Convertir las columnas de fecha al tipo datetime si no lo son
-                #Primero intento convertir las columnas 'Fecha de Inicio' y 'Fecha de Última Actualización'
-                #Solo las convierto si existen en el DataFrame
-                if 'Fecha de Inicio' in df.columns:
-                    df['Fecha de Inicio'] = pd.to_datetime(df['Fecha de Inicio'], errors='coerce')
-                if 'Fecha de Última Actualización' in df.columns:
-                    df['Fecha de Última Actualización'] = pd.to_datetime(df['Fecha de Última Actualización'], errors='coerce')
-
-                if 'Fecha' in df.columns:
-                    df['Fecha'] = pd.to_datetime(df['Fecha'], errors='coerce')  # Convertir la columna 'Fecha'
+                # Los archivos grandes se leen por bloques para no agotar la memoria del servidor
+                por_bloques = False
+                if formato_archivo(carga_archivo.name) not in FORMATOS_SNAPSHOT:
+                    por_bloques = st.checkbox("Lectura por bloques (menor uso de memoria)",
+                                              value=carga_archivo.size > UMBRAL_LECTURA_POR_BLOQUES)
+
+                # Lectura y normalización (renombrado y fechas) con caché por contenido del archivo
+                df = cargar_datos(carga_archivo, por_bloques=por_bloques)
 
                 st.write('Datos Cargados')
                 st.dataframe(df.head())
+                if 'reporte_memoria' in df.attrs:
+                    st.caption(resumen_memoria(df.attrs['reporte_memoria']))
+
+                # Conversión única a snapshot columnar: las próximas cargas leen el Parquet en lugar del Excel
+                if formato_archivo(carga_archivo.name) not in FORMATOS_SNAPSHOT:
+                    if st.button("Convertir a snapshot Parquet"):
+                        nombre_snapshot = os.path.splitext(carga_archivo.name)[0] + '.parquet'
+                        st.download_button(
+                            label="Descargar snapshot Parquet",
+                            data=snapshot_en_bytes(df),
+                            file_name=nombre_snapshot,
+                            mime='application/octet-stream',
+                        )
                 return df  # Retornar el DataFrame cargado
             except Exception as e:
                 st.error(f"Error al cargar el archivo: {e}")
                 return None
         else:
-            st.info("Por favor, cargue un archivo Excel.")
+            st.info("Por favor, cargue un archivo Excel o un snapshot Parquet/Feather.")
             return None
 
 
@@ -115,54 +1800,66 @@ def main():
         for col in feature_cols:
             df[col] = df[col].fillna(df[col].mean())
 
+        # Identifica el archivo cargado para leer del disco los resultados de K-Means ya calculados
+        huella = huella_datos(df)
+
         # Scale the features
         X = df[feature_cols].values
         scaler = StandardScaler()
         X_scaled = scaler.fit_transform(X)
 
         # --- MLP Model ---
-        if model_type == "MLP":
+        @st.fragment
+        def modelo_mlp():
             st.subheader("Red Neuronal Multicapa (MLP)")
 
-            # Encode the 'Categoría' column
-            label_encoder = LabelEncoder()
-            df['category_encoded'] = label_encoder.fit_transform(df['Categoría'])
-            num_classes = len(label_encoder.classes_)
-            y = to_categorical(df['category_encoded'], num_classes=num_classes)
-
-            # Split the data
-            X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
-
-            # Define the MLP model
-            mlp_model = Sequential([
-                Dense(128, activation='relu', input_shape=(X_train.shape[1],)),
-                Dense(64, activation='relu'),
-                Dense(num_classes, activation='softmax')
-            ])
-            mlp_model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
-
-            # Train the MLP model
             epochs = st.slider("Número de épocas (MLP)", 1, 20, 5, key="mlp_epochs")
             batch_size = st.slider("Tamaño del lote (MLP)", 16, 128, 32, key="mlp_batch_size")
-            mlp_model.fit(X_train, y_train, epochs=epochs, batch_size=batch_size, validation_data=(X_test, y_test))
-
-            # Evaluate the MLP model
-            loss, accuracy = mlp_model.evaluate(X_test, y_test, verbose=0)
-            st.write(f"Pérdida: {loss:.4f}")
-            st.write(f"Precisión: {accuracy:.4f}")
-
-            # Make predictions
-            y_prob = mlp_model.predict(X_test)
-            y_pred = np.argmax(y_prob, axis=1)
-            predicted_categories = label_encoder.inverse_transform(y_pred)
-            real_categories = label_encoder.inverse_transform(np.argmax(y_test, axis=1))
-
-            # Create results DataFrame
-            results_df = pd.DataFrame({
-                'Categoría Real': real_categories,
-                'Categoría Predicha': predicted_categories,
-                'Confianza': np.max(y_prob, axis=1)
-            })
+
+            def entrenar_mlp():
+                # Encode the 'Categoría' column
+                label_encoder = LabelEncoder()
+                df['category_encoded'] = label_encoder.fit_transform(df['Categoría'])
+                num_classes = len(label_encoder.classes_)
+                y = to_categorical(df['category_encoded'], num_classes=num_classes)
+
+                # Split the data
+                X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+
+                # Define the MLP model
+                mlp_model = Sequential([
+                    Dense(128, activation='relu', input_shape=(X_train.shape[1],)),
+                    Dense(64, activation='relu'),
+                    Dense(num_classes, activation='softmax')
+                ])
+                mlp_model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+
+                # Train the MLP model
+                mlp_model.fit(X_train, y_train, epochs=epochs, batch_size=batch_size, validation_data=(X_test, y_test))
+
+                # Evaluate the MLP model
+                loss, accuracy = mlp_model.evaluate(X_test, y_test, verbose=0)
+
+                # Make predictions
+                y_prob = mlp_model.predict(X_test)
+                y_pred = np.argmax(y_prob, axis=1)
+                predicted_categories = label_encoder.inverse_transform(y_pred)
+                real_categories = label_encoder.inverse_transform(np.argmax(y_test, axis=1))
+
+                # Create results DataFrame
+                results_df = pd.DataFrame({
+                    'Categoría Real': real_categories,
+                    'Categoría Predicha': predicted_categories,
+                    'Confianza': np.max(y_prob, axis=1)
+                })
+                results_df.attrs['perdida'] = loss
+                results_df.attrs['precision'] = accuracy
+                return results_df
+
+            # El entrenamiento se guarda en la sesión por archivo, épocas y tamaño del lote
+            results_df = derivado_en_sesion(huella, 'mlp', (epochs, batch_size), entrenar_mlp)
+            st.write(f"Pérdida: {results_df.attrs['perdida']:.4f}")
+            st.write(f"Precisión: {results_df.attrs['precision']:.4f}")
             st.write("#### Resultados de la Predicción")
             st.dataframe(results_df.head())
 
@@ -174,23 +1871,29 @@ def main():
                                     "Confianza": "Confianza"})
             st.plotly_chart(fig)
 
-
-
         # --- KMeans Model ---
-        elif model_type == "KMeans":
+        @st.fragment
+        def modelo_kmeans():
             st.subheader("Clustering con K-Means")
 
             # Determine optimal number of clusters
-            inertia = []
-            silhouette_coefficients = []
             K = range(2, 11)
 
-            for k in K:
-                kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-                kmeans.fit(X_scaled)
-                inertia.append(kmeans.inertia_)
-                score = silhouette_score(X_scaled, kmeans.labels_)
-                silhouette_coefficients.append(score)
+            def calcular_codo():
+                inertia = []
+                silhouette_coefficients = []
+                for k in K:
+                    kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
+                    kmeans.fit(X_scaled)
+                    inertia.append(kmeans.inertia_)
+                    score = silhouette_score(X_scaled, kmeans.labels_)
+                    silhouette_coefficients.append(score)
+                return pd.DataFrame({'K': list(K), 'Inercia': inertia, 'Silueta': silhouette_coefficients})
+
+            # Inercia y silueta por K, guardadas en disco por archivo
+            codo = derivado_en_disco(huella, 'kmeans_codo', (), calcular_codo)
+            inertia = codo['Inercia'].tolist()
+            silhouette_coefficients = codo['Silueta'].tolist()
 
             # Plot inertia (Elbow Method)
             st.write("#### Elbow Method for optimal K")
@@ -212,8 +1915,11 @@ def main():
 
             # K-Means Clustering
             n_clusters = st.slider("Number of clusters (K)", 2, 10, 3)
-            kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
-            clusters = kmeans.fit_predict(X_scaled)
+            def calcular_clusters():
+                kmeans = KMeans(n_clusters=n_clusters, random_state=42, n_init=10)
+                return pd.DataFrame({'Cluster': kmeans.fit_predict(X_scaled)})
+
+            clusters = derivado_en_disco(huella, 'kmeans_clusters', (n_clusters,), calcular_clusters)['Cluster'].to_numpy()
             df['Cluster'] = clusters
 
             # Analyze Clusters
@@ -230,24 +1936,15 @@ def main():
 
             # Create Scatter Plots with Cluster Coloring
             st.write("### Gráficos de Dispersión por Cluster")
-
-            # Visitas vs. Precio
-            fig_visitas_precio = px.scatter(df, x='Precio', y='Visitas', color='Cluster',
-                                            title='Visitas vs. Precio por Cluster',
-                                            labels={'Precio': 'Precio', 'Visitas': 'Visitas', 'Cluster': 'Cluster'})
-            st.plotly_chart(fig_visitas_precio)
-
-            # Visitas vs. Cantidad Disponible
-            fig_visitas_cantidad = px.scatter(df, x='Cantidad Disponible', y='Visitas', color='Cluster',
-                                                title='Visitas vs. Cantidad Disponible por Cluster',
-                                                labels={'Cantidad Disponible': 'Cantidad Disponible', 'Visitas': 'Visitas', 'Cluster': 'Cluster'})
-            st.plotly_chart(fig_visitas_cantidad)
-
-            # Visitas vs. Estado de Salud
-            fig_visitas_salud = px.scatter(df, x='Estado de Salud', y='Visitas', color='Cluster',
-                                            title='Visitas vs. Estado de Salud por Cluster',
-                                            labels={'Estado de Salud': 'Estado de Salud', 'Visitas': 'Visitas', 'Cluster': 'Cluster'})
-            st.plotly_chart(fig_visitas_salud)
+            # Muestra por cluster o conteos 2D: el gráfico tiene el mismo tamaño con 1.000 o 1.000.000 de publicaciones
+            modo = st.radio("Dispersión", ['Puntos', 'Densidad'], horizontal=True, key='kmeans_dispersion')
+
+            # Visitas vs. Precio, Cantidad Disponible y Estado de Salud
+            for columna in ['Precio', 'Cantidad Disponible', 'Estado de Salud']:
+                fig = figura_en_cache(huella, f'redes_neuronales.dispersion_{columna}', (n_clusters, modo),
+                                      lambda: dispersion_por_cluster(df, columna, 'Visitas',
+                                                                     f'Visitas vs. {columna} por Cluster', modo))
+                st.plotly_chart(fig)
 
             # --- STRATEGY ---
             st.write("### STRATEGY")
@@ -260,192 +1957,222 @@ def main():
                 st.write(cluster_description)
                 st.write("###### Estrategia: [Definir una estrategia específica para este cluster]")
 
+        # Cada modelo es un fragmento: sus sliders solo vuelven a ejecutar el modelo elegido
+        if model_type == "MLP":
+            modelo_mlp()
+        elif model_type == "KMeans":
+            modelo_kmeans()
+
 
     def mercado(df, fecha_inicio, fecha_fin):  # Recibe el DataFrame y las fechas como argumento
         st.header("Análisis de Mercado")
-        st.subheader("Gráfica de visitas por vendedores")
+        secciones = elegir_secciones(SECCIONES_MERCADO, 'secciones_mercado')
 
         # Filtro de fecha aplicado a todo el analisis de mercado
-        df_filtrado = df[(df['Fecha'] >= fecha_inicio) & (df['Fecha'] <= fecha_fin)]
+        df_filtrado = rango_en_sesion(df, fecha_inicio, fecha_fin)
 
         if df_filtrado.empty:
             st.warning("No hay datos en el rango de fechas seleccionado.")
             return None, None  # Retornar None para ambos DataFrames
 
+        # Los gráficos ya construidos para este archivo y rango se sirven desde el caché
+        huella = huella_datos(df, fecha_inicio, fecha_fin)
+
         # --- Diccionario para almacenar resultados ---
         resultados = {}
+        # Lugar de la tabla de Resultados en la página (None si la tabla no se muestra)
+        tabla_resultados = None
+
+        def dataframe_resultados():
+            return pd.DataFrame.from_dict(resultados, orient='index').transpose()
+
+        def guardar_resultados(nuevos):
+            # Cuando solo se vuelve a ejecutar el fragmento de un gráfico, la tabla de Resultados se
+            # redibuja en su lugar con las listas ya guardadas, sin volver a ejecutar la página
+            resultados.update(nuevos)
+            if tabla_resultados is not None:
+                tabla_resultados.dataframe(dataframe_resultados())
 
         # --- Análisis y Visualizaciones (Funciones internas) ---
-        def vendedores_visitas(df_filtrado):
+        @st.fragment
+        def vendedores_visitas(agregados):
             nonlocal resultados  # Permite modificar la variable 'resultados'
-            if df_filtrado is None or 'Vendedores' not in df_filtrado.columns or 'Visitas' not in df_filtrado.columns:
+            st.subheader("Gráfica de visitas por vendedores")
+            if 'Vendedores' not in agregados or 'Visitas' not in agregados['Vendedores'].columns:
                 st.warning("El DataFrame no tiene las columnas necesarias ('Vendedores', 'Visitas'). Asegúrese de cargar los datos correctamente.")
                 return
 
-            # Agrupar por vendedor y sumar las visitas
-            df_sum = df_filtrado.groupby('Vendedores')['Visitas'].sum()
+            # Visitas por vendedor en el rango
+            df_sum = agregados['Vendedores']['Visitas']
 
             # Slider para el top de vendedores
             head = st.slider("Top de vendedores", 1, 50, 20)
             st.write(head)
 
             # Ordenar de forma descendente y seleccionar los principales
-            df_sum = df_sum.sort_values(ascending=False).head(head)
+            df_sum = seleccionar_top(df_sum, head)
 
             # Almacenar resultados
-            resultados['Top Vendedores'] = df_sum.index.tolist() # Guarda los nombres de los vendedores
-            resultados['Visitas Top Vendedores'] = df_sum.values.tolist() # Guarda las visitas
+            guardar_resultados({'Top Vendedores': df_sum.index.tolist(),  # Guarda los nombres de los vendedores
+                                'Visitas Top Vendedores': df_sum.values.tolist()})  # Guarda las visitas
 
             # Crear la barra de colores con Plotly Express
-            fig = px.bar(df_sum,
-                        x=df_sum.index,
-                        y='Visitas',
-                        title=f'Top {head} Vendedores por Número de Visitas (entre {fecha_inicio.strftime("%Y-%m-%d")} y {fecha_fin.strftime("%Y-%m-%d")})',
-                        color=df_sum.values,  # Usar los valores de visitas para el color
-                        color_continuous_scale=px.colors.sequential.Plasma)  # Elegir una paleta de colores.  Plasma es una buena opción.
-
-            # Personalizar el diseño (opcional)
-            fig.update_layout(
-                xaxis_title="Vendedor",
-                yaxis_title="Número de Visitas",
-                xaxis={'categoryorder': 'total descending'}  # Ordenar las barras por valor descendente
-            )
+            def construir_figura():
+                fig = px.bar(df_sum,
+                            x=df_sum.index,
+                            y='Visitas',
+                            title=f'Top {head} Vendedores por Número de Visitas (entre {fecha_inicio.strftime("%Y-%m-%d")} y {fecha_fin.strftime("%Y-%m-%d")})',
+                            color=df_sum.values,  # Usar los valores de visitas para el color
+                            color_continuous_scale=px.colors.sequential.Plasma)  # Elegir una paleta de colores.  Plasma es una buena opción.
+
+                # Personalizar el diseño (opcional)
+                fig.update_layout(
+                    xaxis_title="Vendedor",
+                    yaxis_title="Número de Visitas",
+                    xaxis={'categoryorder': 'total descending'}  # Ordenar las barras por valor descendente
+                )
 
-            # Mostrar la figura
+                # Mostrar la figura
+                return fig
+            fig = figura_en_cache(huella, 'mercado.vendedores_visitas', (head,), construir_figura)
             st.plotly_chart(fig)
 
-        def vendedores_vistas(df_filtrado):
+        @st.fragment
+        def vendedores_vistas(agregados):
             nonlocal resultados
-            if df_filtrado is None or 'Categoría' not in df_filtrado.columns or 'Visitas' not in df_filtrado.columns:
+            if 'Categoría' not in agregados or 'Visitas' not in agregados['Categoría'].columns:
                 st.warning("El DataFrame no tiene las columnas necesarias ('Categoría', 'Visitas').  Asegúrese de cargar los datos correctamente.")
                 return
 
-            # Agrupar por categoría y sumar las visitas
-            df_sum = df_filtrado.groupby('Categoría')['Visitas'].sum()
+            # Visitas por categoría en el rango
+            df_sum = agregados['Categoría']['Visitas']
 
             head = st.slider("Top de Categorías", 1, 50, 20)
             st.write(head)
 
             # Ordenar de forma descendente y seleccionar los principales
-            df_sum = df_sum.sort_values(ascending=False).head(head)
+            df_sum = seleccionar_top(df_sum, head)
 
             # Almacenar resultados
-            resultados['Top Categorías'] = df_sum.index.tolist()
-            resultados['Visitas Top Categorías'] = df_sum.values.tolist()
+            guardar_resultados({'Top Categorías': df_sum.index.tolist(),
+                                'Visitas Top Categorías': df_sum.values.tolist()})
 
             # Crear la barra de colores con Plotly Express
-            fig = px.bar(df_sum,
-                        x=df_sum.index,
-                        y='Visitas',
-                        title=f'Top {head} Categorías por Número de Visitas (entre {fecha_inicio.strftime("%Y-%m-%d")} y {fecha_fin.strftime("%Y-%m-%d")})',
-                        color=df_sum.values,  # Usar los valores de visitas para el color
-                        color_continuous_scale=px.colors.sequential.Plasma)  # Elegir una paleta de colores.  Plasma es una buena opción.
-
-            # Personalizar el diseño (opcional)
-            fig.update_layout(
-                xaxis_title="Categoría",
-                yaxis_title="Número de Visitas",
-                xaxis={'categoryorder': 'total descending'}  # Ordenar las barras por valor descendente
-            )
+            def construir_figura():
+                fig = px.bar(df_sum,
+                            x=df_sum.index,
+                            y='Visitas',
+                            title=f'Top {head} Categorías por Número de Visitas (entre {fecha_inicio.strftime("%Y-%m-%d")} y {fecha_fin.strftime("%Y-%m-%d")})',
+                            color=df_sum.values,  # Usar los valores de visitas para el color
+                            color_continuous_scale=px.colors.sequential.Plasma)  # Elegir una paleta de colores.  Plasma es una buena opción.
+
+                # Personalizar el diseño (opcional)
+                fig.update_layout(
+                    xaxis_title="Categoría",
+                    yaxis_title="Número de Visitas",
+                    xaxis={'categoryorder': 'total descending'}  # Ordenar las barras por valor descendente
+                )
 
-            # Mostrar la figura
+                # Mostrar la figura
+                return fig
+            fig = figura_en_cache(huella, 'mercado.vendedores_vistas', (head,), construir_figura)
             st.plotly_chart(fig)
 
-        def estado_salud_categorias(df_filtrado):
+        @st.fragment
+        def estado_salud_categorias(agregados):
             nonlocal resultados
             
-            if df_filtrado is None or 'Categoría' not in df_filtrado.columns or 'Estado de Salud' not in df_filtrado.columns:
+            if 'Categoría' not in agregados or 'Estado de Salud' not in agregados['Categoría'].columns:
                 st.warning("El DataFrame no tiene las columnas necesarias ('Categoría', 'Estado de Salud'). Asegúrese de cargar los datos correctamente.")
                 return
 
-            # Agrupar por categoría y calcular el estado de salud promedio
-            df_mean = df_filtrado.groupby('Categoría')['Estado de Salud'].mean()
+            # Estado de salud promedio por categoría
+            df_mean = agregados['Categoría']['Estado de Salud (media)']
 
             # Slider para el top de categorias
             head = st.slider("Top de Categorías por Estado de Salud", 1, 50, 20)
             st.write(head)
 
             # Ordenar de forma descendente y seleccionar los principales
-            df_mean = df_mean.sort_values(ascending=False).head(head)
+            df_mean = seleccionar_top(df_mean, head)
 
             # Almacenar resultados
-            resultados['Top Categorías (Salud)'] = df_mean.index.tolist()
-            resultados['Salud Promedio Top Categorías'] = df_mean.values.tolist()
+            guardar_resultados({'Top Categorías (Salud)': df_mean.index.tolist(),
+                                'Salud Promedio Top Categorías': df_mean.values.tolist()})
 
             # Crear la barra de colores con Plotly Express
-            fig = px.bar(df_mean,
-                        x=df_mean.index,
-                        y=df_mean.values,
-                        title=f'Top {head} Categorías por Estado de Salud Promedio (entre {fecha_inicio.strftime("%Y-%m-%d")} y {fecha_fin.strftime("%Y-%m-%d")})',
-                        color=df_mean.values,  # Usar los valores de visitas para el color
-                        color_continuous_scale=px.colors.sequential.Plasma)  # Elegir una paleta de colores.  Plasma es una buena opción.
-
-            # Personalizar el diseño (opcional)
-            fig.update_layout(
-                xaxis_title="Categorías",
-                yaxis_title="Estado de Salud Promedio",
-                xaxis={'categoryorder': 'total descending'}  # Ordenar las barras por valor descendente
-            )
+            def construir_figura():
+                fig = px.bar(df_mean,
+                            x=df_mean.index,
+                            y=df_mean.values,
+                            title=f'Top {head} Categorías por Estado de Salud Promedio (entre {fecha_inicio.strftime("%Y-%m-%d")} y {fecha_fin.strftime("%Y-%m-%d")})',
+                            color=df_mean.values,  # Usar los valores de visitas para el color
+                            color_continuous_scale=px.colors.sequential.Plasma)  # Elegir una paleta de colores.  Plasma es una buena opción.
+
+                # Personalizar el diseño (opcional)
+                fig.update_layout(
+                    xaxis_title="Categorías",
+                    yaxis_title="Estado de Salud Promedio",
+                    xaxis={'categoryorder': 'total descending'}  # Ordenar las barras por valor descendente
+                )
 
-            # Mostrar la figura en Streamlit
+                # Mostrar la figura en Streamlit
+                return fig
+            fig = figura_en_cache(huella, 'mercado.estado_salud_categorias', (head,), construir_figura)
             st.plotly_chart(fig)
 
-        def analizar_disponibilidad_categorias(df_filtrado):
+        @st.fragment
+        def analizar_disponibilidad_categorias(agregados):
             nonlocal resultados
-            if df_filtrado is None or 'Categoría' not in df_filtrado.columns or 'Cantidad Disponible' not in df_filtrado.columns:
+            if 'Categoría' not in agregados or 'Cantidad Disponible' not in agregados['Categoría'].columns:
                 st.warning("El DataFrame no tiene las columnas necesarias ('Categoría', 'Cantidad Disponible'). Asegúrese de cargar los datos correctamente.")
                 return
 
             # Calcular el promedio de cantidad disponible por categoría
-            df_promedio = df_filtrado.groupby('Categoría')['Cantidad Disponible'].mean().reset_index()
-            df_promedio = df_promedio.rename(columns={'Cantidad Disponible': 'Promedio Disponible'})
+            df_promedio = agregados['Categoría']['Cantidad Disponible (media)'].rename('Promedio Disponible').reset_index()
 
             # Slider para el top de categorias
             head = st.slider("Top de Categorías por Cantidad Disponible", 1, 50, 20)
             st.write(head)
 
             # Ordenar y seleccionar el top
-            df_promedio = df_promedio.sort_values(by='Promedio Disponible', ascending=False).head(head)
+            df_promedio = seleccionar_top(df_promedio, head, 'Promedio Disponible')
 
             # Almacenar resultados
-            resultados['Top Categorías (Disponibilidad)'] = df_promedio['Categoría'].tolist()
-            resultados['Disponibilidad Promedio Top Categorías'] = df_promedio['Promedio Disponible'].tolist()
+            guardar_resultados({'Top Categorías (Disponibilidad)': df_promedio['Categoría'].tolist(),
+                                'Disponibilidad Promedio Top Categorías': df_promedio['Promedio Disponible'].tolist()})
 
             # Crear el gráfico de barras
-            fig = px.bar(df_promedio,
-                        x='Categoría',
-                        y='Promedio Disponible',
-                        title=f'Top {head} Promedio de Cantidades Disponibles por Categoría (entre {fecha_inicio.strftime("%Y-%m-%d")} y {fecha_fin.strftime("%Y-%m-%d")})',
-                        color='Promedio Disponible',
-                        color_continuous_scale=px.colors.sequential.Viridis)
-
-            # Personalizar el diseño
-            fig.update_layout(
-                xaxis_title="Categoría",
-                yaxis_title="Cantidad Disponible Promedio",
-                xaxis={'categoryorder': 'total descending'}
-            )
+            def construir_figura():
+                fig = px.bar(df_promedio,
+                            x='Categoría',
+                            y='Promedio Disponible',
+                            title=f'Top {head} Promedio de Cantidades Disponibles por Categoría (entre {fecha_inicio.strftime("%Y-%m-%d")} y {fecha_fin.strftime("%Y-%m-%d")})',
+                            color='Promedio Disponible',
+                            color_continuous_scale=px.colors.sequential.Viridis)
+
+                # Personalizar el diseño
+                fig.update_layout(
+                    xaxis_title="Categoría",
+                    yaxis_title="Cantidad Disponible Promedio",
+                    xaxis={'categoryorder': 'total descending'}
+                )
 
-            # Mostrar el gráfico en Streamlit
+                # Mostrar el gráfico en Streamlit
+                return fig
+            fig = figura_en_cache(huella, 'mercado.analizar_disponibilidad_categorias', (head,), construir_figura)
             st.plotly_chart(fig)
 
-        def oem_efficiency(df_filtrado):
+        @st.fragment
+        def oem_efficiency(agregados):
             nonlocal resultados
-            if df_filtrado is None or 'OEM' not in df_filtrado.columns or 'Visitas' not in df_filtrado.columns:
+            if 'OEM' not in agregados or 'Visitas' not in agregados['OEM'].columns:
                 st.warning("El DataFrame no tiene las columnas necesarias ('description', 'Visitas'). Asegúrese de cargar los datos correctamente.")
                 return
 
-            oem_column = df_filtrado['OEM']  # Utiliza 'description' para OEM
-            visits_column = df_filtrado['Visitas']
-
-            # Create a DataFrame for easier processing
-            df_oem = pd.DataFrame({'OEM': oem_column, 'Visitas': visits_column})
-
-            # Group by OEM and sum the visits
-            oem_visits = df_oem.groupby('OEM')['Visitas'].sum()
-
-            # Calculate the *number* of times each OEM appears in the data.  This is the change!
-            oem_counts = df_oem['OEM'].value_counts()  #Count each OEM
+            # Visitas y cantidad de apariciones de cada OEM en el rango, desde el cubo
+            oem_visits = agregados['OEM']['Visitas']
+            oem_counts = agregados['OEM']['Filas']
 
             # Calculate the efficiency for each OEM: visits / count
             oem_efficiency = oem_visits / oem_counts
@@ -455,47 +2182,42 @@ def main():
             st.write(top_n)
 
             # Sort by efficiency and get the top N
-            top_oem_efficiency = oem_efficiency.sort_values(ascending=False).head(top_n)
+            top_oem_efficiency = seleccionar_top(oem_efficiency, top_n)
 
             # Almacenar resultados
-            resultados['Top OEMs (Eficiencia)'] = top_oem_efficiency.index.tolist()
-            resultados['Eficiencia Top OEMs'] = top_oem_efficiency.values.tolist()
+            guardar_resultados({'Top OEMs (Eficiencia)': top_oem_efficiency.index.tolist(),
+                                'Eficiencia Top OEMs': top_oem_efficiency.values.tolist()})
 
             # Create the bar chart with Plotly Express
-            fig = px.bar(
-                x=top_oem_efficiency.index,
-                y=top_oem_efficiency.values,
-                title=f'Top {top_n} Eficiencia de cada OEM (entre {fecha_inicio.strftime("%Y-%m-%d")} y {fecha_fin.strftime("%Y-%m-%d")})',
-                labels={'x': 'OEM', 'y': 'Eficiencia (Visitas / Count of OEM)'},
-                color=top_oem_efficiency.values,
-                color_continuous_scale=px.colors.sequential.Viridis
-            )
-
-            fig.update_layout(
-                xaxis_title="OEM",
-                yaxis_title="Eficiencia",
-                xaxis={'categoryorder': 'total descending'}
-            )
+            def construir_figura():
+                fig = px.bar(
+                    x=top_oem_efficiency.index,
+                    y=top_oem_efficiency.values,
+                    title=f'Top {top_n} Eficiencia de cada OEM (entre {fecha_inicio.strftime("%Y-%m-%d")} y {fecha_fin.strftime("%Y-%m-%d")})',
+                    labels={'x': 'OEM', 'y': 'Eficiencia (Visitas / Count of OEM)'},
+                    color=top_oem_efficiency.values,
+                    color_continuous_scale=px.colors.sequential.Viridis
+                )
 
+                fig.update_layout(
+                    xaxis_title="OEM",
+                    yaxis_title="Eficiencia",
+                    xaxis={'categoryorder': 'total descending'}
+                )
+                return fig
+            fig = figura_en_cache(huella, 'mercado.oem_efficiency', (top_n,), construir_figura)
             st.plotly_chart(fig)
 
-        def categoria_efficiency(df_filtrado):
+        @st.fragment
+        def categoria_efficiency(agregados):
             nonlocal resultados
-            if df_filtrado is None or 'Categoría' not in df_filtrado.columns or 'Visitas' not in df_filtrado.columns:
+            if 'Categoría' not in agregados or 'Visitas' not in agregados['Categoría'].columns:
                 st.warning("El DataFrame no tiene las columnas necesarias ('Categoría', 'Visitas'). Asegúrese de cargar los datos correctamente.")
                 return
 
-            categoría_column = df_filtrado['Categoría']
-            visits_column = df_filtrado['Visitas']
-
-            # Create a DataFrame for easier processing
-            df_cat = pd.DataFrame({'Categoría': categoría_column, 'Visitas': visits_column})
-
-            # Group by category and sum the visits
-            cat_visits = df_cat.groupby('Categoría')['Visitas'].sum()
-
-            # Calculate the *number* of times each category appears in the data
-            cat_counts = df_cat['Categoría'].value_counts()
+            # Visitas y cantidad de apariciones de cada categoría en el rango, desde el cubo
+            cat_visits = agregados['Categoría']['Visitas']
+            cat_counts = agregados['Categoría']['Filas']
 
             # Calculate the efficiency for each category: visits / count
             cat_efficiency = cat_visits / cat_counts
@@ -505,48 +2227,60 @@ def main():
             st.write(top_n)
 
             # Sort by efficiency and get the top N
-            top_cat_efficiency = cat_efficiency.sort_values(ascending=False).head(top_n)
+            top_cat_efficiency = seleccionar_top(cat_efficiency, top_n)
 
             # Almacenar resultados
-            resultados['Top Categorías (Eficiencia)'] = top_cat_efficiency.index.tolist()
-            resultados['Eficiencia Top Categorías'] = top_cat_efficiency.values.tolist()
+            guardar_resultados({'Top Categorías (Eficiencia)': top_cat_efficiency.index.tolist(),
+                                'Eficiencia Top Categorías': top_cat_efficiency.values.tolist()})
 
             # Create the bar chart with Plotly Express
-            fig = px.bar(
-                x=top_cat_efficiency.index,
-                y=top_cat_efficiency.values,
-                title=f'Top {top_n} Eficiencia de cada Categoría (entre {fecha_inicio.strftime("%Y-%m-%d")} y {fecha_fin.strftime("%Y-%m-%d")})',
-                labels={'x': 'Categoría', 'y': 'Eficiencia (Visitas / Count of Categoría)'},
-                color=top_cat_efficiency.values,
-                color_continuous_scale=px.colors.sequential.Viridis
-            )
-
-            fig.update_layout(
-                xaxis_title="Categoría",
-                yaxis_title="Eficiencia",
-                xaxis={'categoryorder': 'total descending'}
-            )
+            def construir_figura():
+                fig = px.bar(
+                    x=top_cat_efficiency.index,
+                    y=top_cat_efficiency.values,
+                    title=f'Top {top_n} Eficiencia de cada Categoría (entre {fecha_inicio.strftime("%Y-%m-%d")} y {fecha_fin.strftime("%Y-%m-%d")})',
+                    labels={'x': 'Categoría', 'y': 'Eficiencia (Visitas / Count of Categoría)'},
+                    color=top_cat_efficiency.values,
+                    color_continuous_scale=px.colors.sequential.Viridis
+                )
 
+                fig.update_layout(
+                    xaxis_title="Categoría",
+                    yaxis_title="Eficiencia",
+                    xaxis={'categoryorder': 'total descending'}
+                )
+                return fig
+            fig = figura_en_cache(huella, 'mercado.categoria_efficiency', (top_n,), construir_figura)
             st.plotly_chart(fig)
 
-        # Llamar a las funciones de visualización
-        vendedores_visitas(df_filtrado)
-        vendedores_vistas(df_filtrado)
-        estado_salud_categorias(df_filtrado)
-        analizar_disponibilidad_categorias(df_filtrado)
-        oem_efficiency(df_filtrado)
-        categoria_efficiency(df_filtrado)
+        # Llamar a las funciones de visualización de las secciones elegidas
+        graficos = [('Visitas por Vendedor', vendedores_visitas), ('Visitas por Categoría', vendedores_vistas),
+                    ('Salud por Categoría', estado_salud_categorias),
+                    ('Disponibilidad por Categoría', analizar_disponibilidad_categorias),
+                    ('Eficiencia por OEM', oem_efficiency), ('Eficiencia por Categoría', categoria_efficiency)]
+        if any(nombre in secciones for nombre, _ in graficos):
+            # Sumas, conteos y promedios por dimensión, calculados una sola vez para los gráficos elegidos
+            agregados = agregados_mercado(df, df_filtrado, fecha_inicio, fecha_fin)
+            for nombre, grafico in graficos:
+                if nombre in secciones:
+                    grafico(agregados)
 
         # --- Crear DataFrame de Resultados ---
-        df_resultados = pd.DataFrame.from_dict(resultados, orient='index').transpose()
-        st.subheader("DataFrame de Resultados")
-        st.dataframe(df_resultados)
+        df_resultados = dataframe_resultados()
+        if 'DataFrame de Resultados' in secciones:
+            st.subheader("DataFrame de Resultados")
+            if df_resultados.empty:
+                st.info("Los resultados se arman con los gráficos elegidos en Secciones.")
+            else:
+                tabla_resultados = st.empty()
+                tabla_resultados.dataframe(df_resultados)
 
-        # --- Descargar DataFrame de Resultados a CSV ---
-        csv_resultados = df_resultados.to_csv(index=False)
-        b64_resultados = base64.b64encode(csv_resultados.encode()).decode()
-        href_resultados = f'<a href="data:file/csv;base64,{b64_resultados}" download="resultados.csv">Descargar DataFrame de Resultados como CSV</a>'
-        st.markdown(href_resultados, unsafe_allow_html=True)
+                # --- Descargar DataFrame de Resultados ---
+                # Se arma al pedirla, con los tops elegidos después en los sliders de los gráficos
+                boton_exportar(dataframe_resultados, 'resultados', 'exportar_resultados')
+
+        if 'DataFrame Combinado' not in secciones:
+            return df_resultados, None
 
         # --- DataFrame Combinado (Nueva Sección) ---
         st.subheader("DataFrame Combinado")
@@ -557,53 +2291,20 @@ def main():
                 st.warning("Error: Faltan columnas necesarias en el DataFrame.  Asegúrate de tener 'Categoría', 'Título', 'OEM', 'Visitas', 'Cantidad Disponible', 'Estado de Salud', 'Vendedores', 'permalink' y 'ID'.")
                 return None
 
-            # Calcular la cantidad de publicaciones por categoría
-            publicaciones_por_categoria = df.groupby('Categoría').size().reset_index(name='Cantidad Publicaciones')
-            df_combinado = pd.merge(df, publicaciones_por_categoria, on='Categoría', how='left')
-
-            # Agrupar por 'OEM' y calcular la suma de visitas
-            oem_visitas = df.groupby('OEM')['Visitas'].sum().reset_index(name='Visitas por OEM')
-            df_combinado = pd.merge(df_combinado, oem_visitas, on='OEM', how='left')
-
-            # Calcular eficiencia del vendedor (promedio, ya que no hay selección de vendedor)
-            total_visitas = df['Visitas'].sum()
-            total_titulos = df['Título'].nunique()
-            eficiencia_vendedor = total_visitas / total_titulos if total_titulos > 0 else 0
-            df_combinado['Eficiencia Vendedor'] = eficiencia_vendedor  # Agregar al DataFrame
-
-            # Eliminar duplicados para que cada fila represente una combinación única
-            df_resumen = df_combinado[['Categoría', 'Título', 'OEM', 'Visitas', 'Cantidad Disponible', 'Estado de Salud', 'Cantidad Publicaciones', 'Visitas por OEM', 'Eficiencia Vendedor', 'permalink', 'ID']].drop_duplicates()
-
-            # Calcular la eficiencia
-            visitas_totales = df.groupby('OEM')['Visitas'].sum() # Visitas totales por OEM de todos los vendedores
-            eficiencia_oem = (df_combinado['Visitas por OEM'] / visitas_totales[df_combinado['OEM']].values).fillna(0)  # Eficiencia para cada fila
-
-            df_resumen['Eficiencia OEM'] = eficiencia_oem # Agrega la eficiencia calculada
-
-            # Calcular Health promedio por categoria
-            health_medio_por_categoria = df.groupby('Categoría')['Estado de Salud'].mean().reset_index(name = "Health Medio Categoria")
-            df_resumen = pd.merge(df_resumen, health_medio_por_categoria, on='Categoría', how='left')
-            df_resumen = df_resumen.fillna(0)
+            # Agregados por categoría y OEM alineados sobre las publicaciones distintas, sin merges
+            return derivado_en_disco(huella, 'combinado', (), lambda: construir_dataframe_combinado(df))
 
-            return df_resumen
-
-        df_combinado = crear_dataframe_combinado(df_filtrado)
+        df_combinado = derivado_en_sesion(huella, 'combinado', (), lambda: crear_dataframe_combinado(df_filtrado))
 
         if df_combinado is not None:
-            st.dataframe(df_combinado)
-            # Opción de descarga (csv)
-            csv = df_combinado.to_csv(index=False)
-            st.download_button(
-                label="Descargar datos como CSV",
-                data=csv,
-                file_name='data_combinada.csv',
-                mime='text/csv',
-            )
+            tabla_paginada(df_combinado, 'combinado_mercado', huella)
+            # Opción de descarga (CSV comprimido o Parquet, generada al pedirla)
+            boton_exportar(df_combinado, 'data_combinada', 'exportar_combinado_mercado')
 
-            return df_resultados, df_combinado  # Retornar ambos DataFrames
+        return df_resultados, df_combinado  # Retornar ambos DataFrames
 
 
-    def estrategia_actual(df_filtrado):  # Recibe el DataFrame filtrado como argumento
+    def estrategia_actual(df_filtrado, fecha_inicio=None, fecha_fin=None):  # Recibe el DataFrame filtrado como argumento
         st.header("Estrategia Actual")
 
         # Verifica si df_filtrado está vacío antes de continuar
@@ -614,25 +2315,35 @@ def main():
         lista_vendedores = df_filtrado['Vendedores'].unique()
         vendedores = st.selectbox('Seleccione un Vendedor', lista_vendedores)
 
+        # Índice de filas y agregados de todos los vendedores: cambiar de vendedor es solo una consulta
+        datos = datos_vendedores(df_filtrado, fecha_inicio, fecha_fin)
+        estadisticas = datos['estadisticas']
+        huella = huella_datos(df_filtrado, fecha_inicio, fecha_fin)
+        df_vendedor = derivado_en_sesion(huella, 'vendedor', (vendedores,),
+                                         lambda: df_filtrado.iloc[posiciones_de(datos['indice'], vendedores)])
+
         # --- Visitas por Título ---
         st.subheader(f"Grafica de Visitas por Título para {vendedores}")
 
+        @st.fragment
         def visitas_titulos_vendedores(df_filtrado, vendedores):
             """Muestra la gráfica de visitas por título para un vendedor específico."""
             if df_filtrado is None or 'Título' not in df_filtrado.columns or 'Visitas' not in df_filtrado.columns or 'Vendedores' not in df_filtrado.columns:
                 st.warning("Error: Las columnas 'Título', 'Visitas' y 'Vendedores' deben estar presentes en el DataFrame.")
                 return
 
-            df_vendedor = df_filtrado[df_filtrado['Vendedores'] == vendedores]
-            df_sum = df_vendedor.groupby('Título')['Visitas'].sum().reset_index()
+            df_sum = de_vendedor(estadisticas['Título'], vendedores)[['Visitas']].reset_index()
             head = st.slider('Top Títulos por Visitas', 1, 50, 20, key="titulos_visitas")  # key para evitar conflicto de sliders
-            df_sum = df_sum.sort_values(by='Visitas', ascending=False).head(head)
+            df_sum = seleccionar_top(df_sum, head, 'Visitas')
 
-            fig = px.bar(df_sum, x='Título', y='Visitas',
-                        title=f'Top {head} Títulos por Visitas para {vendedores}',
-                        labels={'Título': 'Título', 'Visitas': 'Visitas'},
-                        color='Visitas', color_continuous_scale=px.colors.sequential.Plasma)
-            fig.update_layout(xaxis_title='Título', yaxis_title='Visitas', xaxis={'categoryorder': 'total descending'})
+            def construir_figura():
+                fig = px.bar(df_sum, x='Título', y='Visitas',
+                            title=f'Top {head} Títulos por Visitas para {vendedores}',
+                            labels={'Título': 'Título', 'Visitas': 'Visitas'},
+                            color='Visitas', color_continuous_scale=px.colors.sequential.Plasma)
+                fig.update_layout(xaxis_title='Título', yaxis_title='Visitas', xaxis={'categoryorder': 'total descending'})
+                return fig
+            fig = figura_en_cache(huella, 'estrategia_actual.visitas_titulos_vendedores', (vendedores, head), construir_figura)
             st.plotly_chart(fig)
 
         visitas_titulos_vendedores(df_filtrado, vendedores)
@@ -640,22 +2351,25 @@ def main():
         # --- Visitas por OEM ---
         st.subheader(f"Gráfica de Visitas por OEM para {vendedores}")
 
+        @st.fragment
         def visitas_oem_vendedores(df_filtrado, vendedores):
             """Muestra la gráfica de visitas por OEM para un vendedor específico."""
             if df_filtrado is None or 'OEM' not in df_filtrado.columns or 'Visitas' not in df_filtrado.columns or 'Vendedores' not in df_filtrado.columns:
                 st.warning("Error: Las columnas 'OEM', 'Visitas' y 'Vendedores' deben estar presentes en el DataFrame.")
                 return
 
-            df_vendedor = df_filtrado[df_filtrado['Vendedores'] == vendedores]
-            df_sum = df_vendedor.groupby('OEM')['Visitas'].sum().reset_index()
+            df_sum = de_vendedor(estadisticas['OEM'], vendedores)[['Visitas']].reset_index()
             head = st.slider('Top OEMs por Visitas', 1, 50, 20, key="oem_visitas")  # key para evitar conflicto de sliders
-            df_sum = df_sum.sort_values(by='Visitas', ascending=False).head(head)
+            df_sum = seleccionar_top(df_sum, head, 'Visitas')
 
-            fig = px.bar(df_sum, x='OEM', y='Visitas',
-                        title=f'Top {head} OEMs por Visitas para {vendedores}',
-                        labels={'OEM': 'OEM', 'Visitas': 'Visitas'},
-                        color='Visitas', color_continuous_scale=px.colors.sequential.Plasma)
-            fig.update_layout(xaxis_title='OEM', yaxis_title='Visitas', xaxis={'categoryorder': 'total descending'})
+            def construir_figura():
+                fig = px.bar(df_sum, x='OEM', y='Visitas',
+                            title=f'Top {head} OEMs por Visitas para {vendedores}',
+                            labels={'OEM': 'OEM', 'Visitas': 'Visitas'},
+                            color='Visitas', color_continuous_scale=px.colors.sequential.Plasma)
+                fig.update_layout(xaxis_title='OEM', yaxis_title='Visitas', xaxis={'categoryorder': 'total descending'})
+                return fig
+            fig = figura_en_cache(huella, 'estrategia_actual.visitas_oem_vendedores', (vendedores, head), construir_figura)
             st.plotly_chart(fig)
 
         visitas_oem_vendedores(df_filtrado, vendedores)
@@ -663,22 +2377,25 @@ def main():
         # --- Cantidad de Publicaciones por Categoría ---
         st.subheader(f"Gráfica de Cantidad de Publicaciones por Categoría para {vendedores}")
 
+        @st.fragment
         def publicaciones_por_categoria(df_filtrado, vendedores):
             """Muestra la cantidad de publicaciones por categoría para un vendedor."""
             if df_filtrado is None or 'Categoría' not in df_filtrado.columns or 'Vendedores' not in df_filtrado.columns:
                 st.warning("Error: Las columnas 'Categoría' y 'Vendedores' deben estar presentes en el DataFrame.")
                 return
 
-            df_vendedor = df_filtrado[df_filtrado['Vendedores'] == vendedores]
-            df_count = df_vendedor.groupby('Categoría').size().reset_index(name='Cantidad') # Usamos size() para contar
+            df_count = de_vendedor(estadisticas['Categoría'], vendedores)[['Cantidad']].reset_index() # Publicaciones por categoría
             head = st.slider('Top Categorías por Publicaciones', 1, 50, 20, key="cat_publicaciones")  # key para evitar conflicto de sliders
-            df_count = df_count.sort_values(by='Cantidad', ascending=False).head(head)
-
-            fig = px.bar(df_count, x='Categoría', y='Cantidad',
-                        title=f'Top {head} Categorías por Cantidad de Publicaciones para {vendedores}',
-                        labels={'Categoría': 'Categoría', 'Cantidad': 'Cantidad de Publicaciones'},
-                        color='Cantidad', color_continuous_scale=px.colors.sequential.Plasma)
-            fig.update_layout(xaxis_title='Categoría', yaxis_title='Cantidad de Publicaciones', xaxis={'categoryorder': 'total descending'})
+            df_count = seleccionar_top(df_count, head, 'Cantidad')
+
+            def construir_figura():
+                fig = px.bar(df_count, x='Categoría', y='Cantidad',
+                            title=f'Top {head} Categorías por Cantidad de Publicaciones para {vendedores}',
+                            labels={'Categoría': 'Categoría', 'Cantidad': 'Cantidad de Publicaciones'},
+                            color='Cantidad', color_continuous_scale=px.colors.sequential.Plasma)
+                fig.update_layout(xaxis_title='Categoría', yaxis_title='Cantidad de Publicaciones', xaxis={'categoryorder': 'total descending'})
+                return fig
+            fig = figura_en_cache(huella, 'estrategia_actual.publicaciones_por_categoria', (vendedores, head), construir_figura)
             st.plotly_chart(fig)
 
         publicaciones_por_categoria(df_filtrado, vendedores)
@@ -686,22 +2403,25 @@ def main():
         # --- Cantidades Disponibles por Título ---
         st.subheader(f"Gráfica de Cantidades Disponibles por Título para {vendedores}")
 
+        @st.fragment
         def cantidades_disponibles_por_titulo(df_filtrado, vendedores):
             """Muestra la cantidad disponible por título para un vendedor."""
             if df_filtrado is None or 'Título' not in df_filtrado.columns or 'Cantidad Disponible' not in df_filtrado.columns or 'Vendedores' not in df_filtrado.columns:
                 st.warning("Error: Las columnas 'Título', 'Cantidad Disponible' y 'Vendedores' deben estar presentes en el DataFrame.")
                 return
 
-            df_vendedor = df_filtrado[df_filtrado['Vendedores'] == vendedores]
-            df_sum = df_vendedor.groupby('Título')['Cantidad Disponible'].sum().reset_index()
+            df_sum = de_vendedor(estadisticas['Título'], vendedores)[['Cantidad Disponible']].reset_index()
             head = st.slider('Top Títulos por Cantidad Disponible', 1, 50, 20, key="titulo_cantidad")  # key para evitar conflicto de sliders
-            df_sum = df_sum.sort_values(by='Cantidad Disponible', ascending=False).head(head)
+            df_sum = seleccionar_top(df_sum, head, 'Cantidad Disponible')
 
-            fig = px.bar(df_sum, x='Título', y='Cantidad Disponible',
-                        title=f'Top {head} Títulos por Cantidad Disponible para {vendedores}',
-                        labels={'Título': 'Título', 'Cantidad Disponible': 'Cantidad Disponible'},
-                        color='Cantidad Disponible', color_continuous_scale=px.colors.sequential.Plasma)
-            fig.update_layout(xaxis_title='Título', yaxis_title='Cantidad Disponible', xaxis={'categoryorder': 'total descending'})
+            def construir_figura():
+                fig = px.bar(df_sum, x='Título', y='Cantidad Disponible',
+                            title=f'Top {head} Títulos por Cantidad Disponible para {vendedores}',
+                            labels={'Título': 'Título', 'Cantidad Disponible': 'Cantidad Disponible'},
+                            color='Cantidad Disponible', color_continuous_scale=px.colors.sequential.Plasma)
+                fig.update_layout(xaxis_title='Título', yaxis_title='Cantidad Disponible', xaxis={'categoryorder': 'total descending'})
+                return fig
+            fig = figura_en_cache(huella, 'estrategia_actual.cantidades_disponibles_por_titulo', (vendedores, head), construir_figura)
             st.plotly_chart(fig)
 
         cantidades_disponibles_por_titulo(df_filtrado, vendedores)
@@ -709,60 +2429,86 @@ def main():
         # --- Eficiencia en el Mercado (OEM) ---
         st.subheader(f"Eficiencia en el Mercado (OEM) para {vendedores}")
 
+        @st.fragment
         def eficiencia_mercado_oem(df, vendedores):
             """Calcula y muestra la eficiencia en el mercado (OEM) para un vendedor."""
             if df is None or 'OEM' not in df.columns or 'Visitas' not in df.columns or 'Vendedores' not in df.columns:
                 st.warning("Error: Las columnas 'OEM', 'Visitas' y 'Vendedores' deben estar presentes en el DataFrame.")
                 return
 
-            # Total de visitas de los OEM del vendedor
-            df_vendedor = df[df['Vendedores'] == vendedores]
-            visitas_vendedor = df_vendedor.groupby('OEM')['Visitas'].sum()
-
-            # Total de visitas de esos mismos OEM de todos los vendedores
-            visitas_totales = df.groupby('OEM')['Visitas'].sum()
-
-            # Calcular la eficiencia
-            eficiencia = (visitas_vendedor / visitas_totales).fillna(0)  # Manejar divisiones por cero
+            # Cuota del vendedor sobre las visitas de cada OEM (fila de la matriz vendedor × OEM; 0 si no lo vende)
+            eficiencia = cuotas_de_vendedor(datos['cuotas'], vendedores)
 
             # Crear DataFrame para la gráfica
             df_eficiencia = eficiencia.reset_index(name='Eficiencia')
-            df_eficiencia = df_eficiencia.sort_values(by='Eficiencia', ascending=False)
             head = st.slider('Top OEMs por Eficiencia', 1, 50, 20, key="oem_eficiencia")  # key para evitar conflicto de sliders
-            df_eficiencia = df_eficiencia.head(head)
+            df_eficiencia = seleccionar_top(df_eficiencia, head, 'Eficiencia')
 
             # Crear la gráfica
-            fig = px.bar(df_eficiencia, x='OEM', y='Eficiencia',
-                        title=f'Top {head} Eficiencia en el Mercado (OEM) para {vendedores}',
-                        labels={'OEM': 'OEM', 'Eficiencia': 'Eficiencia'},
-                        color='Eficiencia', color_continuous_scale=px.colors.sequential.Plasma)
-            fig.update_layout(xaxis_title='OEM', yaxis_title='Eficiencia', xaxis={'categoryorder': 'total descending'})
+            def construir_figura():
+                fig = px.bar(df_eficiencia, x='OEM', y='Eficiencia',
+                            title=f'Top {head} Eficiencia en el Mercado (OEM) para {vendedores}',
+                            labels={'OEM': 'OEM', 'Eficiencia': 'Eficiencia'},
+                            color='Eficiencia', color_continuous_scale=px.colors.sequential.Plasma)
+                fig.update_layout(xaxis_title='OEM', yaxis_title='Eficiencia', xaxis={'categoryorder': 'total descending'})
+                return fig
+            fig = figura_en_cache(huella, 'estrategia_actual.eficiencia_mercado_oem', (vendedores, head), construir_figura)
             st.plotly_chart(fig)
 
         eficiencia_mercado_oem(df_filtrado, vendedores)
 
+        # --- Cuotas de Mercado de Todos los Vendedores ---
+        st.subheader("Cuotas de Mercado por OEM (todos los vendedores)")
+
+        @st.fragment
+        def cuotas_mercado_todos(analisis):
+            """Muestra los OEM más concentrados (HHI) y el top de OEMs por cuota de cada vendedor."""
+            if analisis is None:
+                st.warning("Error: Las columnas 'OEM', 'Visitas' y 'Vendedores' deben estar presentes en el DataFrame.")
+                return
+
+            concentracion = analisis['concentracion'].reset_index()
+            head = st.slider('Top OEMs por Concentración (HHI)', 1, 50, 20, key="oem_hhi")  # key para evitar conflicto de sliders
+            df_hhi = seleccionar_top(concentracion, head, 'HHI')
+            def construir_figura():
+                fig = px.bar(df_hhi, x='OEM', y='HHI',
+                            title=f'Top {head} OEMs más Concentrados (HHI de las Cuotas de Visitas)',
+                            hover_data=[columna for columna in ['Vendedores', 'Líder', 'Cuota del Líder'] if columna in df_hhi.columns],
+                            color='HHI', color_continuous_scale=px.colors.sequential.Plasma)
+                fig.update_layout(xaxis_title='OEM', yaxis_title='HHI', xaxis={'categoryorder': 'total descending'})
+                return fig
+            fig = figura_en_cache(huella, 'estrategia_actual.cuotas_mercado_todos', (head,), construir_figura)
+            st.plotly_chart(fig)
+
+            st.write("OEMs con mayor cuota de cada vendedor")
+            st.dataframe(analisis['top'])
+
+        cuotas_mercado_todos(datos.get('cuotas'))
+
         # --- Health Medio por Categoría ---
         st.subheader(f"Health Medio por Categoría para {vendedores}")
 
+        @st.fragment
         def health_medio_por_categoria(df_filtrado, vendedores):
             """Calcula y muestra el health medio por categoría para un vendedor."""
             if df_filtrado is None or 'Categoría' not in df_filtrado.columns or 'Estado de Salud' not in df_filtrado.columns or 'Vendedores' not in df_filtrado.columns:
                 st.warning("Error: Las columnas 'Categoría', 'Estado de Salud' y 'Vendedores' deben estar presentes en el DataFrame.")
                 return
 
-            df_vendedor = df_filtrado[df_filtrado['Vendedores'] == vendedores]
-            health_medio = df_vendedor.groupby('Categoría')['Estado de Salud'].mean().reset_index()
-            health_medio = health_medio.sort_values(by='Estado de Salud', ascending=False)
+            health_medio = de_vendedor(estadisticas['Categoría'], vendedores)[['Estado de Salud']].reset_index()
 
             head = st.slider('Top Categorías por Health Medio', 1, 50, 20, key="health_medio")  # key para evitar conflicto de sliders
-            health_medio = health_medio.head(head)
+            health_medio = seleccionar_top(health_medio, head, 'Estado de Salud')
 
-            fig = px.bar(health_medio, x='Categoría', y='Estado de Salud',
-                        title=f'Top {head} Health Medio por Categoría para {vendedores}',
-                        labels={'Categoría': 'Categoría', 'Estado de Salud': 'Health Medio'},
-                        color='Estado de Salud', color_continuous_scale=px.colors.sequential.Plasma)
+            def construir_figura():
+                fig = px.bar(health_medio, x='Categoría', y='Estado de Salud',
+                            title=f'Top {head} Health Medio por Categoría para {vendedores}',
+                            labels={'Categoría': 'Categoría', 'Estado de Salud': 'Health Medio'},
+                            color='Estado de Salud', color_continuous_scale=px.colors.sequential.Plasma)
 
-            fig.update_layout(xaxis_title='Categoría', yaxis_title='Health Medio', xaxis={'categoryorder': 'total descending'})
+                fig.update_layout(xaxis_title='Categoría', yaxis_title='Health Medio', xaxis={'categoryorder': 'total descending'})
+                return fig
+            fig = figura_en_cache(huella, 'estrategia_actual.health_medio_por_categoria', (vendedores, head), construir_figura)
             st.plotly_chart(fig)
 
         health_medio_por_categoria(df_filtrado, vendedores)
@@ -776,9 +2522,9 @@ def main():
                 st.warning("Error: Las columnas 'Título', 'Visitas' y 'Vendedores' deben estar presentes en el DataFrame.")
                 return
 
-            df_vendedor = df_filtrado[df_filtrado['Vendedores'] == vendedores]
-            total_visitas = df_vendedor['Visitas'].sum()
-            total_titulos = df_vendedor['Título'].nunique()  # Usa nunique() para contar títulos únicos
+            resumen = estadisticas['Vendedores']
+            total_visitas = resumen['Visitas'].get(vendedores, 0)
+            total_titulos = resumen['Títulos'].get(vendedores, 0)  # Títulos únicos del vendedor
 
             if total_titulos == 0:
                 st.warning("El vendedor no tiene títulos.")
@@ -793,59 +2539,50 @@ def main():
 
         eficiencia_del_vendedor(df_filtrado, vendedores)
 
+        # --- Reporte de Todos los Vendedores ---
+        st.subheader("Reporte de Todos los Vendedores")
+
+        @st.fragment
+        def reporte_vendedores(datos):
+            """Calcula todas las métricas de esta página para todos los vendedores y las ofrece como Parquet."""
+            top_reporte = st.slider('Top por métrica y vendedor', 1, 50, 20, key="reporte_top")
+            if not st.button("Generar reporte de todos los vendedores"):
+                return
+            inicio = time.perf_counter()
+            reporte = reporte_todos_vendedores(datos, top_reporte)
+            segundos = time.perf_counter() - inicio
+            st.write(f"{len(reporte)} filas para {reporte['Vendedores'].nunique()} vendedores ({segundos:.2f} s).")
+            st.dataframe(reporte.head(100))
+            st.download_button(
+                label="Descargar reporte (Parquet)",
+                data=snapshot_en_bytes(reporte, 'parquet'),
+                file_name='reporte_vendedores.parquet',
+                mime='application/octet-stream',
+            )
+
+        reporte_vendedores(datos)
+
         # --- DataFrame con Información Combinada ---
         st.subheader("DataFrame con Información Combinada")
 
-        def crear_dataframe_combinado(df, vendedores):
+        def crear_dataframe_combinado(df, df_vendedor, vendedores):
             """Crea un DataFrame combinado con información relevante."""
             if df is None or 'Categoría' not in df.columns or 'Título' not in df.columns or 'OEM' not in df.columns or 'Visitas' not in df.columns or 'Cantidad Disponible' not in df.columns or 'Estado de Salud' not in df.columns or 'Vendedores' not in df.columns or 'permalink' not in df.columns or 'ID' not in df.columns:
                 st.warning("Error: Faltan columnas necesarias en el DataFrame.  Asegúrate de tener 'Categoría', 'Título', 'OEM', 'Visitas', 'Cantidad Disponible', 'Estado de Salud', 'Vendedores', 'permalink' y 'ID'.")
                 return None
 
-            df_vendedor = df[df['Vendedores'] == vendedores].copy() # Importante usar .copy() para evitar SettingWithCopyWarning
-
-            # Calcular la cantidad de publicaciones por categoría
-            publicaciones_por_categoria = df_vendedor.groupby('Categoría').size().reset_index(name='Cantidad Publicaciones')
-            df_vendedor = pd.merge(df_vendedor, publicaciones_por_categoria, on='Categoría', how='left')
-
-            # Agrupar por 'OEM' y calcular la suma de visitas
-            oem_visitas = df_vendedor.groupby('OEM')['Visitas'].sum().reset_index(name='Visitas por OEM')
-            df_vendedor = pd.merge(df_vendedor, oem_visitas, on='OEM', how='left')
-
-            # Calcular eficiencia del vendedor
-            total_visitas = df_vendedor['Visitas'].sum()
-            total_titulos = df_vendedor['Título'].nunique()
-            eficiencia_vendedor = total_visitas / total_titulos if total_titulos > 0 else 0
-            df_vendedor['Eficiencia Vendedor'] = eficiencia_vendedor  # Agregar al DataFrame
 
-            # Eliminar duplicados para que cada fila represente una combinación única
-            df_resumen = df_vendedor[['Categoría', 'Título', 'OEM', 'Visitas', 'Cantidad Disponible', 'Estado de Salud', 'Cantidad Publicaciones', 'Visitas por OEM', 'Eficiencia Vendedor', 'permalink', 'ID']].drop_duplicates()
+            # Agregados del vendedor alineados sobre sus publicaciones distintas; la eficiencia OEM usa las visitas de todo el mercado
+            return derivado_en_disco(huella, 'combinado', (vendedores,),
+                                     lambda: construir_dataframe_combinado(df_vendedor, estadisticas['Visitas OEM Mercado']))
 
-            # Calcular la eficiencia
-            visitas_totales = df.groupby('OEM')['Visitas'].sum() # Visitas totales por OEM de todos los vendedores
-            eficiencia_oem = (df_vendedor['Visitas por OEM'] / visitas_totales[df_vendedor['OEM']].values).fillna(0)  # Eficiencia para cada fila
-
-            df_resumen['Eficiencia OEM'] = eficiencia_oem # Agrega la eficiencia calculada
-
-            # Calcular Health promedio por categoria
-            health_medio_por_categoria = df_vendedor.groupby('Categoría')['Estado de Salud'].mean().reset_index(name = "Health Medio Categoria")
-            df_resumen = pd.merge(df_resumen, health_medio_por_categoria, on='Categoría', how='left')
-            df_resumen = df_resumen.fillna(0)
-
-            return df_resumen
-
-        df_combinado = crear_dataframe_combinado(df_filtrado, vendedores)
+        df_combinado = derivado_en_sesion(huella, 'combinado', (vendedores,),
+                                          lambda: crear_dataframe_combinado(df_filtrado, df_vendedor, vendedores))
 
         if df_combinado is not None:
-            st.dataframe(df_combinado)
-            # Opción de descarga (csv)
-            csv = df_combinado.to_csv(index=False)
-            st.download_button(
-                label="Descargar datos como CSV",
-                data=csv,
-                file_name='data_combinada.csv',
-                mime='text/csv',
-            )
+            tabla_paginada(df_combinado, 'combinado_estrategia', None if huella is None else (huella, vendedores))
+            # Opción de descarga (CSV comprimido o Parquet, generada al pedirla)
+            boton_exportar(df_combinado, 'data_combinada', 'exportar_combinado_estrategia')
 
             return df_combinado  # Retornar ambos DataFrames
 
@@ -853,9 +2590,10 @@ def main():
   
     def competencia(df, fecha_inicio, fecha_fin):
             st.header("Análisis de la Competencia")
+            secciones = elegir_secciones(SECCIONES_COMPETENCIA, 'secciones_competencia')
 
             # Filtro de Fecha
-            df_filtrado = df[(df['Fecha'] >= fecha_inicio) & (df['Fecha'] <= fecha_fin)]
+            df_filtrado = rango_en_sesion(df, fecha_inicio, fecha_fin)
 
             lista_vendedores = df['Vendedores'].unique()
             vendedor_seleccionado = st.selectbox('Seleccione un Vendedor (para comparar con la competencia)', lista_vendedores)
@@ -865,18 +2603,22 @@ def main():
             lista_oem = df_filtrado['OEM'].unique()
             oem_seleccionado = st.selectbox('Seleccione un OEM', lista_oem)
 
-            # Filtrar por OEM seleccionado
-            df_oem = df_filtrado[df_filtrado['OEM'] == oem_seleccionado]
+            # Filas y agregados por vendedor del OEM seleccionado, desde el índice por OEM
+            datos = datos_oem(df, fecha_inicio, fecha_fin)
+            huella = huella_datos(df, fecha_inicio, fecha_fin)
+            df_oem = derivado_en_sesion(huella, 'oem', (oem_seleccionado,), lambda: filas_de_oem(datos, oem_seleccionado))
+            resumen_oem = agregados_de_oem(datos, oem_seleccionado)
 
             # Funciones de Variación
+            @st.fragment
             def variacion_precios_oem(df_oem, oem_seleccionado):
                 """Muestra la variación de precios del OEM seleccionado entre todos los ."""
                 if df_oem is None or 'Vendedores' not in df_oem.columns or 'Precio' not in df_oem.columns or 'OEM' not in df_oem.columns:
                     st.warning("Error: Faltan columnas necesarias en el DataFrame ('Vendedores', 'Precio', 'OEM').")
                     return
 
-                # Calcular el precio promedio por
-                df_competidores = df_oem.groupby('Vendedores')['Precio'].mean().reset_index()
+                # Precio promedio por vendedor (precalculado)
+                df_competidores = resumen_oem[['Vendedores', 'Precio']]
 
                 if df_competidores.empty:
                     st.warning(f"No hay  que vendan el OEM '{oem_seleccionado}'.")
@@ -900,28 +2642,32 @@ def main():
                 )
 
                 # Ordenar por precio y seleccionar el Top N
-                df_competidores = df_competidores.sort_values(by='Precio', ascending=False).head(head)
+                df_competidores = seleccionar_top(df_competidores, head, 'Precio')
 
                 # Aplicar formato a Precio después de la selección
                 df_competidores['Precio'] = df_competidores['Precio'].apply(lambda x: '${:.2f}'.format(x))
 
                 # Crear gráfico de barras
-                fig = px.bar(df_competidores, x='Vendedores', y='Precio',
-                            title=f'Top {head}  por Precio Promedio ({oem_seleccionado})',
-                            labels={'Vendedores': 'Vendedor', 'Precio': 'Precio Promedio ($)'},
-                            color='Precio', color_continuous_scale=px.colors.sequential.Plasma)
-                fig.update_layout(xaxis_title='Vendedor', yaxis_title='Precio Promedio ($)',
-                                xaxis={'categoryorder': 'total descending'})
+                def construir_figura():
+                    fig = px.bar(df_competidores, x='Vendedores', y='Precio',
+                                title=f'Top {head}  por Precio Promedio ({oem_seleccionado})',
+                                labels={'Vendedores': 'Vendedor', 'Precio': 'Precio Promedio ($)'},
+                                color='Precio', color_continuous_scale=px.colors.sequential.Plasma)
+                    fig.update_layout(xaxis_title='Vendedor', yaxis_title='Precio Promedio ($)',
+                                    xaxis={'categoryorder': 'total descending'})
+                    return fig
+                fig = figura_en_cache(huella, 'competencia.variacion_precios_oem', (oem_seleccionado, head), construir_figura)
                 st.plotly_chart(fig)
 
+            @st.fragment
             def variacion_cantidad_disponible_oem(df_oem, oem_seleccionado):
                 """Muestra la variación de cantidad disponible del OEM seleccionado entre todos los ."""
                 if df_oem is None or 'Vendedores' not in df_oem.columns or 'Cantidad Disponible' not in df_oem.columns or 'OEM' not in df_oem.columns:
                     st.warning("Error: Faltan columnas necesarias en el DataFrame ('Vendedores', 'Cantidad Disponible', 'OEM').")
                     return
 
-                # Calcular la cantidad disponible promedio por
-                df_competidores = df_oem.groupby('Vendedores')['Cantidad Disponible'].mean().reset_index()
+                # Cantidad disponible promedio por vendedor (precalculada)
+                df_competidores = resumen_oem[['Vendedores', 'Cantidad Disponible']]
 
                 if df_competidores.empty:
                     st.warning(f"No hay  que vendan el OEM '{oem_seleccionado}'.")
@@ -932,25 +2678,29 @@ def main():
                                 len(df_competidores), min(10, len(df_competidores)), key='cantidad')
 
                 # Ordenar por cantidad disponible y seleccionar el Top N
-                df_competidores = df_competidores.sort_values(by='Cantidad Disponible', ascending=False).head(head)
+                df_competidores = seleccionar_top(df_competidores, head, 'Cantidad Disponible')
 
                 # Crear gráfico de barras
-                fig = px.bar(df_competidores, x='Vendedores', y='Cantidad Disponible',
-                            title=f'Top {head}  por Cantidad Disponible Promedio ({oem_seleccionado})',
-                            labels={'Vendedores': 'Vendedor', 'Cantidad Disponible': 'Cantidad Disponible Promedio'},
-                            color='Cantidad Disponible', color_continuous_scale=px.colors.sequential.Plasma)
-                fig.update_layout(xaxis_title='Vendedor', yaxis_title='Cantidad Disponible Promedio',
-                                xaxis={'categoryorder': 'total descending'})
+                def construir_figura():
+                    fig = px.bar(df_competidores, x='Vendedores', y='Cantidad Disponible',
+                                title=f'Top {head}  por Cantidad Disponible Promedio ({oem_seleccionado})',
+                                labels={'Vendedores': 'Vendedor', 'Cantidad Disponible': 'Cantidad Disponible Promedio'},
+                                color='Cantidad Disponible', color_continuous_scale=px.colors.sequential.Plasma)
+                    fig.update_layout(xaxis_title='Vendedor', yaxis_title='Cantidad Disponible Promedio',
+                                    xaxis={'categoryorder': 'total descending'})
+                    return fig
+                fig = figura_en_cache(huella, 'competencia.variacion_cantidad_disponible_oem', (oem_seleccionado, head), construir_figura)
                 st.plotly_chart(fig)
 
+            @st.fragment
             def variacion_health_oem(df_oem, oem_seleccionado):
                 """Muestra la variación de health del OEM seleccionado entre todos los ."""
                 if df_oem is None or 'Vendedores' not in df_oem.columns or 'Estado de Salud' not in df_oem.columns or 'OEM' not in df_oem.columns:
                     st.warning("Error: Faltan columnas necesarias en el DataFrame ('Vendedores', 'Estado de Salud', 'OEM').")
                     return
 
-                # Calcular el health promedio por
-                df_competidores = df_oem.groupby('Vendedores')['Estado de Salud'].mean().reset_index()
+                # Health promedio por vendedor (precalculado)
+                df_competidores = resumen_oem[['Vendedores', 'Estado de Salud']]
 
                 if df_competidores.empty:
                     st.warning(f"No hay  que vendan el OEM '{oem_seleccionado}'.")
@@ -961,25 +2711,29 @@ def main():
                                 min(10, len(df_competidores)), key='health')
 
                 # Ordenar por health y seleccionar el Top N
-                df_competidores = df_competidores.sort_values(by='Estado de Salud', ascending=False).head(head)
+                df_competidores = seleccionar_top(df_competidores, head, 'Estado de Salud')
 
                 # Crear gráfico de barras
-                fig = px.bar(df_competidores, x='Vendedores', y='Estado de Salud',
-                            title=f'Top {head}  por Health Promedio ({oem_seleccionado})',
-                            labels={'Vendedores': 'Vendedor', 'Estado de Salud': 'Health Promedio'},
-                            color='Estado de Salud', color_continuous_scale=px.colors.sequential.Plasma)
-                fig.update_layout(xaxis_title='Vendedor', yaxis_title='Health Promedio',
-                                xaxis={'categoryorder': 'total descending'})
+                def construir_figura():
+                    fig = px.bar(df_competidores, x='Vendedores', y='Estado de Salud',
+                                title=f'Top {head}  por Health Promedio ({oem_seleccionado})',
+                                labels={'Vendedores': 'Vendedor', 'Estado de Salud': 'Health Promedio'},
+                                color='Estado de Salud', color_continuous_scale=px.colors.sequential.Plasma)
+                    fig.update_layout(xaxis_title='Vendedor', yaxis_title='Health Promedio',
+                                    xaxis={'categoryorder': 'total descending'})
+                    return fig
+                fig = figura_en_cache(huella, 'competencia.variacion_health_oem', (oem_seleccionado, head), construir_figura)
                 st.plotly_chart(fig)
 
+            @st.fragment
             def comparacion_visitas_oem(df, oem_seleccionado):
                 """Compara las visitas por OEM entre todos los ."""
                 if df is None or 'Vendedores' not in df.columns or 'Visitas' not in df.columns or 'OEM' not in df.columns:
                     st.warning("Error: Faltan columnas necesarias en el DataFrame ('Vendedores', 'Visitas', 'OEM').")
                     return
 
-                # Visitas de todos los  para el OEM seleccionado
-                df_competidores = df[df['OEM'] == oem_seleccionado].groupby('Vendedores')['Visitas'].sum().reset_index()
+                # Visitas de todos los vendedores para el OEM seleccionado (precalculadas)
+                df_competidores = resumen_oem[['Vendedores', 'Visitas']]
 
                 if df_competidores.empty:
                     st.warning(f"No hay  que vendan el OEM '{oem_seleccionado}'.")
@@ -990,191 +2744,194 @@ def main():
                                 min(10, len(df_competidores)), key='visitas')
 
                 # Ordenar por visitas y seleccionar el Top N
-                df_competidores = df_competidores.sort_values(by='Visitas', ascending=False).head(head)
+                df_competidores = seleccionar_top(df_competidores, head, 'Visitas')
 
                 # Crear gráfico de barras
-                fig = px.bar(df_competidores, x='Vendedores', y='Visitas',
-                            title=f'Top {head}  por Visitas ({oem_seleccionado})',
-                            labels={'Vendedores': 'Vendedor', 'Visitas': 'Visitas'},
-                            color='Visitas', color_continuous_scale=px.colors.sequential.Plasma)
-                fig.update_layout(xaxis_title='Vendedor', yaxis_title='Visitas', xaxis={'categoryorder': 'total descending'})
+                def construir_figura():
+                    fig = px.bar(df_competidores, x='Vendedores', y='Visitas',
+                                title=f'Top {head}  por Visitas ({oem_seleccionado})',
+                                labels={'Vendedores': 'Vendedor', 'Visitas': 'Visitas'},
+                                color='Visitas', color_continuous_scale=px.colors.sequential.Plasma)
+                    fig.update_layout(xaxis_title='Vendedor', yaxis_title='Visitas', xaxis={'categoryorder': 'total descending'})
+                    return fig
+                fig = figura_en_cache(huella, 'competencia.comparacion_visitas_oem', (oem_seleccionado, head), construir_figura)
                 st.plotly_chart(fig)
 
-            # Llamar a las funciones de variación
-            variacion_precios_oem(df_oem, oem_seleccionado)
-            variacion_cantidad_disponible_oem(df_oem, oem_seleccionado)
-            variacion_health_oem(df_oem, oem_seleccionado)
+            # Llamar a las funciones de variación de las secciones elegidas
+            if 'Precio' in secciones:
+                variacion_precios_oem(df_oem, oem_seleccionado)
+            if 'Cantidad Disponible' in secciones:
+                variacion_cantidad_disponible_oem(df_oem, oem_seleccionado)
+            if 'Health' in secciones:
+                variacion_health_oem(df_oem, oem_seleccionado)
 
             # Llamar a la función de comparación de visitas
-            st.subheader("Comparación de Visitas por OEM")
-            comparacion_visitas_oem(df_filtrado, oem_seleccionado)
+            if 'Visitas' in secciones:
+                st.subheader("Comparación de Visitas por OEM")
+                comparacion_visitas_oem(df_filtrado, oem_seleccionado)
 
             # 7) DataFrame Combinado
-            st.subheader("DataFrame de Competencia")
+            if 'DataFrame de Competencia' in secciones:
+                st.subheader("DataFrame de Competencia")
 
-            def crear_dataframe_competencia(df, oem_seleccionado):
-                """Crea un DataFrame con información de todos los  para el OEM seleccionado."""
-                # Reemplazar 'item_id' por 'ID' y 'URL' por 'permalink'
-                if df is None or 'Vendedores' not in df.columns or 'Título' not in df.columns or 'ID' not in df.columns or 'permalink' not in df.columns or 'Precio' not in df.columns or 'Cantidad Disponible' not in df.columns or 'Estado de Salud' not in df.columns or 'OEM' not in df.columns or 'Visitas' not in df.columns or 'warranty' not in df.columns or 'tags' not in df.columns or 'shipping' not in df.columns or 'Fecha de Última Actualización' not in df.columns:
-                    st.warning(
-                        "Error: Faltan columnas necesarias en el DataFrame. Asegúrate de tener 'Vendedores', 'Título', 'ID', 'permalink', 'Precio', 'Cantidad Disponible', 'Estado de Salud', 'OEM', 'Visitas', 'warranty', 'tags', 'shipping' y 'Fecha de Última Actualización'.")
-                    return None
+                def crear_dataframe_competencia(df, oem_seleccionado):
+                    """Crea un DataFrame con información de todos los  para el OEM seleccionado."""
+                    # Reemplazar 'item_id' por 'ID' y 'URL' por 'permalink'
+                    if df is None or 'Vendedores' not in df.columns or 'Título' not in df.columns or 'ID' not in df.columns or 'permalink' not in df.columns or 'Precio' not in df.columns or 'Cantidad Disponible' not in df.columns or 'Estado de Salud' not in df.columns or 'OEM' not in df.columns or 'Visitas' not in df.columns or 'warranty' not in df.columns or 'tags' not in df.columns or 'shipping' not in df.columns or 'Fecha de Última Actualización' not in df.columns:
+                        st.warning(
+                            "Error: Faltan columnas necesarias en el DataFrame. Asegúrate de tener 'Vendedores', 'Título', 'ID', 'permalink', 'Precio', 'Cantidad Disponible', 'Estado de Salud', 'OEM', 'Visitas', 'warranty', 'tags', 'shipping' y 'Fecha de Última Actualización'.")
+                        return None
 
-                # Filtrar por el OEM seleccionado
-                df_competidores = df[df['OEM'] == oem_seleccionado]
+                    if resumen_oem.empty:
+                        st.warning(f"No hay  que vendan el OEM '{oem_seleccionado}'.")
+                        return None
 
-                if df_competidores.empty:
-                    st.warning(f"No hay  que vendan el OEM '{oem_seleccionado}'.")
-                    return None
+                    # Promedios, visitas y primer título/ID/permalink/fecha por vendedor (precalculados)
+                    df_resumen = resumen_oem[['Vendedores', 'Precio', 'Cantidad Disponible', 'Estado de Salud', 'Visitas',
+                                              'Título', 'ID', 'permalink', 'Fecha de Última Actualización']]
 
-                # Agrupar por  y calcular promedios
-                df_resumen = df_competidores.groupby('Vendedores').agg(
-                    {'Precio': 'mean',
-                    'Cantidad Disponible': 'mean',
-                    'Estado de Salud': 'mean',
-                    'Visitas': 'sum',  # Agregar las visitas
-                    'Título': 'first',  # Obtener el primer título (puedes ajustarlo si es necesario)
-                    'ID': 'first',  # Obtener el primer ID
-                    'permalink': 'first',  # Obtener el primer permalink
-                    'Fecha de Última Actualización': 'first'
-                    }).reset_index()
+                    # Formatear el precio como moneda ($)
+                    df_resumen['Precio'] = df_resumen['Precio'].apply(lambda x: '${:.2f}'.format(x))
 
-                # Formatear el precio como moneda ($)
-                df_resumen['Precio'] = df_resumen['Precio'].apply(lambda x: '${:.2f}'.format(x))
+                    df_resumen.rename(columns={'Precio': 'Precio Promedio',
+                                                'Cantidad Disponible': 'Cantidad Disponible Promedio',
+                                                'Estado de Salud': 'Health Promedio',
+                                                'Visitas': 'Visitas Totales'}, inplace=True)
 
-                df_resumen.rename(columns={'Precio': 'Precio Promedio',
-                                            'Cantidad Disponible': 'Cantidad Disponible Promedio',
-                                            'Estado de Salud': 'Health Promedio',
-                                            'Visitas': 'Visitas Totales'}, inplace=True)
+                    return df_resumen
 
-                return df_resumen
+                df_competencia = crear_dataframe_competencia(df_oem, oem_seleccionado)
 
-            df_competencia = crear_dataframe_competencia(df_oem, oem_seleccionado)
+                if df_competencia is not None:
+                    tabla_paginada(df_competencia, 'competencia', None if huella is None else (huella, oem_seleccionado))
 
-            if df_competencia is not None:
-                st.dataframe(df_competencia)
-
-                # Descarga CSV
-                csv = df_competencia.to_csv(index=False)
-                st.download_button(
-                    label="Descargar datos de la competencia como CSV",
-                    data=csv,
-                    file_name=f'competencia_{oem_seleccionado}.csv',
-                    mime='text/csv',
-                )
+                    # Descarga (CSV comprimido o Parquet, generada al pedirla)
+                    boton_exportar(df_competencia, f'competencia_{oem_seleccionado}', 'exportar_competencia')
 
                 # Análisis Adicional (Gráficos)
-            st.subheader("Análisis Detallado de Características")
+            if any(seccion in secciones for seccion in SECCIONES_COMPETENCIA[5:10]):
+                st.subheader("Análisis Detallado de Características")
 
             # 1) Gráfico de Título vs. Fecha de Última Actualización
-            st.subheader("Fecha de Última Actualización")
-
-            # Verificar si la columna 'Fecha de Última Actualización' existe
-            if 'Fecha de Última Actualización' in df_oem.columns:
-                # Convertir la columna a tipo datetime si no lo es
-                if not pd.api.types.is_datetime64_any_dtype(df_oem['Fecha de Última Actualización']):
-                    df_oem['Fecha de Última Actualización'] = pd.to_datetime(df_oem['Fecha de Última Actualización'])
-
-                # Extraer la fecha
-                df_oem['Fecha de Última Actualización'] = df_oem['Fecha de Última Actualización'].dt.date
-
-                # Contar la frecuencia de cada fecha
-                fecha_counts = df_oem['Fecha de Última Actualización'].value_counts().reset_index()
-                fecha_counts.columns = ['Fecha', 'Cantidad']
-
-                # Crear el gráfico de torta
-                fig_fecha_actualizacion = px.pie(fecha_counts, values='Cantidad', names='Fecha',
-                                                title='Distribución de Fechas de Última Actualización',
-                                                labels={'Fecha': 'Fecha de Última Actualización', 'Cantidad': 'Cantidad'},
-                                                color_discrete_sequence=px.colors.sequential.Plasma)
-                st.plotly_chart(fig_fecha_actualizacion)
-            else:
-                st.warning("La columna 'Fecha de Última Actualización' no existe en el DataFrame.")
+            if 'Fecha de Última Actualización' in secciones:
+                st.subheader("Fecha de Última Actualización")
+
+                # Verificar si la columna 'Fecha de Última Actualización' existe
+                if 'Fecha de Última Actualización' in df_oem.columns:
+                    # El conteo se hace al construir el gráfico: con el gráfico en caché no se repite
+                    def construir_figura():
+                        # Convertir la columna a tipo datetime si no lo es y extraer la fecha
+                        fechas = df_oem['Fecha de Última Actualización']
+                        if not pd.api.types.is_datetime64_any_dtype(fechas):
+                            fechas = pd.to_datetime(fechas)
+
+                        # Contar la frecuencia de cada fecha
+                        fecha_counts = fechas.dt.date.value_counts().reset_index()
+                        fecha_counts.columns = ['Fecha', 'Cantidad']
+
+                        # Crear el gráfico de torta
+                        fig_fecha_actualizacion = px.pie(fecha_counts, values='Cantidad', names='Fecha',
+                                                        title='Distribución de Fechas de Última Actualización',
+                                                        labels={'Fecha': 'Fecha de Última Actualización', 'Cantidad': 'Cantidad'},
+                                                        color_discrete_sequence=px.colors.sequential.Plasma)
+                        return fig_fecha_actualizacion
+                    fig_fecha_actualizacion = figura_en_cache(huella, 'competencia.fig_fecha_actualizacion', (oem_seleccionado,), construir_figura)
+                    st.plotly_chart(fig_fecha_actualizacion)
+                else:
+                    st.warning("La columna 'Fecha de Última Actualización' no existe en el DataFrame.")
 
             # 2) Gráfico de Warranty por Título
-            st.subheader("Garantía por Título")
-            warranty_counts = df_oem.groupby('Título')['warranty'].value_counts().unstack().fillna(0)
-            fig_warranty = px.bar(warranty_counts, x=warranty_counts.index, y=warranty_counts.columns,
-                                title='Distribución de Garantía por Título',
-                                labels={'value': 'Cantidad', 'Título': 'Título del Producto'},
-                                color_continuous_scale=px.colors.sequential.Plasma)
-            st.plotly_chart(fig_warranty)
+            if 'Garantía' in secciones:
+                st.subheader("Garantía por Título")
+                def construir_figura():
+                    warranty_counts = df_oem.groupby('Título', observed=True)['warranty'].value_counts().unstack().fillna(0)
+                    fig_warranty = px.bar(warranty_counts, x=warranty_counts.index, y=warranty_counts.columns,
+                                        title='Distribución de Garantía por Título',
+                                        labels={'value': 'Cantidad', 'Título': 'Título del Producto'},
+                                        color_continuous_scale=px.colors.sequential.Plasma)
+                    return fig_warranty
+                fig_warranty = figura_en_cache(huella, 'competencia.fig_warranty', (oem_seleccionado,), construir_figura)
+                st.plotly_chart(fig_warranty)
 
             # 3) Gráfico de Tags (catalog_listing y/o catalog_forewarning) por Título
-            st.subheader("Catálogo por Título")
-
-            def esta_en_catalogo(tags_list):
-                if isinstance(tags_list, str):
-                    tags_list = eval(tags_list)  # Convert string representation to list
-                
-                for tag in tags_list:
-                    if 'catalog_listing_eligible' in tag or 'catalog_forewarning' in tag or 'catalog_boost' in tag:
-                        return 'Sí'
-                return 'No'
-
-            df_oem['en_catalogo'] = df_oem['tags'].apply(esta_en_catalogo)
-
-            # Contar cuántos títulos están en el catálogo y cuántos no
-            catalogo_counts = df_oem['en_catalogo'].value_counts().reset_index()
-            catalogo_counts.columns = ['En Catálogo', 'Cantidad']
-
-            # Crear un gráfico de torta
-            fig_catalogo = px.pie(catalogo_counts, values='Cantidad', names='En Catálogo',
-                                    title='Distribución de Productos en Catálogo',
-                                    color_discrete_sequence=px.colors.sequential.Plasma)
-            st.plotly_chart(fig_catalogo)
-
+            if 'Catálogo' in secciones:
+                st.subheader("Catálogo por Título")
+
+                # Las columnas de tags y shipping se decodifican una sola vez al cargar (ver agregar_columnas_tags)
+                def construir_figura():
+                    # Contar cuántos títulos están en el catálogo y cuántos no
+                    catalogo_counts = df_oem['en_catalogo'].map({True: 'Sí', False: 'No'}).value_counts().reset_index()
+                    catalogo_counts.columns = ['En Catálogo', 'Cantidad']
+
+                    # Crear un gráfico de torta
+                    fig_catalogo = px.pie(catalogo_counts, values='Cantidad', names='En Catálogo',
+                                            title='Distribución de Productos en Catálogo',
+                                            color_discrete_sequence=px.colors.sequential.Plasma)
+                    return fig_catalogo
+                fig_catalogo = figura_en_cache(huella, 'competencia.fig_catalogo', (oem_seleccionado,), construir_figura)
+                st.plotly_chart(fig_catalogo)
 
             # 4) Gráfico detallado de Cuota Simple
-            st.subheader("Tipos de Cuota Simple")
-
-            def extract_cuota_simple_type(tags_list):
-                if isinstance(tags_list, str):
-                    tags_list = eval(tags_list)  # Convert string representation to list
-                
-                for tag in tags_list:
-                    if 'cuota-simple-paid-by-buyer' in tag:
-                        return 'cuota-simple-paid-by-buyer'
-                    elif 'cuota-simple-3' in tag:
-                        return 'cuota-simple-3'
-                    elif 'cuota-simple-6' in tag:
-                        return 'cuota-simple-6'
-                    elif 'cuota-simple-9' in tag:
-                        return 'cuota-simple-9'
-                    elif 'cuota-simple-12' in tag:
-                        return 'cuota-simple-12'
-                    elif 'cuota-simple-18' in tag:
-                        return 'cuota-simple-18'
-                return 'Ninguna'  # Si no se encuentra ninguna cuota simple
-
-            df_oem['tipo_cuota_simple'] = df_oem['tags'].apply(extract_cuota_simple_type)
-
-            # Contar la frecuencia de cada tipo de cuota simple
-            tipo_cuota_simple_counts = df_oem['tipo_cuota_simple'].value_counts().reset_index()
-            tipo_cuota_simple_counts.columns = ['Tipo de Cuota Simple', 'Cantidad']
-
-            # Crear un gráfico de torta
-            fig_tipos_cuota_simple = px.pie(tipo_cuota_simple_counts, values='Cantidad', names='Tipo de Cuota Simple',
-                                                title='Distribución de Tipos de Cuota Simple',
-                                                color_discrete_sequence=px.colors.sequential.Plasma)
-            st.plotly_chart(fig_tipos_cuota_simple)
+            if 'Cuota Simple' in secciones:
+                st.subheader("Tipos de Cuota Simple")
+
+                def construir_figura():
+                    # Contar la frecuencia de cada tipo de cuota simple
+                    tipo_cuota_simple_counts = df_oem['tipo_cuota_simple'].value_counts().loc[lambda conteo: conteo > 0].reset_index()
+                    tipo_cuota_simple_counts.columns = ['Tipo de Cuota Simple', 'Cantidad']
+
+                    # Crear un gráfico de torta
+                    fig_tipos_cuota_simple = px.pie(tipo_cuota_simple_counts, values='Cantidad', names='Tipo de Cuota Simple',
+                                                        title='Distribución de Tipos de Cuota Simple',
+                                                        color_discrete_sequence=px.colors.sequential.Plasma)
+                    return fig_tipos_cuota_simple
+                fig_tipos_cuota_simple = figura_en_cache(huella, 'competencia.fig_tipos_cuota_simple', (oem_seleccionado,), construir_figura)
+                st.plotly_chart(fig_tipos_cuota_simple)
 
             # 6) Gráfico de Free Shipping por Título
-            st.subheader("Free Shipping por Título")
+            if 'Free Shipping' in secciones:
+                st.subheader("Free Shipping por Título")
+
+                def construir_figura():
+                    free_shipping_counts = df_oem.groupby('Título', observed=True)['free_shipping'].value_counts().unstack().fillna(0)
+                    fig_free_shipping = px.bar(free_shipping_counts, x=free_shipping_counts.index,
+                                                y=free_shipping_counts.columns,
+                                                title='Distribución de Free Shipping por Título',
+                                                labels={'value': 'Cantidad', 'Título': 'Título del Producto'},
+                                                color_continuous_scale=px.colors.sequential.Plasma)
+                    return fig_free_shipping
+                fig_free_shipping = figura_en_cache(huella, 'competencia.fig_free_shipping', (oem_seleccionado,), construir_figura)
+                st.plotly_chart(fig_free_shipping)
 
-            def extract_free_shipping(shipping_info):
-                if isinstance(shipping_info, str):
-                    shipping_info = eval(shipping_info)
-                return shipping_info.get('free_shipping', False)
+            # 7) Participación de tags en todo el mercado (con el índice de bits, para todos los OEM a la vez)
+            @st.fragment
+            def participacion_de_tags(df_filtrado):
+                st.subheader("Participación de Tags en el Mercado")
+                diccionario = df_filtrado.attrs.get('diccionario_tags', [])
+                if diccionario and columnas_bits_tags(df_filtrado):
+                    tags_catalogo = [tag for tag in diccionario if any(patron in tag for patron in PATRONES_CATALOGO)]
+                    tags_elegidos = st.multiselect('Tags', diccionario, default=tags_catalogo, key='tags_mercado')
+                    agrupar_por = st.selectbox('Agrupar por', ['OEM', 'Vendedores', 'Categoría'], key='tags_agrupar')
+                    if tags_elegidos and agrupar_por in df_filtrado.columns:
+                        df_participacion = participacion_tags(df_filtrado, tags_elegidos, agrupar_por, exacto=True)
+                        head = st.slider('Top por Participación de Tags', 1, 50, 20, key='tags_top')
+                        df_participacion = seleccionar_top(df_participacion, head, 'Participación').reset_index()
+
+                        def construir_figura():
+                            fig = px.bar(df_participacion, x=agrupar_por, y='Participación',
+                                        title=f'Top {head} {agrupar_por} por Participación de Publicaciones con los Tags Seleccionados',
+                                        hover_data=['Publicaciones', 'Con Tags'],
+                                        color='Participación', color_continuous_scale=px.colors.sequential.Plasma)
+                            fig.update_layout(xaxis_title=agrupar_por, yaxis_title='Participación', xaxis={'categoryorder': 'total descending'})
+                            return fig
+                        fig = figura_en_cache(huella, 'competencia.participacion_tags',
+                                              (tuple(tags_elegidos), agrupar_por, head), construir_figura)
+                        st.plotly_chart(fig)
+                else:
+                    st.warning("La columna 'tags' no existe en el DataFrame.")
 
-            df_oem['free_shipping'] = df_oem['shipping'].apply(extract_free_shipping)
-            free_shipping_counts = df_oem.groupby('Título')['free_shipping'].value_counts().unstack().fillna(0)
-            fig_free_shipping = px.bar(free_shipping_counts, x=free_shipping_counts.index,
-                                        y=free_shipping_counts.columns,
-                                        title='Distribución de Free Shipping por Título',
-                                        labels={'value': 'Cantidad', 'Título': 'Título del Producto'},
-                                        color_continuous_scale=px.colors.sequential.Plasma)
-            st.plotly_chart(fig_free_shipping)
+            if 'Participación de Tags' in secciones:
+                participacion_de_tags(df_filtrado)
         
     def estrategia_futura(df, fecha_inicio, fecha_fin):
         st.header("Estrategia Futura")
@@ -1187,6 +2944,7 @@ def main():
             try:
                 df_competidores_nuevos = pd.read_excel(carga_archivo_competidores)
                 df_competidores_nuevos['OEM'] = df_competidores_nuevos['OEM'].astype(str)
+                df_competidores_nuevos = agregar_columnas_tags(df_competidores_nuevos)
                 st.write("Datos de nuevos competidores cargados:")
                 st.dataframe(df_competidores_nuevos.head())
 
@@ -1224,23 +2982,28 @@ def main():
                                             lista_vendedores)
 
         # 3) Filtro de Fecha (already applied to initial dataframe)
-        df_filtrado = df[(df['Fecha'] >= fecha_inicio) & (df['Fecha'] <= fecha_fin)]
+        df_filtrado = filtrar_por_fechas(df, fecha_inicio, fecha_fin)
 
         # 4) Selección del OEM
         lista_oem = df_filtrado['OEM'].unique()
         oem_seleccionado = st.selectbox('Seleccione un OEM', lista_oem)
 
-        # Filter for the selected OEM
-        df_oem = df_filtrado[df_filtrado['OEM'] == oem_seleccionado]
+        # Filter for the selected OEM (índice por OEM y agregados por vendedor precalculados)
+        datos = datos_oem(df, fecha_inicio, fecha_fin)
+        # Con competidores nuevos agregados el DataFrame ya no tiene huella y los gráficos no se guardan
+        huella = huella_datos(df, fecha_inicio, fecha_fin)
+        df_oem = derivado_en_sesion(huella, 'oem', (oem_seleccionado,), lambda: filas_de_oem(datos, oem_seleccionado))
+        resumen_oem = agregados_de_oem(datos, oem_seleccionado)
         # Add a guard to check if df_oem is defined and not empty before running the analysis
         if not df_oem.empty:
+            @st.fragment
             def variacion_precios_oem(df_oem, oem_seleccionado):
                 """Shows the price variation ($) of the selected OEM."""
                 if df_oem is None or 'Vendedores' not in df_oem.columns or 'Precio' not in df_oem.columns or 'OEM' not in df_oem.columns:
                     st.warning("Faltan columns ('Vendedores', 'Precio', 'OEM').")
                     return
 
-                df_competidores = df_oem.groupby('Vendedores')['Precio'].mean().reset_index()
+                df_competidores = resumen_oem[['Vendedores', 'Precio']]
                 if df_competidores.empty:
                     st.warning(f"No hay vendedores del OEM '{oem_seleccionado}'.")
                     return
@@ -1248,13 +3011,16 @@ def main():
                 df_competidores['Precio'] = df_competidores['Precio'].apply(lambda x: '${:.2f}'.format(x))
                 head = st.slider(f'Vendedores por Precio Promedio ({oem_seleccionado})', 1, len(df_competidores),
                                 min(10, len(df_competidores)), key='precios_fut')
-                df_competidores = df_competidores.sort_values(by='Precio', ascending=False).head(head)
-                fig = px.bar(df_competidores, x='Vendedores', y='Precio',
-                            title=f'Top {head} Vendedores por Precio Promedio ({oem_seleccionado})',
-                            labels={'Vendedores': 'Vendedor', 'Precio': 'Precio Promedio ($)'},
-                            color='Precio', color_continuous_scale=px.colors.sequential.Plasma)
-                fig.update_layout(xaxis_title='Vendedor', yaxis_title='Precio Promedio ($)',
-                                xaxis={'categoryorder': 'total descending'})
+                df_competidores = seleccionar_top(df_competidores, head, 'Precio')
+                def construir_figura():
+                    fig = px.bar(df_competidores, x='Vendedores', y='Precio',
+                                title=f'Top {head} Vendedores por Precio Promedio ({oem_seleccionado})',
+                                labels={'Vendedores': 'Vendedor', 'Precio': 'Precio Promedio ($)'},
+                                color='Precio', color_continuous_scale=px.colors.sequential.Plasma)
+                    fig.update_layout(xaxis_title='Vendedor', yaxis_title='Precio Promedio ($)',
+                                    xaxis={'categoryorder': 'total descending'})
+                    return fig
+                fig = figura_en_cache(huella, 'estrategia_futura.variacion_precios_oem', (oem_seleccionado, head), construir_figura)
                 st.plotly_chart(fig)
 
             def variacion_cantidad_disponible_oem(df_oem, oem_seleccionado):
@@ -1263,63 +3029,75 @@ def main():
                     st.warning("Error: Missing ('Vendedores', 'Cantidad Disponible', 'OEM').")
                 return
             
-            df_competidores = df_oem.groupby('Vendedores')['Cantidad Disponible'].mean().reset_index()
+            df_competidores = resumen_oem[['Vendedores', 'Cantidad Disponible']]
             if df_competidores.empty:
                 st.warning(f"No hay vendedores que vendan OEM '{oem_seleccionado}'.")
                 return
 
             head = st.slider(f'Competidores por Variación de Cantidad Disponible ({oem_seleccionado})', 1,
                             len(df_competidores), min(10, len(df_competidores)), key='can_fut')
-            df_competidores = df_competidores.sort_values(by='Cantidad Disponible', ascending=False).head(head)
-            fig = px.bar(df_competidores, x='Vendedores', y='Cantidad Disponible',
-                        title=f'Top {head} Competidores por Cantidad Disponible Promedio ({oem_seleccionado})',
-                        labels={'Vendedores': 'Vendedor', 'Cantidad Disponible': 'Cantidad Disponible Promedio'},
-                        color='Cantidad Disponible', color_continuous_scale=px.colors.sequential.Plasma)
-            fig.update_layout(xaxis_title='Vendedor', yaxis_title='Cantidad Disponible Promedio',
-                            xaxis={'categoryorder': 'total descending'})
+            df_competidores = seleccionar_top(df_competidores, head, 'Cantidad Disponible')
+            def construir_figura():
+                fig = px.bar(df_competidores, x='Vendedores', y='Cantidad Disponible',
+                            title=f'Top {head} Competidores por Cantidad Disponible Promedio ({oem_seleccionado})',
+                            labels={'Vendedores': 'Vendedor', 'Cantidad Disponible': 'Cantidad Disponible Promedio'},
+                            color='Cantidad Disponible', color_continuous_scale=px.colors.sequential.Plasma)
+                fig.update_layout(xaxis_title='Vendedor', yaxis_title='Cantidad Disponible Promedio',
+                                xaxis={'categoryorder': 'total descending'})
+                return fig
+            fig = figura_en_cache(huella, 'estrategia_futura.variacion_cantidad_disponible_oem', (oem_seleccionado, head),
+                                  construir_figura)
             st.plotly_chart(fig)
 
+            @st.fragment
             def variacion_health_oem(df_oem, oem_seleccionado):
                 """Shows the Health variation of the selected OEM."""
                 if df_oem is None or 'Vendedores' not in df_oem.columns or 'Estado de Salud' not in df_oem.columns or 'OEM' not in df_oem.columns:
                     st.warning("Error: Missing columns ('Vendedores', 'Estado de Salud', 'OEM').")
                     return
 
-                df_competidores = df_oem.groupby('Vendedores')['Estado de Salud'].mean().reset_index()
+                df_competidores = resumen_oem[['Vendedores', 'Estado de Salud']]
                 if df_competidores.empty:
                     st.warning(f"No hay competidores para el OEM '{oem_seleccionado}'.")
                     return
 
                 head = st.slider(f'Competidores por Variación de Health ({oem_seleccionado})', 1, len(df_competidores),
                                 min(10, len(df_competidores)), key='salud_fut')
-                df_competidores = df_competidores.sort_values(by='Estado de Salud', ascending=False).head(head)
-                fig = px.bar(df_competidores, x='Vendedores', y='Estado de Salud',
-                            title=f'Top {head} Competidores por Health Promedio ({oem_seleccionado})',
-                            labels={'Vendedores': 'Vendedor', 'Estado de Salud': 'Health Promedio'},
-                            color='Estado de Salud', color_continuous_scale=px.colors.sequential.Plasma)
-                fig.update_layout(xaxis_title='Vendedor', yaxis_title='Health Promedio',
-                                xaxis={'categoryorder': 'total descending'})
+                df_competidores = seleccionar_top(df_competidores, head, 'Estado de Salud')
+                def construir_figura():
+                    fig = px.bar(df_competidores, x='Vendedores', y='Estado de Salud',
+                                title=f'Top {head} Competidores por Health Promedio ({oem_seleccionado})',
+                                labels={'Vendedores': 'Vendedor', 'Estado de Salud': 'Health Promedio'},
+                                color='Estado de Salud', color_continuous_scale=px.colors.sequential.Plasma)
+                    fig.update_layout(xaxis_title='Vendedor', yaxis_title='Health Promedio',
+                                    xaxis={'categoryorder': 'total descending'})
+                    return fig
+                fig = figura_en_cache(huella, 'estrategia_futura.variacion_health_oem', (oem_seleccionado, head), construir_figura)
                 st.plotly_chart(fig)
 
+            @st.fragment
             def comparacion_visitas_oem(df, oem_seleccionado):
                 """Comparing the visits of the selected OEM."""
                 if df is None or 'Vendedores' not in df.columns or 'Visitas' not in df.columns or 'OEM' not in df.columns:
                     st.warning("Error: Missing columns ('Vendedores', 'Visitas', 'OEM').")
                     return
 
-                df_competidores = df[df['OEM'] == oem_seleccionado].groupby('Vendedores')['Visitas'].sum().reset_index()
+                df_competidores = resumen_oem[['Vendedores', 'Visitas']]
                 if df_competidores.empty:
                     st.warning(f"No hay vendedores para el OEM '{oem_seleccionado}'.")
                     return
 
                 head = st.slider(f'Competidores por Visitas ({oem_seleccionado})', 1, len(df_competidores),
                                 min(10, len(df_competidores)), key='visitas_fut')
-                df_competidores = df_competidores.sort_values(by='Visitas', ascending=False).head(head)
-                fig = px.bar(df_competidores, x='Vendedores', y='Visitas',
-                            title=f'Top {head} Competidores por Visitas ({oem_seleccionado})',
-                            labels={'Vendedores': 'Vendedor', 'Visitas': 'Visitas'},
-                            color='Visitas', color_continuous_scale=px.colors.sequential.Plasma)
-                fig.update_layout(xaxis_title='Vendedor', yaxis_title='Visitas', xaxis={'categoryorder': 'total descending'})
+                df_competidores = seleccionar_top(df_competidores, head, 'Visitas')
+                def construir_figura():
+                    fig = px.bar(df_competidores, x='Vendedores', y='Visitas',
+                                title=f'Top {head} Competidores por Visitas ({oem_seleccionado})',
+                                labels={'Vendedores': 'Vendedor', 'Visitas': 'Visitas'},
+                                color='Visitas', color_continuous_scale=px.colors.sequential.Plasma)
+                    fig.update_layout(xaxis_title='Vendedor', yaxis_title='Visitas', xaxis={'categoryorder': 'total descending'})
+                    return fig
+                fig = figura_en_cache(huella, 'estrategia_futura.comparacion_visitas_oem', (oem_seleccionado, head), construir_figura)
                 st.plotly_chart(fig)
 
             # Call ALL the Analysis functions:
@@ -1344,24 +3122,13 @@ def main():
                     st.warning("Error: Missing columns. Chequea los datos y avisa a los admin.")
                     return None
 
-                df_competidores = df[df['OEM'] == oem_seleccionado]
-
-                if df_competidores.empty:
+                if resumen_oem.empty:
                     st.warning(f"No hay vendedores para el OEM '{oem_seleccionado}'.")
                     return None
 
-                # Force the type before aggregation:
-                df_competidores['ID'] = df_competidores['ID'].astype(str)
-
-                df_resumen = df_competidores.groupby('Vendedores').agg(
-                    {'Precio': 'mean',
-                    'Cantidad Disponible': 'mean',
-                    'Estado de Salud': 'mean',
-                    'Visitas': 'sum',
-                    'Título': 'first',
-                    'ID': 'first',
-                    'permalink': 'first'
-                    }).reset_index()
+                # Promedios, visitas y primer título/ID/permalink por vendedor (precalculados)
+                df_resumen = resumen_oem[['Vendedores', 'Precio', 'Cantidad Disponible', 'Estado de Salud', 'Visitas',
+                                          'Título', 'ID', 'permalink']]
                 df_resumen['ID'] = df_resumen['ID'].astype(str)
 
                 # Formatear el precio como moneda ($)
@@ -1377,16 +3144,10 @@ def main():
             df_competencia = crear_dataframe_competencia(df_oem, oem_seleccionado)
 
             if df_competencia is not None:
-                st.dataframe(df_competencia)
-
-                # CSV Download:
-                csv = df_competencia.to_csv(index=False)
-                st.download_button(
-                    label="Descargar datos de la competencia (incluyendo nuevos) como CSV",
-                    data=csv,
-                    file_name=f'competencia_futura_{oem_seleccionado}.csv',
-                    mime='text/csv',
-                )
+                tabla_paginada(df_competencia, 'competencia_futura', None if huella is None else (huella, oem_seleccionado))
+
+                # Descarga de la competencia (incluyendo nuevos), generada al pedirla
+                boton_exportar(df_competencia, f'competencia_futura_{oem_seleccionado}', 'exportar_competencia_futura')
 
             st.subheader("Análisis Detallado de Características")
 
@@ -1407,10 +3168,13 @@ def main():
                 fecha_counts.columns = ['Fecha', 'Cantidad']
 
                 # Crear el gráfico de torta
-                fig_fecha_actualizacion = px.pie(fecha_counts, values='Cantidad', names='Fecha',
-                                                title='Distribución de Fechas de Última Actualización',
-                                                labels={'Fecha': 'Fecha de Última Actualización', 'Cantidad': 'Cantidad'},
-                                                color_discrete_sequence=px.colors.sequential.Plasma)
+                def construir_figura():
+                    fig_fecha_actualizacion = px.pie(fecha_counts, values='Cantidad', names='Fecha',
+                                                    title='Distribución de Fechas de Última Actualización',
+                                                    labels={'Fecha': 'Fecha de Última Actualización', 'Cantidad': 'Cantidad'},
+                                                    color_discrete_sequence=px.colors.sequential.Plasma)
+                    return fig_fecha_actualizacion
+                fig_fecha_actualizacion = figura_en_cache(huella, 'estrategia_futura.fig_fecha_actualizacion', (oem_seleccionado,), construir_figura)
                 st.plotly_chart(fig_fecha_actualizacion)
             else:
                 st.warning("La columna 'Fecha de Última Actualización' no existe en el DataFrame.")
@@ -1420,11 +3184,13 @@ def main():
             # Initialize fig_warranty to None in case the following code is skipped.
             fig_warranty = None
             if 'warranty' in df_oem.columns and 'Título' in df_oem.columns:
-                warranty_counts = df_oem.groupby('Título')['warranty'].value_counts().unstack().fillna(0)
-                fig_warranty = px.bar(warranty_counts, x=warranty_counts.index, y=warranty_counts.columns,
-                                title='Distribución de Garantía por Título',
-                                labels={'value': 'Cantidad', 'Título': 'Título del Producto'},
-                                color_continuous_scale=px.colors.sequential.Plasma)
+                warranty_counts = df_oem.groupby('Título', observed=True)['warranty'].value_counts().unstack().fillna(0)
+                def construir_figura():
+                    return px.bar(warranty_counts, x=warranty_counts.index, y=warranty_counts.columns,
+                                    title='Distribución de Garantía por Título',
+                                    labels={'value': 'Cantidad', 'Título': 'Título del Producto'},
+                                    color_continuous_scale=px.colors.sequential.Plasma)
+                fig_warranty = figura_en_cache(huella, 'estrategia_futura.fig_warranty', (oem_seleccionado,), construir_figura)
             else:
                 st.warning("Las columnas 'warranty' o 'Título' no existen en el DataFrame.")
 
@@ -1435,26 +3201,19 @@ def main():
         # 3) Gráfico de Tags (catalog_listing y/o catalog_forewarning) por Título
             st.subheader("Catálogo por Título")
 
-            def esta_en_catalogo(tags_list):
-                if isinstance(tags_list, str):
-                    tags_list = eval(tags_list)  # Convert string representation to list
-                
-                for tag in tags_list:
-                    if 'catalog_listing_eligible' in tag or 'catalog_forewarning' in tag or 'catalog_boost' in tag:
-                        return 'Sí'
-                return 'No'
-            
-            if 'tags' in df_oem.columns:
-                df_oem['en_catalogo'] = df_oem['tags'].apply(esta_en_catalogo)
-
+            # Las columnas de tags y shipping se decodifican una sola vez al cargar (ver agregar_columnas_tags)
+            if 'en_catalogo' in df_oem.columns:
                 # Contar cuántos títulos están en el catálogo y cuántos no
-                catalogo_counts = df_oem['en_catalogo'].value_counts().reset_index()
+                catalogo_counts = df_oem['en_catalogo'].map({True: 'Sí', False: 'No'}).value_counts().reset_index()
                 catalogo_counts.columns = ['En Catálogo', 'Cantidad']
 
                 # Crear un gráfico de torta
-                fig_catalogo = px.pie(catalogo_counts, values='Cantidad', names='En Catálogo',
-                                        title='Distribución de Productos en Catálogo',
-                                        color_discrete_sequence=px.colors.sequential.Plasma)
+                def construir_figura():
+                    fig_catalogo = px.pie(catalogo_counts, values='Cantidad', names='En Catálogo',
+                                            title='Distribución de Productos en Catálogo',
+                                            color_discrete_sequence=px.colors.sequential.Plasma)
+                    return fig_catalogo
+                fig_catalogo = figura_en_cache(huella, 'estrategia_futura.fig_catalogo', (oem_seleccionado,), construir_figura)
                 st.plotly_chart(fig_catalogo)
             else:
                 st.warning("La columna 'tags' no existe en el DataFrame.")
@@ -1462,39 +3221,18 @@ def main():
         # 5) Gráfico detallado de Cuota Simple
             st.subheader("Tipos de Cuota Simple")
 
-            def extract_cuota_simple_type(tags_list):
-                if isinstance(tags_list, str):
-                    tags_list = eval(tags_list)  # Convert string representation to list
-                
-                cuota_types = []  # Lista para almacenar los tipos de cuota simple encontrados
-                for tag in tags_list:
-                    if 'cuota-simple-paid-by-buyer' in tag:
-                        cuota_types.append('cuota-simple-paid-by-buyer')
-                    elif 'cuota-simple-3' in tag:
-                        cuota_types.append('cuota-simple-3')
-                    elif 'cuota-simple-6' in tag:
-                        cuota_types.append('cuota-simple-6')
-                    elif 'cuota-simple-9' in tag:
-                        cuota_types.append('cuota-simple-9')
-                    elif 'cuota-simple-12' in tag:
-                        cuota_types.append('cuota-simple-12')
-                
-                if cuota_types:
-                    return ', '.join(cuota_types)  # Retorna una cadena con los tipos encontrados
-                else:
-                    return 'Ninguna'  # Si no se encuentra ninguna cuota simple
-            
-            if 'tags' in df_oem.columns:
-                df_oem['tipo_cuota_simple'] = df_oem['tags'].apply(extract_cuota_simple_type)
-
-                # Contar la frecuencia de cada tipo de cuota simple
-                tipo_cuota_simple_counts = df_oem['tipo_cuota_simple'].value_counts().reset_index()
+            if 'tipos_cuota_simple' in df_oem.columns:
+                # Contar la frecuencia de cada combinación de tipos de cuota simple
+                tipo_cuota_simple_counts = df_oem['tipos_cuota_simple'].value_counts().loc[lambda conteo: conteo > 0].reset_index()
                 tipo_cuota_simple_counts.columns = ['Tipo de Cuota Simple', 'Cantidad']
 
                 # Crear un gráfico de torta
-                fig_tipos_cuota_simple = px.pie(tipo_cuota_simple_counts, values='Cantidad', names='Tipo de Cuota Simple',
-                                                    title='Distribución de Tipos de Cuota Simple',
-                                                    color_discrete_sequence=px.colors.sequential.Plasma)
+                def construir_figura():
+                    fig_tipos_cuota_simple = px.pie(tipo_cuota_simple_counts, values='Cantidad', names='Tipo de Cuota Simple',
+                                                        title='Distribución de Tipos de Cuota Simple',
+                                                        color_discrete_sequence=px.colors.sequential.Plasma)
+                    return fig_tipos_cuota_simple
+                fig_tipos_cuota_simple = figura_en_cache(huella, 'estrategia_futura.fig_tipos_cuota_simple', (oem_seleccionado,), construir_figura)
                 st.plotly_chart(fig_tipos_cuota_simple)
             else:
                 st.warning("La columna 'tags' no existe en el DataFrame.")
@@ -1502,19 +3240,16 @@ def main():
         # 6) Gráfico de Free Shipping por Título
             st.subheader("Free Shipping por Título")
 
-            def extract_free_shipping(shipping_info):
-                if isinstance(shipping_info, str):
-                    shipping_info = eval(shipping_info)
-                return shipping_info.get('free_shipping', False)
-            
-            if 'shipping' in df_oem.columns and 'Título' in df_oem.columns:
-                df_oem['free_shipping'] = df_oem['shipping'].apply(extract_free_shipping)
-                free_shipping_counts = df_oem.groupby('Título')['free_shipping'].value_counts().unstack().fillna(0)
-                fig_free_shipping = px.bar(free_shipping_counts, x=free_shipping_counts.index,
-                                            y=free_shipping_counts.columns,
-                                            title='Distribución de Free Shipping por Título',
-                                            labels={'value': 'Cantidad', 'Título': 'Título del Producto'},
-                                            color_continuous_scale=px.colors.sequential.Plasma)
+            if 'free_shipping' in df_oem.columns and 'Título' in df_oem.columns:
+                free_shipping_counts = df_oem.groupby('Título', observed=True)['free_shipping'].value_counts().unstack().fillna(0)
+                def construir_figura():
+                    fig_free_shipping = px.bar(free_shipping_counts, x=free_shipping_counts.index,
+                                                y=free_shipping_counts.columns,
+                                                title='Distribución de Free Shipping por Título',
+                                                labels={'value': 'Cantidad', 'Título': 'Título del Producto'},
+                                                color_continuous_scale=px.colors.sequential.Plasma)
+                    return fig_free_shipping
+                fig_free_shipping = figura_en_cache(huella, 'estrategia_futura.fig_free_shipping', (oem_seleccionado,), construir_figura)
                 st.plotly_chart(fig_free_shipping)
             else:
                 st.warning("Las columnas 'shipping' o 'Título' no existen en el DataFrame.")
@@ -1534,6 +3269,7 @@ def main():
 
     # Lógica principal basada en la selección del menú
     data = pagina_principal()  # Cargar los datos y guardarlos en la variable data
+    panel_cache_cargas()
 
     
     # Filtro de fecha global
@@ -1565,9 +3301,9 @@ def main():
             st.warning("Por favor, cargue los datos en la página principal y asegúrese de que la columna 'Fecha' esté presente.")
     elif seleccion == 'Estrategia Actual':
         if data is not None and fecha_inicio is not None and fecha_fin is not None:  # Verifico que data y las fechas existan
-            df_filtrado = data[(data['Fecha'] >= fecha_inicio) & (data['Fecha'] <= fecha_fin)]  # Aplico filtro de fechas
+            df_filtrado = rango_en_sesion(data, fecha_inicio, fecha_fin)  # Aplico filtro de fechas
             if not df_filtrado.empty:  # Solo llama a estrategia_actual si df_filtrado no está vacío
-                df_estrat = estrategia_actual(df_filtrado.copy())  # Pasamos df_filtrado como argumento
+                df_estrat = estrategia_actual(df_filtrado, fecha_inicio, fecha_fin)  # Sin copia: las páginas no modifican df_filtrado
             else:
                 st.warning("No hay datos en el rango de fechas seleccionado.")
         else:
@@ -1584,9 +3320,77 @@ def main():
             st.warning("Por favor, cargue los datos en la página principal y seleccione un rango de fechas.")
     elif seleccion == 'Redes Neuronales':
         if data is not None:
-            redes_neuronales(data.copy()) # Pass a copy to avoid modifying the original dataframe
+            redes_neuronales(data)  # Con copy-on-write los cambios de la página no alcanzan al DataFrame en caché
         else:
             st.warning("Por favor, cargue los datos en la página principal.")
 
+def comparar_top(filas=1_000_000, n=50, repeticiones=5, semilla=0):
+    """Tiempos (segundos, mejor de 'repeticiones') de sort_values().head(n) contra seleccionar_top sobre datos aleatorios."""
+    generador = np.random.default_rng(semilla)
+    # Valores con empates y algunos NaN, como las sumas de visitas por vendedor
+    valores = generador.integers(0, filas // 10 + 1, filas).astype(np.float64)
+    valores[generador.random(filas) < 0.01] = np.nan
+    serie = pd.Series(valores, index=pd.Index([f'grupo{i}' for i in range(filas)], name='Grupo'), name='Visitas')
+    tiempos = {}
+    for nombre, seleccionar in [('sort_values + head', lambda: serie.sort_values(ascending=False).head(n)),
+                                ('seleccionar_top', lambda: seleccionar_top(serie, n))]:
+        mejor = np.inf
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            resultado = seleccionar()
+            mejor = min(mejor, time.perf_counter() - inicio)
+        tiempos[nombre] = (mejor, resultado)
+    iguales = np.array_equal(tiempos['sort_values + head'][1].to_numpy(), tiempos['seleccionar_top'][1].to_numpy())
+    return {nombre: segundos for nombre, (segundos, _) in tiempos.items()}, iguales
+
+def linea_de_comandos(argumentos):
+    """Herramientas fuera de la interfaz: python app_Mercado_Libre.py convertir export.xlsx datos.parquet"""
+    parser = argparse.ArgumentParser(description='Herramientas del analizador de Mercado Libre')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    convertir = subparsers.add_parser('convertir', help='Convierte un export de Excel a snapshot columnar')
+    convertir.add_argument('excel', help='Archivo .xlsx exportado de Mercado Libre')
+    convertir.add_argument('destino', help='Archivo de salida (.parquet o .feather)')
+
+    benchmark_top = subparsers.add_parser('benchmark-top', help='Compara el top-N por selección parcial contra el orden completo')
+    benchmark_top.add_argument('--filas', type=int, default=1_000_000, help='Cantidad de grupos a rankear')
+    benchmark_top.add_argument('--top', type=int, default=50, help='Tamaño del top')
+    benchmark_top.add_argument('--repeticiones', type=int, default=5)
+
+    reporte = subparsers.add_parser('reporte', help='Reporte de Estrategia Actual para todos los vendedores (Parquet)')
+    reporte.add_argument('datos', help='Export de Excel o snapshot (.xlsx, .parquet o .feather)')
+    reporte.add_argument('destino', help='Archivo Parquet de salida')
+    reporte.add_argument('--desde', help='Fecha de inicio (AAAA-MM-DD)')
+    reporte.add_argument('--hasta', help='Fecha de fin (AAAA-MM-DD)')
+    reporte.add_argument('--top', type=int, default=20, help='Top por métrica y vendedor')
+
+    args = parser.parse_args(argumentos)
+    if args.comando == 'convertir':
+        formato = formato_archivo(args.destino)
+        if formato not in FORMATOS_SNAPSHOT:
+            parser.error(f"Formato de destino no soportado: {args.destino}")
+        df = convertir_excel_a_snapshot(args.excel, args.destino, formato)
+        print(f"{len(df)} filas guardadas en {args.destino}")
+    elif args.comando == 'benchmark-top':
+        tiempos, iguales = comparar_top(args.filas, args.top, args.repeticiones)
+        for nombre, segundos in tiempos.items():
+            print(f"{nombre}: {segundos * 1000:.1f} ms")
+        print(f"Mismos valores en el top: {'sí' if iguales else 'no'}")
+    elif args.comando == 'reporte':
+        df = preparar_datos(leer_archivo(args.datos, args.datos))
+        fecha_inicio = pd.Timestamp(args.desde) if args.desde else df['Fecha'].min()
+        fecha_fin = pd.Timestamp(args.hasta) if args.hasta else df['Fecha'].max()
+        df_filtrado = filtrar_por_fechas(df, fecha_inicio, fecha_fin)
+        datos = datos_vendedores(df_filtrado, fecha_inicio, fecha_fin)
+        reporte_todos_vendedores(datos, args.top).to_parquet(args.destino, index=False)
+        print(f"Reporte de {df_filtrado['Vendedores'].nunique()} vendedores guardado en {args.destino}")
+
 if __name__ == '__main__':
-    main()
+    # Copy-on-write: los DataFrames derivados comparten memoria con el original hasta que se modifican.
+    # Se activa solo al ejecutar la aplicación, para no cambiar pandas en quien importe el módulo
+    pd.set_option('mode.copy_on_write', True)
+    # Con 'streamlit run' se muestra la aplicación; con 'python app_Mercado_Libre.py <comando>' se usan las herramientas
+    if len(sys.argv) > 1 and not st.runtime.exists():
+        linea_de_comandos(sys.argv[1:])
+    else:
+        main()
@@ -0,0 +1,75 @@
+"""Lectura de snapshots y hojas de Excel con el esquema normalizado.
+
+Está separado de la aplicación para que los procesos de lectura en paralelo lo importen sin
+cargar Streamlit ni TensorFlow.
+"""
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# Renombrado de las columnas del export de Mercado Libre
+COLUMNAS_RENOMBRADAS = {'Available Quantity': 'Cantidad Disponible',
+                        'health': 'Estado de Salud',
+                        'Seller2': 'Vendedores',
+                        'Price': 'Precio',
+                        'date_created': 'Fecha de Inicio',
+                        'last_updated': 'Fecha de Última Actualización',
+                        'visits': 'Visitas',
+                        'description': 'Categoría',
+                        'Title': 'Título',
+                        'Fecha': 'Fecha' # Renombrar la columna 'Fecha'
+                        }
+
+# Columnas que se convierten a datetime si existen
+COLUMNAS_FECHA = ['Fecha de Inicio', 'Fecha de Última Actualización', 'Fecha']
+
+# Formatos columnares aceptados además de Excel
+FORMATOS_SNAPSHOT = ['parquet', 'feather']
+
+def normalizar_columnas(df):
+    """Renombra las columnas del export y convierte las columnas de fecha a datetime."""
+    df = df.rename(columns=COLUMNAS_RENOMBRADAS)
+    # Solo convierto las columnas de fecha que existen en el DataFrame
+    for columna in COLUMNAS_FECHA:
+        if columna in df.columns:
+            df[columna] = pd.to_datetime(df[columna], errors='coerce')
+    return df
+
+def formato_archivo(nombre):
+    """Formato del archivo según su extensión ('xlsx', 'parquet', 'feather')."""
+    extension = os.path.splitext(nombre)[1].lower().lstrip('.')
+    return 'feather' if extension in ('feather', 'arrow') else extension
+
+def leer_snapshot(fuente, formato):
+    """Lee un snapshot columnar. Las rutas se leen con memory map y los archivos cargados
+    se envuelven en un buffer de Arrow, en ambos casos sin copiar los bytes."""
+    if isinstance(fuente, (str, os.PathLike)):
+        if formato == 'feather':
+            tabla = feather.read_table(fuente, memory_map=True)
+        else:
+            tabla = pq.read_table(fuente, memory_map=True)
+    else:
+        origen = pa.BufferReader(pa.py_buffer(fuente.getbuffer()))
+        tabla = feather.read_table(origen) if formato == 'feather' else pq.read_table(origen)
+    return tabla.to_pandas(split_blocks=True, self_destruct=True)
+
+def leer_hoja(fuente, nombre, hoja=0):
+    """Lee un Excel (la hoja indicada) o un snapshot, desde un archivo cargado o una ruta,
+    y devuelve el DataFrame normalizado."""
+    formato = formato_archivo(nombre)
+    if formato in FORMATOS_SNAPSHOT:
+        # Los snapshots ya tienen el esquema normalizado; se normaliza igual por si vienen de otra fuente
+        return normalizar_columnas(leer_snapshot(fuente, formato))
+    if hasattr(fuente, 'seek'):
+        fuente.seek(0)
+    return normalizar_columnas(pd.read_excel(fuente, sheet_name=hoja))
+
+def parsear_hoja(nombre, ruta, hoja):
+    """Tarea de los procesos de lectura: devuelve la hoja normalizada y los segundos que tomó leerla."""
+    inicio = time.perf_counter()
+    df = leer_hoja(ruta, nombre, hoja)
+    return df, time.perf_counter() - inicio
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app_Mercado_Libre as app  # noqa: E402
+
+
+def _publicaciones(ids, fechas, tags_por_fila, semilla=0):
+    rng = np.random.default_rng(semilla)
+    n = len(ids)
+    return pd.DataFrame({
+        'ID': ids,
+        'Fecha': pd.to_datetime(fechas),
+        'Vendedores': rng.choice(['vendedor a', 'vendedor b', 'vendedor c'], n),
+        'Categoría': rng.choice(['frenos', 'filtros', 'motor'], n),
+        'OEM': rng.choice(['OEM-1', 'OEM-2', 'OEM-3', 'OEM-4'], n),
+        'Visitas': rng.integers(0, 500, n),
+        'Estado de Salud': rng.random(n),
+        'Cantidad Disponible': rng.integers(1, 50, n),
+        'tags': [repr(tags) for tags in tags_por_fila],
+        'shipping': [repr({'free_shipping': bool(i % 2)}) for i in range(n)],
+    })
+
+
+@pytest.fixture
+def publicaciones():
+    """Arma un DataFrame con el esquema normalizado de un snapshot (una fila por ID y fecha)."""
+    return _publicaciones
+
+
+@pytest.fixture
+def directorios(tmp_path, monkeypatch):
+    """Base y caché en disco en carpetas temporales."""
+    monkeypatch.setattr(app, 'DIRECTORIO_CACHE', str(tmp_path / 'cache'))
+    return {'base': str(tmp_path / 'base'), 'archivos': tmp_path}
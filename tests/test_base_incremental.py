@@ -0,0 +1,68 @@
+import pandas as pd
+
+import app_Mercado_Libre as app
+
+
+def _guardar(df, directorio, nombre):
+    ruta = str(directorio / nombre)
+    df.to_parquet(ruta, index=False)
+    return (nombre, ruta)
+
+
+def _filas_base(directorio):
+    return sum(len(pd.read_parquet(parte)) for parte in app.partes_base(directorio))
+
+
+def test_mismo_archivo_dos_veces(directorios, publicaciones):
+    df = publicaciones([f'MLA{i}' for i in range(50)], ['2024-03-01'] * 50, [['good_quality_thumbnail']] * 50)
+    fuente = _guardar(df, directorios['archivos'], 'dia1.parquet')
+
+    primera = app.incorporar_snapshots([fuente], directorio=directorios['base'], procesos=1)
+    segunda = app.incorporar_snapshots([fuente], directorio=directorios['base'], procesos=1)
+
+    assert primera['filas_nuevas'] == 50
+    assert segunda['omitidos'] == 1 and segunda['archivos'] == 0 and segunda['filas_nuevas'] == 0
+    assert len(app.partes_base(directorios['base'])) == 1
+    assert _filas_base(directorios['base']) == 50
+
+
+def test_filas_repetidas_entre_archivos(directorios, publicaciones):
+    ids = [f'MLA{i}' for i in range(100)]
+    fechas = ['2024-03-01'] * 50 + ['2024-03-02'] * 50
+    df = publicaciones(ids, fechas, [[]] * 100)
+    # Las filas 40 a 59 están en los dos archivos; la 70 se repite dentro del segundo
+    fuente_a = _guardar(df.iloc[:60], directorios['archivos'], 'a.parquet')
+    fuente_b = _guardar(pd.concat([df.iloc[40:], df.iloc[[70]]]), directorios['archivos'], 'b.parquet')
+
+    app.incorporar_snapshots([fuente_a], directorio=directorios['base'], procesos=1)
+    resumen = app.incorporar_snapshots([fuente_b], directorio=directorios['base'], procesos=1)
+
+    assert resumen['filas_nuevas'] == 40
+    assert resumen['filas_duplicadas'] == 21
+    base = pd.concat([pd.read_parquet(parte) for parte in app.partes_base(directorios['base'])])
+    assert len(base) == 100
+    assert not base.duplicated(['ID', 'Fecha']).any()
+
+
+def test_partes_con_diccionarios_de_tags_distintos(directorios, publicaciones):
+    # La segunda parte trae 70 tags nuevos: su máscara ocupa dos palabras y las posiciones cambian al unir
+    tags_a = [['catalog_listing_eligible', 'good_quality_thumbnail'], ['cuota-simple-3'], []] * 20
+    nuevos = [f'tag_{i:02d}' for i in range(70)]
+    tags_b = [[nuevos[i % 70], nuevos[(i * 7) % 70], 'catalog_boost'] if i % 3 else ['cuota-simple-6']
+              for i in range(60)]
+    crudo_a = publicaciones([f'MLA{i}' for i in range(60)], ['2024-03-01'] * 60, tags_a, semilla=1)
+    crudo_b = publicaciones([f'MLA{i}' for i in range(60)], ['2024-03-02'] * 60, tags_b, semilla=2)
+    for crudo, nombre in ((crudo_a, 'a.parquet'), (crudo_b, 'b.parquet')):
+        fuente = _guardar(crudo, directorios['archivos'], nombre)
+        app.incorporar_snapshots([fuente], directorio=directorios['base'], procesos=1)
+
+    unida = app.cargar_base(directorios['base'])
+    esperada = app.preparar_datos(pd.concat([crudo_a, crudo_b], ignore_index=True))
+
+    assert unida.attrs['diccionario_tags'] == esperada.attrs['diccionario_tags']
+    for patrones, exacto in ((app.PATRONES_CATALOGO, False), (['tag_05', 'tag_69'], True), (['cuota-simple'], False)):
+        pd.testing.assert_frame_equal(app.participacion_tags(unida, patrones, 'Vendedores', exacto).sort_index(),
+                                      app.participacion_tags(esperada, patrones, 'Vendedores', exacto).sort_index())
+    columnas = ['ID', 'Fecha', 'en_catalogo', 'free_shipping']
+    pd.testing.assert_frame_equal(unida[columnas].reset_index(drop=True), esperada[columnas].reset_index(drop=True))
+    assert unida['tipo_cuota_simple'].astype(str).tolist() == esperada['tipo_cuota_simple'].astype(str).tolist()
@@ -0,0 +1,114 @@
+"""Equivalencia de construir_dataframe_combinado con la versión anterior basada en merges.
+
+Con 'python tests/test_combinado.py --filas N' compara además tiempo y pico de memoria de ambas.
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_Mercado_Libre import construir_dataframe_combinado  # noqa: E402
+
+
+def _combinado_con_merges(df, visitas_totales_oem=None):
+    """Versión anterior de la tabla combinada (con merges): referencia para la equivalencia y el benchmark."""
+    publicaciones_por_categoria = df.groupby('Categoría', observed=True).size().reset_index(name='Cantidad Publicaciones')
+    df_combinado = pd.merge(df, publicaciones_por_categoria, on='Categoría', how='left')
+    oem_visitas = df.groupby('OEM', observed=True)['Visitas'].sum().reset_index(name='Visitas por OEM')
+    df_combinado = pd.merge(df_combinado, oem_visitas, on='OEM', how='left')
+    total_titulos = df['Título'].nunique()
+    df_combinado['Eficiencia Vendedor'] = df['Visitas'].sum() / total_titulos if total_titulos > 0 else 0
+    df_resumen = df_combinado[['Categoría', 'Título', 'OEM', 'Visitas', 'Cantidad Disponible', 'Estado de Salud', 'Cantidad Publicaciones', 'Visitas por OEM', 'Eficiencia Vendedor', 'permalink', 'ID']].drop_duplicates()
+    if visitas_totales_oem is None:
+        visitas_totales_oem = df.groupby('OEM', observed=True)['Visitas'].sum()
+    df_resumen['Eficiencia OEM'] = (df_combinado['Visitas por OEM'] / visitas_totales_oem[df_combinado['OEM']].values).fillna(0)
+    health_medio_por_categoria = df.groupby('Categoría', observed=True)['Estado de Salud'].mean().reset_index(name="Health Medio Categoria")
+    df_resumen = pd.merge(df_resumen, health_medio_por_categoria, on='Categoría', how='left')
+    columnas_numericas = df_resumen.select_dtypes('number').columns
+    df_resumen[columnas_numericas] = df_resumen[columnas_numericas].fillna(0)
+    return df_resumen
+
+
+def datos_sinteticos(filas=1_000_000, semilla=0):
+    """DataFrame aleatorio con las columnas del export (tipos compactados)."""
+    generador = np.random.default_rng(semilla)
+    vendedores = generador.integers(0, max(1, filas // 200), filas)
+    titulos = generador.integers(0, max(1, filas // 4), filas)
+    df = pd.DataFrame({
+        'ID': pd.Series([f'MLA{i}' for i in titulos]),
+        'Título': pd.Categorical([f'Título {i}' for i in titulos]),
+        'Vendedores': pd.Categorical([f'vendedor{i}' for i in vendedores]),
+        'Categoría': pd.Categorical([f'MLA{i}' for i in generador.integers(0, 500, filas)]),
+        'OEM': pd.Categorical([f'OEM-{i}' for i in generador.integers(0, max(1, filas // 50), filas)]),
+        'Visitas': generador.integers(0, 5000, filas).astype(np.int32),
+        'Cantidad Disponible': generador.integers(0, 200, filas).astype(np.int16),
+        'Estado de Salud': generador.random(filas).astype(np.float32),
+        'Precio': generador.uniform(100, 100_000, filas).round(2),
+        'Fecha': pd.Timestamp('2024-01-01') + pd.to_timedelta(generador.integers(0, 180, filas), unit='D'),
+    })
+    df['permalink'] = 'https://articulo.mercadolibre.com.ar/' + df['ID']
+    return df
+
+
+
+def _medir(funcion):
+    """Ejecuta funcion y devuelve (resultado, segundos, pico de memoria en bytes según tracemalloc)."""
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    resultado = funcion()
+    segundos = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return resultado, segundos, pico
+
+
+
+def comparar_combinado(filas=1_000_000, semilla=0):
+    """Tiempo y pico de memoria de la tabla combinada con merges contra construir_dataframe_combinado."""
+    df = datos_sinteticos(filas, semilla)
+    anterior, segundos_anterior, pico_anterior = _medir(lambda: _combinado_con_merges(df))
+    nuevo, segundos_nuevo, pico_nuevo = _medir(lambda: construir_dataframe_combinado(df))
+    try:
+        pd.testing.assert_frame_equal(anterior.reset_index(drop=True), nuevo, check_dtype=False)
+        iguales = True
+    except AssertionError:
+        iguales = False
+    return {'memoria_df': int(df.memory_usage(deep=True).sum()),
+            'con merges': (segundos_anterior, pico_anterior),
+            'construir_dataframe_combinado': (segundos_nuevo, pico_nuevo),
+            'iguales': iguales}
+
+
+@pytest.mark.parametrize('semilla', [0, 1])
+def test_combinado_igual_a_merges(semilla):
+    df = datos_sinteticos(20_000, semilla)
+    pd.testing.assert_frame_equal(construir_dataframe_combinado(df),
+                                  _combinado_con_merges(df).reset_index(drop=True), check_dtype=False)
+
+
+def test_combinado_con_visitas_totales_de_otro_rango():
+    df = datos_sinteticos(20_000)
+    visitas_totales_oem = df.groupby('OEM', observed=True)['Visitas'].sum() * 2
+    rango = df[df['Fecha'] < pd.Timestamp('2024-03-01')]
+    pd.testing.assert_frame_equal(construir_dataframe_combinado(rango, visitas_totales_oem),
+                                  _combinado_con_merges(rango, visitas_totales_oem).reset_index(drop=True),
+                                  check_dtype=False)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compara la tabla combinada con merges contra la versión sin merges')
+    parser.add_argument('--filas', type=int, default=1_000_000, help='Filas de los datos sintéticos')
+    args = parser.parse_args()
+    resultado = comparar_combinado(args.filas)
+    print(f"Datos: {args.filas} filas, {resultado['memoria_df'] / (1024 * 1024):.1f} MB")
+    for nombre in ['con merges', 'construir_dataframe_combinado']:
+        segundos, pico = resultado[nombre]
+        print(f"{nombre}: {segundos * 1000:.0f} ms, pico de memoria {pico / (1024 * 1024):.1f} MB")
+    print(f"Mismo resultado: {'sí' if resultado['iguales'] else 'no'}")
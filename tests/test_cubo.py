@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app_Mercado_Libre as app
+
+
+@pytest.fixture
+def ventas():
+    rng = np.random.default_rng(7)
+    n = 400
+    fechas = pd.Series(pd.to_datetime('2024-01-01') + pd.to_timedelta(rng.integers(0, 30, n), unit='D'))
+    fechas[rng.random(n) < 0.05] = pd.NaT
+    visitas = rng.integers(0, 1000, n).astype(float)
+    visitas[rng.random(n) < 0.1] = np.nan
+    salud = rng.random(n)
+    salud[rng.random(n) < 0.2] = np.nan
+    vendedores = pd.Series(rng.choice(['a', 'b', 'c', 'd'], n), dtype='category')
+    vendedores[rng.random(n) < 0.05] = np.nan
+    return pd.DataFrame({'Fecha': fechas, 'Vendedores': vendedores,
+                         'Categoría': rng.choice(['frenos', 'filtros', 'motor'], n),
+                         'OEM': rng.choice([f'OEM-{i}' for i in range(12)], n),
+                         'Visitas': visitas, 'Estado de Salud': salud,
+                         'Cantidad Disponible': rng.integers(1, 50, n)})
+
+
+def _con_groupby(df, dimension, desde, hasta):
+    rango = df[(df['Fecha'] >= desde) & (df['Fecha'] <= hasta)]
+    grupos = rango.groupby(dimension, observed=True)
+    esperado = pd.DataFrame({'Filas': grupos.size()})
+    for medida in app.MEDIDAS_CUBO:
+        esperado[medida] = grupos[medida].sum()
+        esperado[medida + ' (n)'] = grupos[medida].count()
+        esperado[medida + ' (media)'] = grupos[medida].mean()
+    return esperado
+
+
+def _comparable(tabla):
+    tabla = tabla.copy()
+    tabla.index = tabla.index.astype(object)
+    return tabla.sort_index().astype(float)
+
+
+@pytest.mark.parametrize('desde, hasta', [
+    ('2024-01-01', '2024-01-30'),  # todo el eje
+    ('2023-12-01', '2024-01-10'),  # empieza antes de la primera fecha
+    ('2024-01-12', '2024-01-12'),  # un solo día
+    ('2024-01-05', '2024-01-20'),
+    ('2024-01-25', '2024-03-01'),  # termina después de la última fecha
+    ('2024-02-10', '2024-02-20'),  # rango sin filas
+    ('2024-01-20', '2024-01-10'),  # inicio posterior al fin
+])
+@pytest.mark.parametrize('dimension', app.DIMENSIONES_CUBO)
+def test_agregar_rango_igual_a_groupby(ventas, dimension, desde, hasta):
+    cubo = app.construir_cubo(ventas)
+    obtenido = app.agregar_rango(cubo, dimension, desde, hasta)
+    esperado = _con_groupby(ventas, dimension, pd.Timestamp(desde), pd.Timestamp(hasta))
+
+    assert sorted(obtenido.columns) == sorted(esperado.columns)
+    if esperado.empty:
+        assert obtenido.empty
+    else:
+        pd.testing.assert_frame_equal(_comparable(obtenido), _comparable(esperado[obtenido.columns]), check_names=False)
+
+
+def test_agregar_por_dimensiones_igual_al_cubo_completo(ventas):
+    cubo = app.construir_cubo(ventas.dropna(subset=['Fecha']))
+    directo = app.agregar_por_dimensiones(ventas.dropna(subset=['Fecha']))
+    for dimension in app.DIMENSIONES_CUBO:
+        pd.testing.assert_frame_equal(_comparable(directo[dimension]),
+                                      _comparable(app.agregar_rango(cubo, dimension, '2024-01-01', '2024-01-30')))
@@ -0,0 +1,50 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import app_Mercado_Libre as app
+
+
+@pytest.fixture
+def visitas():
+    rng = np.random.default_rng(3)
+    # Pocos valores distintos para forzar empates, y algunos NaN
+    valores = rng.integers(0, 15, 200).astype(float)
+    valores[rng.random(200) < 0.1] = np.nan
+    return pd.Series(valores, index=[f'vendedor {i}' for i in range(200)], name='Visitas')
+
+
+@pytest.mark.parametrize('n', [0, 1, 5, 17, 199, 200, 500])
+def test_seleccionar_top_serie(visitas, n):
+    esperado = visitas.sort_values(ascending=False, kind='stable').head(n)
+    pd.testing.assert_series_equal(app.seleccionar_top(visitas, n), esperado)
+
+
+@pytest.mark.parametrize('n', [0, 3, 20, 250])
+def test_seleccionar_top_columna(visitas, n):
+    tabla = visitas.rename_axis('Vendedores').reset_index()
+    esperado = tabla.sort_values(by='Visitas', ascending=False, kind='stable').head(n)
+    pd.testing.assert_frame_equal(app.seleccionar_top(tabla, n, 'Visitas'), esperado)
+
+
+def test_seleccionar_top_no_numerico():
+    serie = pd.Series(['b', 'a', 'c', 'a'])
+    pd.testing.assert_series_equal(app.seleccionar_top(serie, 2), serie.sort_values(ascending=False, kind='stable').head(2))
+
+
+@pytest.mark.parametrize('n', [1, 3, 100])
+def test_seleccionar_top_por_grupo(visitas, n):
+    rng = np.random.default_rng(5)
+    tabla = visitas.rename_axis('Título').reset_index()
+    tabla['OEM'] = rng.choice(['OEM-2', 'OEM-1', 'OEM-3'], len(tabla))
+    esperado = (tabla.sort_values('Visitas', ascending=False, kind='stable')
+                .sort_values('OEM', kind='stable').groupby('OEM').head(n))
+    esperado = esperado.assign(Puesto=esperado.groupby('OEM').cumcount() + 1)
+
+    with warnings.catch_warnings():
+        # Sin copy-on-write (como al importar el módulo) tampoco debe avisar de escrituras sobre un slice
+        warnings.simplefilter('error', pd.errors.SettingWithCopyWarning)
+        obtenido = app.seleccionar_top_por_grupo(tabla, 'OEM', 'Visitas', n)
+    pd.testing.assert_frame_equal(obtenido, esperado)